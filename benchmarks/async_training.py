@@ -0,0 +1,117 @@
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+from gradient_board import GradientBoard
+from mocktangle import MockTangle
+from network_topology.csr_topology import ring
+from node import Node
+from scheduler import Scheduler, SimulationClock
+
+######################
+# Synchronous vs asynchronous training benchmark
+# A ring of nodes with heterogeneous speeds (a fraction of the nodes take `slowdown` times longer per step) is
+# simulated with the event-driven scheduler in virtual time:
+# - sync: the nodes' synchronous mode (averaging their gradient with their neighbors' gradients), where every
+#   node waits for the slowest one, so all nodes step in lockstep at the slowest period
+# - async: every node steps at its own pace and mixes in whichever neighbor model versions are available,
+#   either with equal weights or weighted by staleness
+# Reported: node-steps per simulated second and per wall-clock second, the mean loss at the end, and the
+# simulated time at which the mean loss achieves 90% of the reduction reached by sync.
+######################
+
+def node_periods(num_nodes, slow_fraction, slowdown, period=1.0):
+    """
+    Returns the step period of every node: the last `slow_fraction` of the nodes are `slowdown` times slower.
+    """
+    periods = np.full(num_nodes, period)
+    periods[num_nodes - int(round(slow_fraction * num_nodes)):] *= slowdown
+    return periods
+
+def run_mode(periods, duration, asynchronous, staleness_decay, features=10, seed=0):
+    """
+    Simulates `duration` seconds of synchronous or asynchronous training with the given node periods.
+
+    Returns:
+    - A tuple (curve, steps, wall_seconds, transaction): curve is an array of (simulated time, mean loss over the
+      nodes) rows, steps the total number of SGD steps, and transaction the data of the last loss recorded
+      by node 0 (with its version metadata in asynchronous mode).
+    """
+    ledger_dir = tempfile.mkdtemp(prefix="async_bench_")
+    num_nodes = len(periods)
+    neighbors = ring(num_nodes).to_neighbors()
+    clock = SimulationClock()
+    tangle = MockTangle(os.path.join(ledger_dir, "ledger.json"))
+    board = GradientBoard(num_nodes, (features, 1), clock=clock.now)
+    nodes = [Node(node_id, float(periods[node_id]), tangle, neighbors[node_id], features=features,
+                  gradient_board=board, seed=seed + node_id, asynchronous=asynchronous, staleness_decay=staleness_decay)
+             for node_id in range(num_nodes)]
+
+    curve = []
+    next_sample = [0.0]
+    def record(scheduler):
+        # One sample per simulated second
+        if scheduler.now() >= next_sample[0]:
+            losses = [tangle.get_last_loss(node_id) for node_id in range(num_nodes)]
+            if None not in losses:
+                curve.append((scheduler.now(), float(np.mean(losses))))
+            next_sample[0] = scheduler.now() + 1.0
+        return False
+
+    try:
+        start_time = time.perf_counter()
+        steps = Scheduler(nodes, clock=clock, until=duration, stop_condition=record).run()
+        wall_seconds = time.perf_counter() - start_time
+        transaction = next(tx for tx in reversed(list(tangle.get_view())) if tx["data"].get("added_by") == 0)
+        return np.array(curve), steps, wall_seconds, transaction["data"]
+    finally:
+        board.close()
+        tangle.close()
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+
+def time_to_target(curve, target):
+    reached = np.nonzero(curve[:, 1] <= target)[0]
+    return float(curve[reached[0], 0]) if len(reached) else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare synchronous and asynchronous training on nodes of "
+                                                 "heterogeneous speeds.")
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--slow-fraction", type=float, default=0.2, help="Fraction of slow nodes")
+    parser.add_argument("--slowdown", type=float, default=5.0, help="Step time of slow nodes relative to fast ones")
+    parser.add_argument("--duration", type=float, default=300.0, help="Simulated seconds per mode")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    os.makedirs("logs", exist_ok=True)
+    periods = node_periods(args.nodes, args.slow_fraction, args.slowdown)
+    modes = [
+        ("sync (lockstep at the slowest pace)", np.full(args.nodes, periods.max()), False, 0.0),
+        ("async, equal weights", periods, True, 0.0),
+        ("async, staleness-weighted", periods, True, 1.0),
+    ]
+    target = None
+    for name, mode_periods, asynchronous, staleness_decay in modes:
+        curve, steps, wall_seconds, transaction = run_mode(mode_periods, args.duration, asynchronous,
+                                                           staleness_decay, seed=args.seed)
+        if target is None:
+            target = curve[0, 1] - 0.9 * (curve[0, 1] - curve[-1, 1])
+        converged = time_to_target(curve, target)
+        print(f"{name}: {steps / args.duration:.1f} steps per simulated s, {steps / wall_seconds:.0f} steps/s wall, "
+              f"final loss {curve[-1, 1]:.3f}, "
+              f"converged {'never' if converged is None else f'at {converged:.0f} s'}")
+    print(f"Version metadata of node 0's last transaction: model_version={transaction['model_version']}, "
+          f"neighbor_versions={transaction['neighbor_versions']}, neighbor_staleness={transaction['neighbor_staleness']}")
+
+if __name__ == "__main__":
+    main()
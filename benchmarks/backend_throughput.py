@@ -0,0 +1,72 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+from execution_backends import build_tangle, run_nodes, start_tangle_service
+from gradient_board import GradientBoard
+from network_topology.csr_topology import ring
+
+######################
+# Execution backend benchmark
+# Runs the same ring of nodes for a fixed number of SGD steps (with run_period = 0) under each backend
+# and reports the aggregate throughput in steps per second.
+######################
+
+def benchmark_backend(backend, num_nodes, steps, workers=None, features=10, data_size=100):
+    """
+    Measures steps per second of a backend on a fresh tangle.
+
+    Parameters:
+    - backend: The execution backend to measure.
+    - num_nodes: Number of simulated nodes.
+    - steps: Number of SGD steps performed by each node.
+    - workers: Number of worker processes for the "processes" backend.
+    - features: Number of model features per node.
+    - data_size: Number of samples per node.
+
+    Returns:
+    - Aggregate SGD steps per second over all nodes.
+    """
+    ledger_dir = tempfile.mkdtemp(prefix="backend_bench_")
+    ledger_path = os.path.join(ledger_dir, "ledger.json")
+    manager = None
+    try:
+        if backend == "processes":
+            manager, tangle = start_tangle_service(ledger_path)
+        else:
+            tangle = build_tangle(ledger_path)
+        gradient_board = GradientBoard(num_nodes, (features, 1), shared=(backend == "processes"))
+        node_kwargs = {"run_period": 0, "data_size": data_size, "features": features}
+        neighbors = ring(num_nodes).to_neighbors()
+        try:
+            return run_nodes(backend, num_nodes, tangle, gradient_board, neighbors, node_kwargs,
+                             workers=workers, max_steps=steps)
+        finally:
+            gradient_board.close()
+            tangle.close()
+    finally:
+        if manager is not None:
+            manager.shutdown()
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SGD steps/sec of the node execution backends.")
+    parser.add_argument("--nodes", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=50, help="SGD steps per node")
+    parser.add_argument("--workers", type=int, nargs="*", default=[2, 4],
+                        help="Worker process counts to measure for the 'processes' backend")
+    args = parser.parse_args()
+
+    print(f"threads: {benchmark_backend('threads', args.nodes, args.steps):.1f} steps/s")
+    for workers in args.workers:
+        steps_per_second = benchmark_backend('processes', args.nodes, args.steps, workers=workers)
+        print(f"processes (workers={workers}): {steps_per_second:.1f} steps/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+from gradient_board import GradientBoard
+from mocktangle import MockTangle
+from network_emulator import (ChurnModel, EmulatedNetwork, LinkModel, NetworkedTangle, QuantizationCompressor,
+                              TopKCompressor)
+from node import Node
+from scheduler import Scheduler, SimulationClock
+
+######################
+# Network emulation benchmark
+# Runs the same seeded nodes with the event-driven scheduler (virtual time) over different network conditions,
+# and reports the bytes sent and the time to convergence: the simulated time at which the nodes' mean loss has
+# achieved 90% of the reduction reached with the ideal shared gradient board.
+#
+# The default topology is complete: averaging raw gradients over a ring (whose uniform mixing matrix has negative
+# eigenvalues) lets the node models drift apart even without any network effect, which hides what the links do.
+######################
+
+TOPOLOGIES = {
+    "complete": lambda num_nodes: {node: [other for other in range(num_nodes) if other != node]
+                                   for node in range(num_nodes)},
+    "ring": lambda num_nodes: {node: [(node - 1) % num_nodes, (node + 1) % num_nodes] for node in range(num_nodes)},
+}
+
+def network_configurations(seed):
+    """
+    Returns the network configurations to compare, as (name, EmulatedNetwork keyword arguments) pairs;
+    None stands for the shared gradient board.
+    """
+    wan = LinkModel(latency=0.2, jitter=0.1, bandwidth=20000)
+    return [
+        ("shared board", None),
+        ("lan (5 ms)", {"link": LinkModel(latency=0.005)}),
+        ("wan (200 ms, 20 kB/s)", {"link": wan}),
+        ("wan + top-k 10%", {"link": wan, "compressor": TopKCompressor(0.1)}),
+        ("wan + 8-bit quantization", {"link": wan, "compressor": QuantizationCompressor(8, seed=seed)}),
+        ("30% drops", {"link": LinkModel(latency=0.05, drop_rate=0.3)}),
+        ("churn (up 60 s, down 20 s)", {"link": LinkModel(latency=0.05), "churn": ChurnModel(60, 20, seed=seed)}),
+    ]
+
+def run_configuration(network_kwargs, neighbors, duration, features, seed, run_period=1.0):
+    """
+    Simulates `duration` seconds of training under one network configuration.
+
+    Returns:
+    - A tuple (curve, stats, wall_seconds): curve is an array of (simulated time, mean loss over the nodes)
+      rows sampled once per period, and stats the network's traffic (None for the shared board).
+    """
+    ledger_dir = tempfile.mkdtemp(prefix="network_bench_")
+    num_nodes = len(neighbors)
+    clock = SimulationClock()
+    tangle = MockTangle(os.path.join(ledger_dir, "ledger.json"))
+    if network_kwargs is None:
+        board = GradientBoard(num_nodes, (features, 1), clock=clock.now)
+        node_tangle = tangle
+    else:
+        board = EmulatedNetwork(num_nodes, (features, 1), neighbors, clock=clock.now, seed=seed, **network_kwargs)
+        node_tangle = NetworkedTangle(tangle, board)
+    nodes = [Node(node_id, run_period, node_tangle, neighbors[node_id], features=features, gradient_board=board,
+                  max_staleness=3 * run_period, seed=seed + node_id) for node_id in range(num_nodes)]
+
+    curve = []
+    def record(scheduler):
+        if scheduler.total_steps % num_nodes == 0:
+            losses = [tangle.get_last_loss(node_id) for node_id in range(num_nodes)]
+            curve.append((scheduler.now(), float(np.mean(losses))))
+        return False
+
+    try:
+        start_time = time.perf_counter()
+        Scheduler(nodes, clock=clock, until=duration, stop_condition=record).run()
+        wall_seconds = time.perf_counter() - start_time
+        return np.array(curve), board.stats() if network_kwargs is not None else None, wall_seconds
+    finally:
+        board.close()
+        tangle.close()
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+
+def time_to_target(curve, target):
+    """
+    Returns the first simulated time at which the mean loss is at most `target`, or None.
+    """
+    reached = np.nonzero(curve[:, 1] <= target)[0]
+    return float(curve[reached[0], 0]) if len(reached) else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare convergence and traffic under emulated network conditions.")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--topology", choices=list(TOPOLOGIES), default="complete")
+    parser.add_argument("--duration", type=float, default=300.0, help="Simulated seconds per configuration")
+    parser.add_argument("--features", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    os.makedirs("logs", exist_ok=True)
+    neighbors = TOPOLOGIES[args.topology](args.nodes)
+    target = None
+    for name, network_kwargs in network_configurations(args.seed):
+        curve, stats, wall_seconds = run_configuration(network_kwargs, neighbors, args.duration, args.features,
+                                                       args.seed)
+        if target is None:
+            # 90% of the loss reduction achieved with the shared board
+            target = curve[0, 1] - 0.9 * (curve[0, 1] - curve[-1, 1])
+        converged = time_to_target(curve, target)
+        line = f"{name}: converged {'never' if converged is None else f'at {converged:.0f} s'}, " \
+               f"final loss {curve[-1, 1]:.3f}"
+        if stats is not None:
+            line += f", {stats['bytes_sent'] / 1e3:.0f} kB sent, {stats['messages_dropped']} dropped, " \
+                    f"mean delay {stats['mean_delay'] * 1e3:.0f} ms"
+        print(f"{line} ({wall_seconds:.1f} s wall)")
+
+if __name__ == "__main__":
+    main()
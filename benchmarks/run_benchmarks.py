@@ -0,0 +1,254 @@
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Allow running as a script from the repository root or from this directory
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_ROOT)
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+from mocktangle import MockTangle
+
+######################
+# Benchmark suite and regression harness
+# Runs every benchmark on the CPU, without network access, and writes the measurements as JSON:
+#   {"metadata": {...}, "results": {"<benchmark>.<metric>": {"value": ..., "unit": ..., "better": "lower"|"higher"}}}
+# With --baseline, each metric is compared with the same metric of a previous run and flagged as a regression
+# when it is worse by more than the tolerance; the exit status is then 1. --save-baseline stores the current
+# run as the new baseline.
+#
+# Suites:
+# - step_latency: one SGD step of a node (eager and compiled), including the loss transaction
+# - tangle_writes: add_transaction throughput and save_ledger time as the ledger grows
+# - approval_selection: get_transactions_for_approval latency with each tip selection strategy
+# - startup: MockTangle construction time on large JSON and columnar ledgers
+# - node_scaling: SGD throughput as the number of nodes grows (event-driven scheduler and vectorized engine)
+######################
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def load_benchmark(name):
+    """
+    Imports a benchmark script of this directory. Loaded by path, since some scripts share their name with
+    the repository module they measure.
+    """
+    spec = importlib.util.spec_from_file_location(f"benchmark_{name}",
+                                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def metric(value, unit, better="lower"):
+    return {"value": value, "unit": unit, "better": better}
+
+def fill_ledger(ledger_path, count, nodes=8):
+    """
+    Writes a JSON ledger of `count` loss transactions (plus genesis) recorded by `nodes` nodes in turn.
+    """
+    transactions = [{"hash": "genesis", "approving_transactions": [], "data": {"message": "Genesis transaction"}}]
+    for sequence in range(1, count + 1):
+        approved = [transactions[max(0, sequence - nodes)]["hash"], transactions[sequence - 1]["hash"]]
+        transactions.append({"hash": f"tx_{sequence}", "approving_transactions": approved,
+                             "data": {"loss": 1.0 / sequence, "message": "Normal Loss", "added_by": sequence % nodes}})
+    with open(ledger_path, 'w') as file:
+        json.dump({"transactions": transactions}, file, indent=4)
+
+def bench_step_latency(quick):
+    step_latency = load_benchmark("step_latency")
+    steps = 100 if quick else 500
+    results = {}
+    for name, key in (("eager", "eager_us"), ("compiled, losses batched x32", "compiled_batched_us")):
+        node_kwargs, use_board = step_latency.VARIANTS[name]
+        results[key] = metric(step_latency.measure_step_latency(node_kwargs, steps=steps, use_board=use_board), "us")
+    return results
+
+def bench_tangle_writes(quick):
+    sizes = (1000, 10000) if quick else (1000, 10000, 100000)
+    writes = 1000 if quick else 5000
+    results = {}
+    ledger_dir = tempfile.mkdtemp(prefix="bench_writes_")
+    try:
+        for size in sizes:
+            ledger_path = os.path.join(ledger_dir, f"ledger_{size}.json")
+            fill_ledger(ledger_path, size)
+            tangle = MockTangle(ledger_path, compact_every=None)
+            start_time = time.perf_counter()
+            for step in range(writes):
+                tangle.add_transaction({"loss": 1.0, "message": "Normal Loss", "added_by": step % 8},
+                                       tangle.get_transactions_for_approval(step % 8, [(step + 1) % 8]))
+            tangle.flush()
+            results[f"add_transaction_at_{size}_tx_per_s"] = metric(writes / (time.perf_counter() - start_time),
+                                                                   "tx/s", "higher")
+            start_time = time.perf_counter()
+            tangle.save_ledger()
+            results[f"save_ledger_at_{size}_ms"] = metric((time.perf_counter() - start_time) * 1e3, "ms")
+            tangle.close()
+    finally:
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+    return results
+
+def bench_approval_selection(quick):
+    tip_selection = load_benchmark("tip_selection")
+    transactions = 20000 if quick else 200000
+    results = {}
+    for strategy in tip_selection.STRATEGIES:
+        checkpoints = tip_selection.benchmark_strategy(strategy, transactions, [transactions])
+        results[f"{strategy.replace('-', '_')}_select_us"] = metric(checkpoints[-1]["select_us"], "us")
+    return results
+
+def bench_startup(quick):
+    size = 20000 if quick else 200000
+    results = {}
+    ledger_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        json_path = os.path.join(ledger_dir, "ledger.json")
+        fill_ledger(json_path, size)
+        from columnar_ledger import json_to_columnar
+        columnar_path = os.path.join(ledger_dir, "ledger.columns")
+        json_to_columnar(json_path, columnar_path)
+        for name, path in (("json", json_path), ("columnar", columnar_path)):
+            start_time = time.perf_counter()
+            tangle = MockTangle(path)
+            results[f"{name}_{size}_tx_ms"] = metric((time.perf_counter() - start_time) * 1e3, "ms")
+            tangle.close()
+    finally:
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+    return results
+
+def bench_node_scaling(quick):
+    backend_throughput = load_benchmark("backend_throughput")
+    vectorized_engine = load_benchmark("vectorized_engine")
+    results = {}
+    for num_nodes in ((5, 20) if quick else (5, 20, 80)):
+        steps_per_second = backend_throughput.benchmark_backend("scheduler", num_nodes, 20)
+        results[f"scheduler_{num_nodes}_nodes_steps_per_s"] = metric(steps_per_second, "steps/s", "higher")
+    for num_nodes in ((100, 1000) if quick else (100, 1000, 10000)):
+        node_steps_per_second = vectorized_engine.benchmark_engine(num_nodes, 20)
+        results[f"vectorized_{num_nodes}_nodes_steps_per_s"] = metric(node_steps_per_second, "steps/s", "higher")
+    return results
+
+SUITES = {
+    "step_latency": bench_step_latency,
+    "tangle_writes": bench_tangle_writes,
+    "approval_selection": bench_approval_selection,
+    "startup": bench_startup,
+    "node_scaling": bench_node_scaling,
+}
+
+def run_suites(names, quick=False, repeat=3):
+    """
+    Runs the selected suites.
+
+    Parameters:
+    - names: Names of suites from SUITES.
+    - quick: If True, smaller ledgers, fewer steps and fewer node counts are used.
+    - repeat: Number of runs of each suite; every metric keeps its best value, which filters out
+              interference from other activity on the machine.
+
+    Returns:
+    - The results document (metadata and flattened metrics).
+    """
+    results = {}
+    for name in names:
+        start_time = time.perf_counter()
+        for _ in range(max(1, repeat)):
+            for key, value in SUITES[name](quick).items():
+                best = results.get(f"{name}.{key}")
+                if best is None or (value["value"] > best["value"]) == (value["better"] == "higher"):
+                    results[f"{name}.{key}"] = value
+        print(f"{name}: done in {time.perf_counter() - start_time:.1f} s")
+    return {"metadata": run_metadata(quick, repeat), "results": results}
+
+def run_metadata(quick, repeat):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "quick": quick,
+        "repeat": repeat,
+    }
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Compares every metric with the baseline.
+
+    Parameters:
+    - results: The current results document.
+    - baseline: A previous results document.
+    - tolerance: Relative change tolerated in the worse direction, e.g. 0.2 for 20%.
+
+    Returns:
+    - A list of (metric, baseline_value, current_value, relative_change, regressed) tuples for the metrics
+      present in both documents. relative_change is positive when the metric got worse.
+    """
+    comparisons = []
+    for key, current in results["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["better"] == "higher":
+            change = -change
+        comparisons.append((key, previous["value"], current["value"], change, change > tolerance))
+    return comparisons
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare it with a baseline.")
+    parser.add_argument("--suites", choices=list(SUITES), nargs="+", default=list(SUITES))
+    parser.add_argument("--quick", action="store_true", help="Smaller ledgers and fewer steps")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per suite; the best value of each metric is kept")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None,
+                        help=f"Compare with this results file (e.g. {os.path.relpath(DEFAULT_BASELINE)})")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="Store the results as the baseline (default location if no path is given)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown tolerated before a metric is flagged as a regression")
+    args = parser.parse_args()
+
+    # Nodes log every update to the console; keep the output to the measurements
+    logging.disable(logging.INFO)
+    os.makedirs("logs", exist_ok=True)
+
+    results = run_suites(args.suites, quick=args.quick, repeat=args.repeat)
+    for key, value in results["results"].items():
+        print(f"{key}: {value['value']:.2f} {value['unit']}")
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2)
+            print(f"Results written to {path}")
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        comparisons = compare_with_baseline(results, baseline, args.tolerance)
+        regressions = [comparison for comparison in comparisons if comparison[4]]
+        for key, previous, current, change, regressed in comparisons:
+            flag = "REGRESSION" if regressed else "ok"
+            print(f"{flag:>10}  {key}: {previous:.2f} -> {current:.2f} ({change:+.1%} worse)" if change > 0 else
+                  f"{flag:>10}  {key}: {previous:.2f} -> {current:.2f} ({-change:.1%} better)")
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+from gradient_board import GradientBoard
+from mocktangle import MockTangle
+from node import Node
+
+######################
+# SGD step latency microbenchmark (CPU)
+# Compares Node.decentralized_sgd_update in eager mode with the compiled step, with and without
+# the gradient board exchange, including the tangle recording of the losses.
+######################
+
+# name -> (Node keyword arguments, whether the node exchanges gradients through a board)
+VARIANTS = {
+    "eager": ({}, True),
+    "compiled": ({"compile_step": True}, True),
+    "compiled, losses batched x32": ({"compile_step": True, "loss_record_interval": 32}, True),
+    "eager, no board": ({}, False),
+    "compiled, losses batched x32, no board": ({"compile_step": True, "loss_record_interval": 32}, False),
+    "compiled + XLA, losses batched x32, no board": ({"compile_step": True, "jit_compile": True,
+                                                     "loss_record_interval": 32}, False),
+}
+
+def measure_step_latency(node_kwargs, steps=500, warmup=100, use_board=True, data_size=100, features=10):
+    """
+    Measures the mean latency of one SGD step of a single node, optionally exchanging gradients with a
+    neighbor through the gradient board.
+
+    Returns:
+    - The mean step latency in microseconds.
+    """
+    ledger_dir = tempfile.mkdtemp(prefix="step_latency_")
+    tangle = MockTangle(os.path.join(ledger_dir, "ledger.json"))
+    board = GradientBoard(2, (features, 1)) if use_board else None
+    os.makedirs("logs", exist_ok=True)
+    node = Node(0, 0, tangle, [1], data_size=data_size, features=features, gradient_board=board, seed=0,
+                **node_kwargs)
+    if board is not None:
+        board.publish(1, node.model.numpy())
+    try:
+        for _ in range(warmup):
+            node.decentralized_sgd_update()
+        node.flush_losses()
+        start_time = time.perf_counter()
+        for _ in range(steps):
+            node.decentralized_sgd_update()
+        node.flush_losses()
+        return (time.perf_counter() - start_time) / steps * 1e6
+    finally:
+        tangle.close()
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Eager vs compiled SGD step latency on CPU.")
+    parser.add_argument("--steps", type=int, default=500)
+    args = parser.parse_args()
+
+    for name, (node_kwargs, use_board) in VARIANTS.items():
+        latency = measure_step_latency(node_kwargs, steps=args.steps, use_board=use_board)
+        print(f"{name}: {latency:.1f} us/step")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mocktangle import MockTangle
+
+######################
+# Tangle stress test
+# Dozens of writer threads hammer one MockTangle concurrently, the same way node threads do in main.py.
+# Afterwards the in-memory ledger and the ledger reloaded from disk are checked for lost or duplicated
+# transactions, and the write throughput is reported.
+######################
+
+def run_stress_test(num_writers=48, transactions_per_writer=500, group_commit=True, ledger_dir=None):
+    """
+    Runs concurrent writers against a fresh tangle and verifies the resulting ledger.
+
+    Parameters:
+    - num_writers: Number of concurrent writer threads.
+    - transactions_per_writer: Number of transactions added by each writer.
+    - group_commit: Whether the tangle persists through its background committer thread.
+    - ledger_dir: Directory for the ledger files. A temporary directory is used (and removed) if None.
+
+    Returns:
+    - A dictionary with the measured throughput and the verification results.
+    """
+    cleanup = ledger_dir is None
+    ledger_dir = ledger_dir or tempfile.mkdtemp(prefix="tangle_stress_")
+    ledger_path = os.path.join(ledger_dir, "stress_ledger.json")
+    try:
+        tangle = MockTangle(ledger_path, group_commit=group_commit)
+        initial_count = len(tangle.transactions)
+        start_barrier = threading.Barrier(num_writers + 1)
+        returned_hashes = [[] for _ in range(num_writers)]
+
+        def writer(writer_id):
+            neighbors = [(writer_id - 1) % num_writers, (writer_id + 1) % num_writers]
+            start_barrier.wait()
+            for step in range(transactions_per_writer):
+                approving_transactions = tangle.get_transactions_for_approval(writer_id, neighbors)
+                data = {"loss": float(step), "message": "Normal Loss", "added_by": writer_id}
+                returned_hashes[writer_id].append(tangle.add_transaction(data, approving_transactions))
+
+        threads = [threading.Thread(target=writer, args=(writer_id,)) for writer_id in range(num_writers)]
+        for thread in threads:
+            thread.start()
+        start_barrier.wait()
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        added_time = time.perf_counter() - start_time
+        tangle.flush()
+        committed_time = time.perf_counter() - start_time
+        batches = tangle.committer.batches
+        tangle.close()
+
+        expected = num_writers * transactions_per_writer
+        all_returned = [h for hashes in returned_hashes for h in hashes]
+        ledger_hashes = [tx["hash"] for tx in tangle.transactions[initial_count:]]
+        reloaded = MockTangle(ledger_path, group_commit=False)
+        reloaded_hashes = [tx["hash"] for tx in reloaded.transactions[initial_count:]]
+        reloaded.close()
+
+        per_writer_ok = all(
+            [tx["data"]["loss"] for tx in reloaded.transactions[initial_count:] if tx["data"]["added_by"] == writer_id]
+            == [float(step) for step in range(transactions_per_writer)]
+            for writer_id in range(num_writers))
+
+        return {
+            "writers": num_writers,
+            "transactions": expected,
+            "unique_returned_hashes": len(set(all_returned)) == expected,
+            "ledger_matches_returned": sorted(ledger_hashes) == sorted(all_returned),
+            "reloaded_matches_ledger": reloaded_hashes == ledger_hashes,
+            "per_writer_order_preserved": per_writer_ok,
+            "commit_batches": batches,
+            "add_throughput_tx_per_s": expected / added_time,
+            "commit_throughput_tx_per_s": expected / committed_time,
+        }
+    finally:
+        if cleanup:
+            shutil.rmtree(ledger_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent writer stress test for MockTangle.")
+    parser.add_argument("--writers", type=int, default=48)
+    parser.add_argument("--transactions", type=int, default=500, help="Transactions per writer")
+    parser.add_argument("--no-group-commit", action="store_true", help="Persist synchronously in the writer threads")
+    args = parser.parse_args()
+
+    result = run_stress_test(args.writers, args.transactions, group_commit=not args.no_group_commit)
+    for key, value in result.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
+
+    checks = ("unique_returned_hashes", "ledger_matches_returned", "reloaded_matches_ledger", "per_writer_order_preserved")
+    if not all(result[check] for check in checks):
+        print("Stress test FAILED")
+        sys.exit(1)
+    print("Stress test passed")
+
+if __name__ == "__main__":
+    main()
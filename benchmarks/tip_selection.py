@@ -0,0 +1,107 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mocktangle import MockTangle
+from tip_selection import WeightedRandomWalk
+
+######################
+# Tip selection benchmark
+# Grows a tangle to a few million transactions with each tip selection strategy and reports, at every checkpoint,
+# the mean cost of selecting the transactions to approve and of adding a transaction, together with the number of
+# unapproved tips. Writers work in rounds: all of them select their approvals before any of them adds its
+# transaction, the way concurrent nodes see the same tangle state.
+#
+# - "recent": the neighbors' most recent transactions (MockTangle's default strategy)
+# - "random-walk": weighted random walks over cached cumulative weights (WeightedRandomWalk)
+######################
+
+STRATEGIES = ("recent", "random-walk")
+
+def benchmark_strategy(strategy, transactions, checkpoints, writers=8, seed=0, ledger_dir=None):
+    """
+    Grows a fresh tangle with the given tip selection strategy.
+
+    Parameters:
+    - strategy: One of STRATEGIES.
+    - transactions: Number of transactions to add.
+    - checkpoints: Ledger sizes at which the costs since the previous checkpoint are reported.
+    - writers: Number of simulated writers (ring neighbors of each other).
+    - seed: Seed for the random walks.
+    - ledger_dir: Directory for the ledger files. A temporary directory is used (and removed) if None.
+
+    Returns:
+    - A list of dictionaries, one per checkpoint, with the ledger size, mean selection and add latencies
+      in microseconds, and the number of tips. With random walks, the last one also holds confirmation
+      confidences of transactions at a few depths behind the newest one.
+    """
+    cleanup = ledger_dir is None
+    ledger_dir = ledger_dir or tempfile.mkdtemp(prefix="tip_selection_")
+    tip_selector = WeightedRandomWalk(seed=seed) if strategy == "random-walk" else None
+    try:
+        # Compaction would rewrite the whole ledger; it is not what is being measured here
+        tangle = MockTangle(os.path.join(ledger_dir, "ledger.json"), compact_every=None, tip_selector=tip_selector)
+        results = []
+        pending_checkpoints = sorted(checkpoints)
+        select_seconds = add_seconds = 0.0
+        measured = 0
+        added = 0
+        while added < transactions:
+            round_size = min(writers, transactions - added)
+            start_time = time.perf_counter()
+            approvals = [tangle.get_transactions_for_approval(writer, [(writer - 1) % writers, (writer + 1) % writers])
+                         for writer in range(round_size)]
+            select_seconds += time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for writer in range(round_size):
+                tangle.add_transaction({"loss": 1.0, "message": "Normal Loss", "added_by": writer}, approvals[writer])
+            add_seconds += time.perf_counter() - start_time
+            added += round_size
+            measured += round_size
+
+            if pending_checkpoints and added >= pending_checkpoints[0]:
+                pending_checkpoints.pop(0)
+                results.append({
+                    "transactions": added,
+                    "select_us": select_seconds / measured * 1e6,
+                    "add_us": add_seconds / measured * 1e6,
+                    "tips": len(tangle.get_tips()),
+                })
+                select_seconds = add_seconds = 0.0
+                measured = 0
+        if tip_selector is not None:
+            # Confirmation confidence of transactions at increasing depths behind the newest one
+            for depth in (writers, 4 * writers, 2 * tip_selector.walk_depth):
+                results[-1][f"confidence_at_depth_{depth}"] = tangle.get_confirmation_confidence(f"tx_{added - depth}")
+        tangle.close()
+        return results
+    finally:
+        if cleanup:
+            shutil.rmtree(ledger_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tip selection strategies on growing tangles.")
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=None,
+                        help="Ledger sizes at which to report (default: powers of ten up to --transactions)")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--strategies", choices=STRATEGIES, nargs="+", default=list(STRATEGIES))
+    args = parser.parse_args()
+
+    checkpoints = args.checkpoints or [10 ** power for power in range(3, 10) if 10 ** power < args.transactions]
+    checkpoints = sorted(set(checkpoints) | {args.transactions})
+    for strategy in args.strategies:
+        print(f"{strategy}:")
+        for result in benchmark_strategy(strategy, args.transactions, checkpoints, args.writers):
+            print("  " + ", ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                                   for key, value in result.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow running as a script from the repository root or from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+from checkpoint import Checkpointer, load_checkpoint
+from columnar_ledger import json_to_columnar
+from execution_backends import create_nodes
+from gradient_board import GradientBoard
+from mocktangle import MockTangle
+from network_topology.csr_topology import ring
+
+######################
+# Warm restart benchmark
+# Trains a ring of nodes over a ledger of the given size, checkpoints it, then compares a cold restart
+# (fresh nodes, whole ledger indexed) with a warm restart from the checkpoint (saved nodes and tangle indexes).
+# Both restarts load the same ledger, so the difference is what the checkpoint saves. With a JSON ledger, both
+# restarts still parse the whole file, which dominates the warm restart; a columnar ledger is opened without
+# parsing it.
+######################
+
+def write_ledger(ledger_path, count, num_nodes):
+    """
+    Writes a JSON ledger of `count` loss transactions (plus genesis) recorded by the nodes in turn.
+    """
+    transactions = [{"hash": "genesis", "approving_transactions": [], "data": {"message": "Genesis transaction"}}]
+    for sequence in range(1, count + 1):
+        approved = [transactions[max(0, sequence - num_nodes)]["hash"], transactions[sequence - 1]["hash"]]
+        transactions.append({"hash": f"tx_{sequence}", "approving_transactions": approved,
+                             "data": {"loss": 1.0 / sequence, "message": "Normal Loss", "added_by": sequence % num_nodes}})
+    with open(ledger_path, 'w') as file:
+        json.dump({"transactions": transactions}, file)
+
+def benchmark_restart(num_nodes, transactions, ledger_format="json", features=10, data_size=100):
+    """
+    Measures cold and warm restart times.
+
+    Parameters:
+    - num_nodes: Number of nodes.
+    - transactions: Number of transactions in the ledger.
+    - ledger_format: "json" or "columnar".
+    - features: Number of model features per node.
+    - data_size: Number of samples per node.
+
+    Returns:
+    - A dictionary of durations in seconds: "checkpoint" (capture and write), "cold_tangle", "cold_nodes",
+      "warm_load" (reading the checkpoint), "warm_tangle" and "warm_nodes".
+    """
+    directory = tempfile.mkdtemp(prefix="restart_bench_")
+    json_path = os.path.join(directory, "ledger.json")
+    ledger_path = json_path if ledger_format == "json" else os.path.join(directory, "ledger.columns")
+    checkpoint_path = os.path.join(directory, "simulation.npz")
+    neighbors = ring(num_nodes).to_neighbors()
+    node_kwargs = {"run_period": 0, "data_size": data_size, "features": features}
+    durations = {}
+    try:
+        write_ledger(json_path, transactions, num_nodes)
+        if ledger_format == "columnar":
+            json_to_columnar(json_path, ledger_path)
+        tangle = MockTangle(ledger_path, compact_every=None)
+        gradient_board = GradientBoard(num_nodes, (features, 1))
+        nodes = create_nodes(range(num_nodes), tangle, gradient_board, neighbors, node_kwargs)
+        for node in nodes:
+            node.decentralized_sgd_update_gpu_switch(False)
+        start_time = time.perf_counter()
+        Checkpointer(checkpoint_path, nodes, tangle, gradient_board, interval=None).checkpoint()
+        durations["checkpoint"] = time.perf_counter() - start_time
+        tangle.close()
+
+        start_time = time.perf_counter()
+        tangle = MockTangle(ledger_path, compact_every=None)
+        durations["cold_tangle"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        create_nodes(range(num_nodes), tangle, gradient_board, neighbors, node_kwargs)
+        durations["cold_nodes"] = time.perf_counter() - start_time
+        tangle.close()
+
+        start_time = time.perf_counter()
+        checkpoint = load_checkpoint(checkpoint_path)
+        durations["warm_load"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        tangle = MockTangle(ledger_path, compact_every=None, index_state=checkpoint["tangle"])
+        durations["warm_tangle"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        gradient_board.set_state(checkpoint["gradient_board"])
+        create_nodes(range(num_nodes), tangle, gradient_board, neighbors, node_kwargs, checkpoint["nodes"])
+        durations["warm_nodes"] = time.perf_counter() - start_time
+        tangle.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return durations
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and warm (checkpointed) restarts of a simulation.")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--transactions", type=int, default=100000, help="Ledger size")
+    parser.add_argument("--formats", nargs="+", choices=["json", "columnar"], default=["json", "columnar"],
+                        help="Ledger formats to compare")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    for ledger_format in args.formats:
+        for num_nodes in args.nodes:
+            durations = benchmark_restart(num_nodes, args.transactions, ledger_format)
+            cold = durations["cold_tangle"] + durations["cold_nodes"]
+            warm = durations["warm_load"] + durations["warm_tangle"] + durations["warm_nodes"]
+            print(f"{ledger_format}, {num_nodes} nodes, {args.transactions} transactions: checkpoint "
+                  f"{durations['checkpoint'] * 1e3:.0f} ms, cold restart {cold * 1e3:.0f} ms (tangle "
+                  f"{durations['cold_tangle'] * 1e3:.0f}, nodes {durations['cold_nodes'] * 1e3:.0f}), warm restart "
+                  f"{warm * 1e3:.0f} ms (checkpoint {durations['warm_load'] * 1e3:.0f}, tangle "
+                  f"{durations['warm_tangle'] * 1e3:.0f}, nodes {durations['warm_nodes'] * 1e3:.0f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+import threading
+import time
+import numpy as np
+from instrumentation import METRICS
+
+######################
+# Simulation checkpoints
+# A checkpoint holds everything needed to resume a run where it stopped: every node's model, data source
+# position, RNG state and buffered losses (Node.get_state), the tangle's lookup indexes (MockTangle.get_index_state),
+# the gradient board's slots and the simulation clock. The ledger itself is not copied: it is already persisted
+# by the tangle, and a resumed tangle only indexes the transactions logged after the checkpoint.
+#
+# Restart time: a JSON ledger is still parsed in full on every restart, which dominates a warm restart (about
+# 0.5 s of 0.67 s at 50k transactions and 100 nodes, against 0.92 s cold). A columnar ledger ('.columns') is
+# opened without parsing it, and then both restarts take a few milliseconds for the tangle and are dominated by
+# building the nodes (see benchmarks/warm_restart.py). Data sources save a cursor of constant size, so resuming
+# never replays the batches already served.
+#
+# File format: a single uncompressed .npz archive. Arrays are stored as members of the archive, everything else
+# as one JSON document (member "metadata") in which every array is replaced by {"__array__": "<member name>"}.
+# Loading reads the members directly, without pickling and without parsing the ledger.
+#
+# Checkpointer captures the state from a background thread while the nodes keep training: each node's model is
+# read between two of its updates, and writers of the tangle only wait while its indexes are copied. The file is
+# written next to the previous checkpoint and renamed over it, so a crash never leaves a partial checkpoint.
+#
+# In process mode, every worker process writes the nodes it hosts to its own file (<path stem>.worker<i>.npz),
+# and the main process writes the tangle and the gradient board to <path>; load_checkpoint merges them.
+######################
+
+CHECKPOINT_VERSION = 1
+
+def worker_checkpoint_path(path, worker):
+    """
+    Returns the path of the checkpoint file written by a worker process.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.worker{worker}{extension}"
+
+def _split_arrays(value, arrays, name):
+    # Moves the arrays of a nested structure into `arrays` and returns the JSON-serializable remainder
+    if isinstance(value, np.ndarray):
+        arrays[name] = value
+        return {"__array__": name}
+    if isinstance(value, dict):
+        return {str(key): _split_arrays(item, arrays, f"{name}/{key}") for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_split_arrays(item, arrays, f"{name}/{index}") for index, item in enumerate(value)]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _join_arrays(value, archive):
+    if isinstance(value, dict):
+        if set(value) == {"__array__"}:
+            return archive[value["__array__"]]
+        return {key: _join_arrays(item, archive) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_join_arrays(item, archive) for item in value]
+    return value
+
+def save_checkpoint(path, state):
+    """
+    Writes a checkpoint atomically.
+
+    Parameters:
+    - path: Destination file (conventionally with an .npz extension).
+    - state: A dictionary of NumPy arrays and JSON-serializable values, e.g. as captured by Checkpointer.
+    """
+    arrays = {}
+    metadata = _split_arrays(dict(state, version=CHECKPOINT_VERSION), arrays, "state")
+    arrays["metadata"] = np.frombuffer(json.dumps(metadata).encode("utf-8"), dtype=np.uint8)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", 'wb') as file:
+        np.savez(file, **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(f"{path}.tmp", path)
+
+def read_checkpoint_file(path):
+    """
+    Reads a single checkpoint file.
+
+    Returns:
+    - The saved state, with integer node IDs as the keys of "nodes".
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        metadata = json.loads(archive["metadata"].tobytes().decode("utf-8"))
+        if metadata.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {metadata.get('version')} in {path}.")
+        state = _join_arrays(metadata, archive)
+    state["nodes"] = {int(node_id): node_state for node_id, node_state in state.get("nodes", {}).items()}
+    return state
+
+def load_checkpoint(path):
+    """
+    Loads a checkpoint, merging the files written by worker processes. When several files hold the same node,
+    the most recent one wins.
+
+    Parameters:
+    - path: Path of the checkpoint (the main process's file).
+
+    Returns:
+    - A dictionary with "nodes" (node ID -> node state), "tangle", "gradient_board" and "clock" (None when not
+      saved), or None if no checkpoint file exists.
+    """
+    paths = [path] if os.path.exists(path) else []
+    paths += sorted(glob.glob(worker_checkpoint_path(path, "*")))
+    if not paths:
+        return None
+
+    checkpoint = {"nodes": {}, "tangle": None, "gradient_board": None, "clock": None}
+    created = {}
+    for file_path in paths:
+        state = read_checkpoint_file(file_path)
+        for key in ("tangle", "gradient_board", "clock"):
+            if state.get(key) is not None:
+                checkpoint[key] = state[key]
+        for node_id, node_state in state["nodes"].items():
+            if created.get(node_id, -np.inf) <= state["created"]:
+                checkpoint["nodes"][node_id] = node_state
+                created[node_id] = state["created"]
+    return checkpoint
+
+class Checkpointer:
+    def __init__(self, path, nodes=(), tangle=None, gradient_board=None, clock=None, interval=60.0):
+        """
+        Periodically checkpoints a running simulation from a background thread.
+
+        Parameters:
+        - path: Checkpoint file, replaced by every new checkpoint.
+        - nodes: The Node objects hosted by this process.
+        - tangle: The tangle (or a proxy to it) whose indexes are saved, or None.
+        - gradient_board: The GradientBoard whose slots are saved, or None.
+        - clock: The SimulationClock of the scheduler backend, or None.
+        - interval: Seconds between two checkpoints, or None to only checkpoint when stopped.
+        """
+        self.path = path
+        self.nodes = list(nodes)
+        self.tangle = tangle
+        self.gradient_board = gradient_board
+        self.clock = clock
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+
+    def start(self):
+        if self.interval is not None:
+            self.thread.start()
+        return self
+
+    def capture(self):
+        """
+        Captures the state of the simulation in memory. Nodes keep running meanwhile.
+
+        Returns:
+        - The state, as written by save_checkpoint.
+        """
+        state = {"created": time.time(), "nodes": {node.node_id: node.get_state() for node in self.nodes}}
+        if self.tangle is not None:
+            state["tangle"] = self.tangle.get_index_state()
+        if self.gradient_board is not None:
+            state["gradient_board"] = self.gradient_board.get_state()
+        if self.clock is not None:
+            state["clock"] = self.clock.now()
+        return state
+
+    def checkpoint(self):
+        """
+        Captures the simulation and writes the checkpoint.
+        """
+        start_time = time.perf_counter()
+        save_checkpoint(self.path, self.capture())
+        METRICS.observe("checkpoint_seconds", time.perf_counter() - start_time)
+
+    def stop(self):
+        """
+        Stops the checkpointer thread and writes a final checkpoint.
+        """
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.checkpoint()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.checkpoint()
+            except OSError as e:
+                print(f"Failed to write checkpoint {self.path}: {e}")
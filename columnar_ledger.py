@@ -0,0 +1,417 @@
+import argparse
+import json
+import os
+import numpy as np
+
+######################
+# Columnar ledger format
+# A ledger is stored as a directory of fixed-width NumPy columns, one row per transaction in ledger order:
+# - hash_id.npy (int64): numeric part of the hash ("tx_42" -> 42, "genesis" -> 0)
+# - added_by.npy (int32): node that added the transaction, -1 if missing or not a non-negative int32
+# - loss.npy (float64): recorded loss (integer losses converted), NaN if missing
+# - message_code.npy (int16): index into the message table of metadata.json, -1 if missing or past the table's
+#   capacity
+# - contract_depth.npy (int8): number of contract actions the transaction descends from
+# - approval_offsets.npy (int64, rows + 1) and approvals.npy (int64): approved hash ids as a CSR edge array;
+#   the approvals of row i are approvals[approval_offsets[i]:approval_offsets[i + 1]]
+# - model_version.npy (int64): model version recorded by an asynchronous node, -1 if missing
+# - neighbor_offsets.npy (int64, rows + 1), neighbor_ids.npy (int64), neighbor_versions.npy (int64) and
+#   neighbor_staleness.npy (float64): the neighbor_versions and neighbor_staleness maps recorded along with a
+#   model version, as one CSR array of (neighbor, version, staleness) entries in the maps' order
+# metadata.json holds the message table, the summary of pruned history if any, and, for the rare rows whose data
+# the columns cannot reproduce exactly (extra keys, non-dict data, integer or NaN losses, out-of-range values),
+# the full data under "extras". Columns still hold what they can of these rows, e.g. the loss of an integer loss.
+#
+# Columns are opened memory-mapped, so opening a ledger costs the same regardless of its size, and
+# analytics such as the loss history of a node are vectorized slices over the columns.
+#
+# A tangle loaded from a columnar snapshot keeps the columns as its backing store (ColumnarTransactions):
+# transactions are rebuilt from the columns only when they are read, and new ones are kept in memory after them.
+######################
+
+GENESIS_HASH = "genesis"
+METADATA_FILE = "metadata.json"
+COLUMNS = ("hash_id", "added_by", "loss", "message_code", "contract_depth", "approval_offsets", "approvals",
+           "model_version", "neighbor_offsets", "neighbor_ids", "neighbor_versions", "neighbor_staleness")
+VERSION_COLUMNS = COLUMNS[7:]  # Added in version 2; a version 1 ledger has no model versions
+# Data keys stored in columns; any other key goes to the extras
+DATA_COLUMNS = ("loss", "message", "added_by", "model_version", "neighbor_versions", "neighbor_staleness")
+FORMAT_VERSION = 2
+ITERATION_CHUNK = 4096  # Rows rebuilt at once when iterating over ColumnarTransactions
+MAX_ADDED_BY = np.iinfo(np.int32).max
+MAX_MESSAGES = np.iinfo(np.int16).max + 1  # Message codes 0..32767
+MAX_CONTRACT_DEPTH = np.iinfo(np.int8).max
+MAX_INT64 = np.iinfo(np.int64).max
+
+def hash_to_id(transaction_hash):
+    """
+    Converts a transaction hash to its numeric id.
+
+    Parameters:
+    - transaction_hash: "genesis" or a hash of the form "tx_<n>".
+
+    Returns:
+    - The numeric id.
+    """
+    if transaction_hash == GENESIS_HASH:
+        return 0
+    if isinstance(transaction_hash, str) and transaction_hash.startswith("tx_") and transaction_hash[3:].isdigit():
+        return int(transaction_hash[3:])
+    raise ValueError(f"Transaction hash {transaction_hash!r} cannot be stored in the columnar format.")
+
+def id_to_hash(hash_id):
+    """
+    Converts a numeric id back to its transaction hash.
+    """
+    return GENESIS_HASH if hash_id == 0 else f"tx_{hash_id}"
+
+def version_entries(data):
+    """
+    Extracts the version metadata of an asynchronous node's loss transaction in the layout of the version columns.
+
+    Parameters:
+    - data: The transaction data (a dictionary).
+
+    Returns:
+    - A tuple (model version, [(neighbor, version, staleness), ...]), or None if the data has no version metadata
+      or the columns cannot reproduce it exactly.
+    """
+    model_version, versions, staleness = (data.get(key) for key in DATA_COLUMNS[3:])
+    if type(model_version) is not int or not 0 <= model_version <= MAX_INT64:
+        return None
+    if not isinstance(versions, dict) or not isinstance(staleness, dict) or list(versions) != list(staleness):
+        return None
+    entries = []
+    for key, version in versions.items():
+        # Neighbor IDs are stored as ints and rebuilt as JSON object keys
+        if not isinstance(key, str) or not key.isdigit() or str(int(key)) != key or int(key) > MAX_INT64:
+            return None
+        if type(version) is not int or not 0 <= version <= MAX_INT64 or type(staleness[key]) is not float:
+            return None
+        entries.append((int(key), version, staleness[key]))
+    return model_version, entries
+
+def write_columnar_ledger(transactions, directory, summary=None):
+    """
+    Writes transactions (in the JSON ledger layout) to a columnar ledger directory.
+
+    Parameters:
+    - transactions: An iterable of transaction dictionaries.
+    - directory: Destination directory. It is created if needed and existing columns are overwritten.
+    - summary: Optional summary of pruned history, stored as is.
+
+    Raises:
+    - ValueError: If a transaction's hash or contract depth cannot be stored in the columns.
+    """
+    transactions = list(transactions)
+    count = len(transactions)
+    hash_ids = np.empty(count, dtype=np.int64)
+    added_by = np.full(count, -1, dtype=np.int32)
+    losses = np.full(count, np.nan, dtype=np.float64)
+    message_codes = np.full(count, -1, dtype=np.int16)
+    contract_depths = np.zeros(count, dtype=np.int8)
+    approval_offsets = np.zeros(count + 1, dtype=np.int64)
+    approvals = []
+    model_versions = np.full(count, -1, dtype=np.int64)
+    neighbor_offsets = np.zeros(count + 1, dtype=np.int64)
+    neighbors = []  # (neighbor, version, staleness) entries
+    messages = {}
+    extras = {}
+
+    for row, transaction in enumerate(transactions):
+        hash_ids[row] = hash_to_id(transaction["hash"])
+        contract_depth = transaction.get("contract_depth", 0)
+        if type(contract_depth) is not int or not 0 <= contract_depth <= MAX_CONTRACT_DEPTH:
+            raise ValueError(f"Contract depth {contract_depth!r} cannot be stored in the columnar format.")
+        contract_depths[row] = contract_depth
+        approvals.extend(hash_to_id(approved) for approved in transaction["approving_transactions"])
+        approval_offsets[row + 1] = len(approvals)
+
+        data = transaction["data"]
+        entries = version_entries(data) if isinstance(data, dict) else None
+        if entries is not None:
+            model_versions[row] = entries[0]
+            neighbors.extend(entries[1])
+        neighbor_offsets[row + 1] = len(neighbors)
+        if not isinstance(data, dict):
+            extras[str(row)] = data
+            continue
+        node, loss, message = data.get("added_by"), data.get("loss"), data.get("message")
+        if type(node) is int and 0 <= node <= MAX_ADDED_BY:
+            added_by[row] = node
+        if isinstance(loss, (int, float)):
+            losses[row] = loss
+        if isinstance(message, str) and (message in messages or len(messages) < MAX_MESSAGES):
+            message_codes[row] = messages.setdefault(message, len(messages))
+        # Keep the full data whenever the columns cannot reproduce it exactly (iter_transactions rebuilds floats
+        # from the loss column and leaves out the keys whose column holds the missing marker)
+        if any(key not in DATA_COLUMNS for key in data) or \
+           ("added_by" in data and added_by[row] < 0) or \
+           ("loss" in data and (type(loss) is not float or loss != loss)) or \
+           ("message" in data and message_codes[row] < 0) or \
+           (entries is None and any(key in data for key in DATA_COLUMNS[3:])):
+            extras[str(row)] = data
+
+    os.makedirs(directory, exist_ok=True)
+    columns = {"hash_id": hash_ids, "added_by": added_by, "loss": losses, "message_code": message_codes,
+               "contract_depth": contract_depths, "approval_offsets": approval_offsets,
+               "approvals": np.array(approvals, dtype=np.int64), "model_version": model_versions,
+               "neighbor_offsets": neighbor_offsets,
+               "neighbor_ids": np.array([entry[0] for entry in neighbors], dtype=np.int64),
+               "neighbor_versions": np.array([entry[1] for entry in neighbors], dtype=np.int64),
+               "neighbor_staleness": np.array([entry[2] for entry in neighbors], dtype=np.float64)}
+    for name, column in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), column)
+    with open(os.path.join(directory, METADATA_FILE), 'w') as file:
+        json.dump({"version": FORMAT_VERSION, "count": count, "messages": list(messages), "extras": extras,
+                   "summary": summary}, file)
+
+class ColumnarLedger:
+    def __init__(self, directory):
+        """
+        Opens a columnar ledger directory with memory-mapped columns.
+
+        Parameters:
+        - directory: The ledger directory written by write_columnar_ledger.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, METADATA_FILE), 'r') as file:
+            metadata = json.load(file)
+        self.messages = metadata["messages"]
+        self.summary = metadata.get("summary")
+        self.extras = {int(row): data for row, data in metadata["extras"].items()}
+        for name in COLUMNS:
+            if name in VERSION_COLUMNS and metadata.get("version", 1) < 2:
+                continue
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r'))
+        if metadata.get("version", 1) < 2:
+            self.model_version = np.full(len(self.hash_id), -1, dtype=np.int64)
+            self.neighbor_offsets = np.zeros(len(self.hash_id) + 1, dtype=np.int64)
+            self.neighbor_ids = self.neighbor_versions = np.zeros(0, dtype=np.int64)
+            self.neighbor_staleness = np.zeros(0, dtype=np.float64)
+        self._hash_ids_sorted = None  # Whether row_of can binary search the hash ids (decided on first use)
+        self._row_by_hash_id = None  # Fallback lookup table for ledgers whose hash ids are not increasing
+
+    def __len__(self):
+        return len(self.hash_id)
+
+    def transaction(self, row):
+        """
+        Rebuilds one transaction in the JSON ledger layout.
+
+        Parameters:
+        - row: The position of the transaction in the ledger.
+
+        Returns:
+        - The transaction dictionary.
+        """
+        return next(self.iter_transactions(row, row + 1))
+
+    def iter_transactions(self, start=0, stop=None):
+        """
+        Rebuilds transactions in the JSON ledger layout, in ledger order.
+
+        Parameters:
+        - start: First row to rebuild.
+        - stop: Row to stop before (defaults to the end of the ledger).
+
+        Yields:
+        - Transaction dictionaries.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        # Convert whole column ranges at once; per-element NumPy access would dominate the cost
+        hash_ids = self.hash_id[start:stop].tolist()
+        added_by = self.added_by[start:stop].tolist()
+        losses = self.loss[start:stop].tolist()
+        message_codes = self.message_code[start:stop].tolist()
+        contract_depths = self.contract_depth[start:stop].tolist()
+        offsets = self.approval_offsets[start:stop + 1].tolist()
+        approvals = self.approvals[offsets[0]:offsets[-1]].tolist() if offsets else []
+        base = offsets[0] if offsets else 0
+        model_versions = self.model_version[start:stop].tolist()
+        neighbor_offsets = self.neighbor_offsets[start:stop + 1].tolist()
+        neighbor_start, neighbor_stop = (neighbor_offsets[0], neighbor_offsets[-1]) if neighbor_offsets else (0, 0)
+        neighbor_keys = [str(neighbor) for neighbor in self.neighbor_ids[neighbor_start:neighbor_stop].tolist()]
+        neighbor_versions = self.neighbor_versions[neighbor_start:neighbor_stop].tolist()
+        neighbor_staleness = self.neighbor_staleness[neighbor_start:neighbor_stop].tolist()
+
+        for index in range(stop - start):
+            row = start + index
+            data = self.extras.get(row)
+            if data is None:
+                data = {}
+                if losses[index] == losses[index]:  # Not NaN
+                    data["loss"] = losses[index]
+                if message_codes[index] >= 0:
+                    data["message"] = self.messages[message_codes[index]]
+                if added_by[index] >= 0:
+                    data["added_by"] = added_by[index]
+                if model_versions[index] >= 0:
+                    first = neighbor_offsets[index] - neighbor_start
+                    last = neighbor_offsets[index + 1] - neighbor_start
+                    data["model_version"] = model_versions[index]
+                    data["neighbor_versions"] = dict(zip(neighbor_keys[first:last], neighbor_versions[first:last]))
+                    data["neighbor_staleness"] = dict(zip(neighbor_keys[first:last], neighbor_staleness[first:last]))
+            transaction = {
+                "hash": id_to_hash(hash_ids[index]),
+                "approving_transactions": [id_to_hash(approved) for approved in
+                                           approvals[offsets[index] - base:offsets[index + 1] - base]],
+                "data": data,
+            }
+            if contract_depths[index]:
+                transaction["contract_depth"] = contract_depths[index]
+            yield transaction
+
+    def row_of(self, hash_id):
+        """
+        Finds the row holding a transaction.
+
+        Parameters:
+        - hash_id: The numeric id of the transaction's hash.
+
+        Returns:
+        - The row, or None if no transaction of the ledger has this hash.
+        """
+        if self._hash_ids_sorted is None:
+            # Ledger order is also hash order, unless the ledger was assembled from several sources
+            hash_ids = np.asarray(self.hash_id)
+            self._hash_ids_sorted = bool(np.all(hash_ids[1:] > hash_ids[:-1]))
+            if not self._hash_ids_sorted:
+                self._row_by_hash_id = {hash_id: row for row, hash_id in enumerate(hash_ids.tolist())}
+        if not self._hash_ids_sorted:
+            return self._row_by_hash_id.get(hash_id)
+        row = int(np.searchsorted(self.hash_id, hash_id))
+        return row if row < len(self) and self.hash_id[row] == hash_id else None
+
+    def loss_by_node(self, node_id):
+        """
+        Retrieves a node's loss history as vectorized slices of the columns.
+
+        Parameters:
+        - node_id: The node whose losses are retrieved (the transactions' "added_by").
+
+        Returns:
+        - A tuple (hash_ids, losses) of NumPy arrays, in ledger order.
+        """
+        mask = (self.added_by == node_id) & ~np.isnan(self.loss) & (self.contract_depth == 0)
+        return np.asarray(self.hash_id[mask]), np.asarray(self.loss[mask])
+
+    def mean_loss_by_node(self):
+        """
+        Computes every node's mean recorded loss in one pass over the columns.
+
+        Returns:
+        - A dictionary mapping node IDs to mean losses.
+        """
+        mask = (self.added_by >= 0) & ~np.isnan(self.loss) & (self.contract_depth == 0)
+        nodes = np.asarray(self.added_by[mask])
+        losses = np.asarray(self.loss[mask])
+        counts = np.bincount(nodes)
+        sums = np.bincount(nodes, weights=losses)
+        return {int(node): float(sums[node] / counts[node]) for node in np.nonzero(counts)[0]}
+
+class ColumnarTransactions:
+    def __init__(self, ledger, start=0, appended=None):
+        """
+        List-like sequence of transactions backed by a columnar ledger: rows `start` onwards of the memory-mapped
+        columns, rebuilt only when they are read, followed by the transactions appended in memory. Supports
+        what MockTangle does with its ledger list: len, indexing, iteration, append and slicing.
+
+        Parameters:
+        - ledger: The ColumnarLedger holding the columns.
+        - start: First row of the columns that belongs to the sequence (rows before it were pruned).
+        - appended: List of transactions following the columnar rows.
+        """
+        self.ledger = ledger
+        self.start = start
+        self.appended = [] if appended is None else appended
+
+    @property
+    def column_rows(self):
+        """Number of transactions backed by the columns."""
+        return len(self.ledger) - self.start
+
+    def __len__(self):
+        return self.column_rows + len(self.appended)
+
+    def append(self, transaction):
+        self.appended.append(transaction)
+
+    def __iter__(self):
+        yield from self._iter_columns(0, self.column_rows)
+        # The list iterator also yields transactions appended meanwhile, like iterating over a list does
+        yield from self.appended
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop == len(self) and start <= self.column_rows:
+                # Tail slices (the live part of a pruned ledger) keep the columns as their backing store
+                return ColumnarTransactions(self.ledger, self.start + start, list(self.appended))
+            return list(self._iter_columns(start, min(stop, self.column_rows))) + \
+                self.appended[max(0, start - self.column_rows):max(0, stop - self.column_rows)]
+        column_rows = self.column_rows
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ledger index out of range")
+        if index >= column_rows:
+            return self.appended[index - column_rows]
+        return self.ledger.transaction(self.start + index)
+
+    def find(self, transaction_hash):
+        """
+        Looks a transaction up among the columnar rows.
+
+        Parameters:
+        - transaction_hash: The hash of the transaction.
+
+        Returns:
+        - The transaction, or None if it is not held by the columns (or was pruned).
+        """
+        try:
+            row = self.ledger.row_of(hash_to_id(transaction_hash))
+        except ValueError:
+            return None
+        if row is None or row < self.start:
+            return None
+        return self.ledger.transaction(row)
+
+    def _iter_columns(self, start, stop):
+        # Rebuilds the columnar rows start..stop (relative to self.start) in chunks
+        for chunk_start in range(start, stop, ITERATION_CHUNK):
+            yield from self.ledger.iter_transactions(self.start + chunk_start,
+                                                     self.start + min(stop, chunk_start + ITERATION_CHUNK))
+
+def json_to_columnar(json_path, directory):
+    """
+    Converts a JSON ledger file (the mocked_iota_ledger.json layout) to a columnar ledger directory.
+    """
+    with open(json_path, 'r') as file:
+        ledger = json.load(file)
+    write_columnar_ledger(ledger.get("transactions", []), directory, summary=ledger.get("summary"))
+
+def columnar_to_json(directory, json_path):
+    """
+    Converts a columnar ledger directory back to a JSON ledger file (the mocked_iota_ledger.json layout).
+    """
+    ledger = ColumnarLedger(directory)
+    document = {"transactions": list(ledger.iter_transactions())}
+    if ledger.summary is not None:
+        document["summary"] = ledger.summary
+    with open(json_path, 'w') as file:
+        json.dump(document, file, indent=4)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ledgers between the JSON and the columnar format.")
+    parser.add_argument("direction", choices=["to-columnar", "to-json"])
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+
+    if args.direction == "to-columnar":
+        json_to_columnar(args.source, args.destination)
+    else:
+        columnar_to_json(args.source, args.destination)
@@ -0,0 +1,228 @@
+import queue
+import threading
+import time
+from collections import deque
+from instrumentation import METRICS
+
+######################
+# Smart contract engine
+# Contracts declare the transaction data keys they subscribe to (e.g. "loss", "env_data"), and each transaction
+# is dispatched only to the contracts subscribed to one of its keys. Contracts without subscriptions see every
+# transaction.
+#
+# Evaluation is taken off the tangle's write path: add_transaction only hands the transaction to the engine,
+# and a worker thread evaluates queued transactions in batches, grouped per contract. Transactions that a
+# contract action adds to the tangle are queued like any other transaction instead of being evaluated
+# recursively, and they carry a depth (number of contract actions they descend from). Transactions at or
+# beyond max_depth are committed but not dispatched again, which prevents contracts from triggering each
+# other (or themselves) endlessly.
+######################
+
+class ContractMetrics:
+    def __init__(self):
+        """
+        Holds evaluation statistics of a single contract.
+        """
+        self.evaluations = 0  # Transactions evaluated
+        self.executions = 0  # Transactions for which the action ran
+        self.batches = 0
+        self.total_seconds = 0.0
+        self.max_batch_seconds = 0.0
+        self.errors = 0
+
+    def as_dict(self):
+        return {
+            "evaluations": self.evaluations,
+            "executions": self.executions,
+            "batches": self.batches,
+            "errors": self.errors,
+            "total_seconds": self.total_seconds,
+            "mean_latency_us": self.total_seconds / self.evaluations * 1e6 if self.evaluations else 0.0,
+            "max_batch_seconds": self.max_batch_seconds,
+        }
+
+class ContractEngine:
+    def __init__(self, threaded=True, batch_size=256, max_depth=1):
+        """
+        Initializes the engine.
+
+        Parameters:
+        - threaded: If True, contracts are evaluated by a background worker thread. Otherwise they are evaluated
+                    by the thread adding the transaction, still without recursion.
+        - batch_size: Maximum number of transactions evaluated in one batch.
+        - max_depth: Transactions emitted through this many nested contract actions are not dispatched again
+                     (at least 1: transactions not emitted by contracts are always dispatched).
+        """
+        self.batch_size = batch_size
+        self.max_depth = max(1, max_depth)
+        self.contracts = []
+        self.subscribers = {}  # data key -> contracts subscribed to it
+        self.catch_all = []  # Contracts without subscriptions
+        self.metrics = {}  # contract name -> ContractMetrics
+        self.suppressed = 0  # Transactions not dispatched because of the depth limit
+        self.lock = threading.Lock()  # Guards registration and metrics
+        self.local = threading.local()  # Depth and context of the contract action running in the current thread
+
+        self.queue = None
+        self.pending = deque()  # Synchronous mode only
+        self.thread = None
+        if threaded:
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self._drain, name="contract-engine", daemon=True)
+            self.thread.start()
+
+    def register(self, contract):
+        """
+        Deploys a contract on the engine.
+
+        Parameters:
+        - contract: A SmartContract instance.
+        """
+        with self.lock:
+            self.contracts.append(contract)
+            if contract.name is None:
+                contract.name = f"contract_{len(self.contracts) - 1}"
+            self.metrics[contract.name] = ContractMetrics()
+            if contract.subscriptions:
+                for key in contract.subscriptions:
+                    self.subscribers.setdefault(key, []).append(contract)
+            else:
+                self.catch_all.append(contract)
+
+    def current_depth(self):
+        """
+        Returns the contract depth of a transaction added by the current thread:
+        0 outside of contract actions, n inside an action triggered by a depth n-1 transaction.
+        """
+        return getattr(self.local, "depth", 0)
+
+    def current_context(self):
+        """
+        Returns the context submitted with the transaction being evaluated by the current thread, or None.
+        """
+        return getattr(self.local, "context", None)
+
+    def matching_contracts(self, data):
+        """
+        Returns the contracts subscribed to at least one key of the transaction data, in deployment order.
+        """
+        if not isinstance(data, dict):
+            return list(self.catch_all)
+        matched = set(self.catch_all)
+        for key in data:
+            matched.update(self.subscribers.get(key, ()))
+        if len(matched) <= 1:
+            return list(matched)
+        return [contract for contract in self.contracts if contract in matched]
+
+    def submit(self, data, depth=0, context=None):
+        """
+        Queues a committed transaction's data for evaluation by the subscribed contracts.
+
+        Parameters:
+        - data: The data of the committed transaction.
+        - depth: Number of nested contract actions the transaction descends from.
+        - context: Facts recorded by the ledger when the transaction was committed (e.g. the node's previous
+                   loss), which contracts read through current_context while they evaluate it. Contracts are
+                   evaluated behind the writers, so they cannot recompute these from the ledger's current state.
+        """
+        if depth >= self.max_depth:
+            self.suppressed += 1
+            return
+        if not self.matching_contracts(data):
+            return
+        if self.queue is not None:
+            self.queue.put((data, depth, context))
+            return
+
+        self.pending.append((data, depth, context))
+        if getattr(self.local, "draining", False):
+            return  # Submitted by an action; the drain loop below picks it up
+        self.local.draining = True
+        try:
+            while self.pending:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                self._evaluate_batch(batch)
+        finally:
+            self.local.draining = False
+
+    def flush(self):
+        """
+        Blocks until every queued transaction has been evaluated, including those emitted by contract actions.
+        """
+        if self.queue is not None:
+            self.queue.join()
+
+    def close(self):
+        """
+        Evaluates the remaining transactions and stops the worker thread.
+        """
+        if self.thread is not None:
+            self.queue.join()
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def get_metrics(self):
+        """
+        Returns per-contract evaluation statistics.
+
+        Returns:
+        - A dictionary with the per-contract counters and latencies under "contracts" (keyed by contract name)
+          and the number of transactions not dispatched because of the depth limit.
+        """
+        with self.lock:
+            contracts = {name: contract_metrics.as_dict() for name, contract_metrics in self.metrics.items()}
+        return {"contracts": contracts, "suppressed_by_depth_limit": self.suppressed}
+
+    def _drain(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is None for item in batch)
+            try:
+                self._evaluate_batch([item for item in batch if item is not None])
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def _evaluate_batch(self, batch):
+        # Group the batch per contract so that each contract evaluates all of its transactions in one go
+        per_contract = {}
+        for data, depth, context in batch:
+            for contract in self.matching_contracts(data):
+                per_contract.setdefault(contract, []).append((data, depth, context))
+
+        for contract, items in per_contract.items():
+            executions = errors = 0
+            start_time = time.perf_counter()
+            for data, depth, context in items:
+                self.local.depth = depth + 1  # Transactions added by the action are one level deeper
+                self.local.context = context
+                try:
+                    if contract.evaluate_and_execute(data):
+                        executions += 1
+                except Exception as e:
+                    errors += 1
+                    print(f"Smart contract {contract.name} failed: {e}")
+                finally:
+                    self.local.depth = 0
+                    self.local.context = None
+            elapsed = time.perf_counter() - start_time
+            METRICS.observe("contract_evaluation_seconds", elapsed, contract=contract.name)
+            METRICS.increment("contract_evaluations_total", len(items), contract=contract.name)
+            METRICS.increment("contract_executions_total", executions, contract=contract.name)
+            with self.lock:
+                metrics = self.metrics[contract.name]
+                metrics.evaluations += len(items)
+                metrics.executions += executions
+                metrics.errors += errors
+                metrics.batches += 1
+                metrics.total_seconds += elapsed
+                metrics.max_batch_seconds = max(metrics.max_batch_seconds, elapsed)
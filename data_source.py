@@ -0,0 +1,283 @@
+import abc
+import glob
+import os
+import threading
+import numpy as np
+import tensorflow as tf
+
+######################
+# Per-node data sources
+# A node pulls one (x, y) batch per SGD step from its data source instead of training on one dense tensor:
+# - InMemoryDataSource: samples held in memory (the synthetic mock data). Without a batch size every batch is the
+#   full dataset, which is the original full-batch behaviour.
+# - ShardedFileDataSource: a sensor history split over CSV shard files (one sample per line: features, then the
+#   label). Shards are read line by line by a tf.data pipeline that interleaves them, shuffles through a bounded
+#   buffer, batches and prefetches, so only the buffers are ever held in memory.
+# - StreamingDataSource: a fixed-capacity window over the most recent readings; new readings are appended as they
+#   arrive (from any thread) and overwrite the oldest ones, and batches are sampled from the window.
+#
+# In every case the memory held per node is bounded by the batch size, the shuffle and prefetch buffers, or the
+# window capacity, never by the length of the history.
+#
+# get_state/set_state capture a source's position for checkpoints (see checkpoint.py) as a cursor of constant size:
+# the epoch and the offset in its sample order, or the epoch, the shard and the row in it. Sample orders are drawn
+# from the seed and the epoch alone, so resuming never replays the batches already served.
+######################
+
+_UNBOUNDED = 2 ** 62  # End of the tf.data ranges that never run out
+
+class DataSource(abc.ABC):
+    """Base class of per-node data sources. Subclasses must implement next_batch."""
+
+    @abc.abstractmethod
+    def next_batch(self):
+        """
+        Returns the next training batch.
+
+        Returns:
+        - A tuple (x, y) of float32 tensors of shapes [batch, features] and [batch, 1].
+        """
+
+    def get_state(self):
+        """
+        Returns the source's position as a dictionary of NumPy arrays and JSON-serializable values.
+        """
+        return {}
+
+    def set_state(self, state):
+        """
+        Resumes from a state returned by get_state.
+        """
+
+class InMemoryDataSource(DataSource):
+    def __init__(self, x, y, batch_size=None, shuffle_buffer=None, seed=None):
+        """
+        Serves batches from samples held in memory. Every epoch visits the samples in a new order, and batches
+        run on from one epoch into the next.
+
+        Parameters:
+        - x: Features, of shape [samples, features].
+        - y: Labels, of shape [samples, 1].
+        - batch_size: Number of samples per batch, or None to train on the full dataset every step.
+        - shuffle_buffer: Number of consecutive samples shuffled together (defaults to the whole dataset).
+        - seed: Seed for the shuffling (drawn at random if None, and saved with the state).
+        """
+        self.x = tf.convert_to_tensor(x, dtype=tf.float32)
+        self.y = tf.convert_to_tensor(y, dtype=tf.float32)
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = _random_seed() if seed is None else seed
+        # Position: epoch and number of samples of its order served so far
+        self.epoch = 0
+        self.offset = 0
+        self.order = None  # Sample order of the current epoch, drawn on demand
+
+    def _epoch_order(self, epoch):
+        # Drawn from (seed, epoch) alone, so that resuming only regenerates the order of the current epoch
+        rng = np.random.default_rng([self.seed, epoch])
+        samples = int(self.x.shape[0])
+        window = self.shuffle_buffer or samples
+        order = np.arange(samples)
+        for start in range(0, samples, window):
+            rng.shuffle(order[start:start + window])
+        return order
+
+    def next_batch(self):
+        if self.batch_size is None:
+            return self.x, self.y
+        indices = []
+        needed = self.batch_size
+        while needed:
+            if self.order is None:
+                self.order = self._epoch_order(self.epoch)
+            served = self.order[self.offset:self.offset + needed]
+            indices.append(served)
+            needed -= len(served)
+            self.offset += len(served)
+            if self.offset == len(self.order):
+                self.epoch, self.offset, self.order = self.epoch + 1, 0, None
+        indices = np.concatenate(indices) if len(indices) > 1 else indices[0]
+        return tf.gather(self.x, indices), tf.gather(self.y, indices)
+
+    def get_state(self):
+        # The samples are saved too: without a seed they cannot be generated again
+        return {"x": self.x.numpy(), "y": self.y.numpy(), "seed": self.seed, "epoch": self.epoch,
+                "offset": self.offset}
+
+    def set_state(self, state):
+        self.x = tf.convert_to_tensor(state["x"], dtype=tf.float32)
+        self.y = tf.convert_to_tensor(state["y"], dtype=tf.float32)
+        self.seed = int(state["seed"])
+        self.epoch = int(state["epoch"])
+        self.offset = int(state["offset"])
+        self.order = None
+
+class ShardedFileDataSource(DataSource):
+    def __init__(self, file_pattern, features, batch_size=32, shuffle_buffer=1024, seed=None, repeat=True):
+        """
+        Streams batches from CSV shard files on disk. Every epoch reads the shards one after the other, in a new
+        order, and shuffles the rows of each shard within consecutive windows of shuffle_buffer rows.
+
+        Parameters:
+        - file_pattern: Glob pattern of the shard files (e.g. "data/node_0/shard_*.csv").
+        - features: Number of feature columns; the column after them is the label.
+        - batch_size: Number of samples per batch.
+        - shuffle_buffer: Number of rows shuffled together (bounds the memory used for shuffling).
+        - seed: Seed for the shard order and the shuffling (drawn at random if None, and saved with the state).
+        - repeat: If True, the shards are read again once exhausted; otherwise next_batch raises StopIteration.
+        """
+        self.files = sorted(glob.glob(file_pattern))
+        if not self.files:
+            raise ValueError(f"No data shards match '{file_pattern}'.")
+        self.features = features
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = _random_seed() if seed is None else seed
+        self.repeat = repeat
+        # Position: epoch, position of the current shard in the epoch's shard order, and rows of it served so far.
+        # The cursor of the last served batch stays on the device until the state is requested.
+        self.cursor = (0, 0, 0)
+        self.iterator = self._build_iterator()
+
+    def _build_iterator(self):
+        # Shard orders and windows are shuffled with stateless random ops keyed by (seed, epoch, shard, window),
+        # so the pipeline can start at any cursor: only the rows of the current shard before it are skipped
+        start_epoch, start_position, start_row = (tf.constant(value, tf.int64) for value in self.cursor)
+        files = tf.constant(self.files)
+        file_count = len(self.files)
+        window_size = tf.constant(self.shuffle_buffer, tf.int64)
+        order_key = tf.constant([self.seed, 0], tf.int64)
+        window_key = tf.constant([self.seed, 1], tf.int64)
+        fold_in = tf.random.experimental.stateless_fold_in
+
+        def epoch_shards(epoch):
+            order = tf.argsort(tf.random.stateless_uniform([file_count], seed=fold_in(order_key, epoch)))
+            shards = tf.data.Dataset.zip((tf.data.Dataset.range(file_count),
+                                          tf.data.Dataset.from_tensor_slices(tf.cast(order, tf.int64))))
+            shards = shards.filter(lambda position, _: (epoch > start_epoch) | (position >= start_position))
+            return shards.map(lambda position, file_index: (epoch, position, file_index))
+
+        def shard_rows(epoch, position, file_index):
+            skip = tf.where((epoch == start_epoch) & (position == start_position), start_row, tf.constant(0, tf.int64))
+            first_window = skip // window_size
+            rows = tf.data.experimental.CsvDataset(tf.gather(files, file_index), [tf.float32] * (self.features + 1))
+            windows = tf.data.Dataset.zip((tf.data.Dataset.range(first_window, _UNBOUNDED),
+                                           rows.skip(first_window * window_size).batch(window_size)))
+
+            def shuffle_window(window, columns):
+                key = fold_in(fold_in(fold_in(window_key, epoch), file_index), window)
+                permutation = tf.argsort(tf.random.stateless_uniform(tf.shape(columns[0]), seed=key))
+                return tuple(tf.gather(column, permutation) for column in columns)
+
+            rows = windows.map(shuffle_window).unbatch()
+            # Every row carries the cursor after it, i.e. (epoch, position, rows of the shard served)
+            served = tf.data.Dataset.range(first_window * window_size + 1, _UNBOUNDED)
+            rows = tf.data.Dataset.zip((rows, served)).skip(skip - first_window * window_size)
+            return rows.map(lambda columns, row: (columns, tf.stack([epoch, position, row])))
+
+        epochs = tf.data.Dataset.range(start_epoch, _UNBOUNDED if self.repeat else 1)
+        dataset = epochs.flat_map(epoch_shards).flat_map(shard_rows)
+        dataset = dataset.batch(self.batch_size).map(self._split_columns)
+        return iter(dataset.prefetch(tf.data.AUTOTUNE))
+
+    def _split_columns(self, columns, cursors):
+        x = tf.stack(columns[:self.features], axis=1)
+        return x, tf.expand_dims(columns[self.features], axis=1), cursors[-1]
+
+    def next_batch(self):
+        x, y, self.cursor = next(self.iterator)
+        return x, y
+
+    def get_state(self):
+        epoch, position, row = (int(value) for value in np.asarray(self.cursor))
+        return {"seed": self.seed, "epoch": epoch, "position": position, "row": row}
+
+    def set_state(self, state):
+        self.seed = int(state["seed"])
+        self.cursor = (int(state["epoch"]), int(state["position"]), int(state["row"]))
+        self.iterator = self._build_iterator()
+
+class StreamingDataSource(DataSource):
+    def __init__(self, features, capacity=10000, batch_size=32, seed=None):
+        """
+        Keeps a sliding window over the most recent readings and samples batches from it.
+
+        Parameters:
+        - features: Number of features per reading.
+        - capacity: Number of most recent readings kept.
+        - batch_size: Number of samples per batch (at most the number of readings received so far).
+        - seed: Seed for the batch sampling.
+        """
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros((capacity, features), dtype=np.float32)
+        self.y = np.zeros((capacity, 1), dtype=np.float32)
+        self.position = 0  # Next row to overwrite
+        self.count = 0  # Rows holding readings
+        self.lock = threading.Lock()
+
+    def append(self, x, y):
+        """
+        Adds new readings, overwriting the oldest ones once the window is full.
+
+        Parameters:
+        - x: Features, of shape [readings, features] (or [features] for a single reading).
+        - y: Labels, of shape [readings, 1] (or a scalar for a single reading).
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.x.shape[1])
+        y = np.asarray(y, dtype=np.float32).reshape(-1, 1)
+        if len(x) > self.capacity:
+            x, y = x[-self.capacity:], y[-self.capacity:]
+        with self.lock:
+            rows = (self.position + np.arange(len(x))) % self.capacity
+            self.x[rows] = x
+            self.y[rows] = y
+            self.position = (self.position + len(x)) % self.capacity
+            self.count = min(self.count + len(x), self.capacity)
+
+    def next_batch(self):
+        with self.lock:
+            if self.count == 0:
+                raise ValueError("The streaming data source has not received any reading yet.")
+            rows = self.rng.choice(self.count, size=min(self.batch_size, self.count), replace=False)
+            x, y = self.x[rows], self.y[rows]
+        return tf.convert_to_tensor(x), tf.convert_to_tensor(y)
+
+    def get_state(self):
+        with self.lock:
+            return {"x": self.x.copy(), "y": self.y.copy(), "position": self.position, "count": self.count,
+                    "rng": self.rng.bit_generator.state}
+
+    def set_state(self, state):
+        with self.lock:
+            self.x[:] = state["x"]
+            self.y[:] = state["y"]
+            self.position = int(state["position"])
+            self.count = int(state["count"])
+            self.rng.bit_generator.state = state["rng"]
+
+def _random_seed():
+    # Seed for sources created without one; saved with their state so that a resumed run continues the same order
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+def write_csv_shards(x, y, directory, rows_per_shard=10000, prefix="shard"):
+    """
+    Writes a dataset as CSV shards readable by ShardedFileDataSource.
+
+    Parameters:
+    - x: Features, of shape [samples, features].
+    - y: Labels, of shape [samples, 1].
+    - directory: Destination directory (created if needed).
+    - rows_per_shard: Number of samples per shard file.
+    - prefix: File name prefix of the shards.
+
+    Returns:
+    - A glob pattern matching the written shards.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rows = np.hstack([np.asarray(x), np.asarray(y).reshape(-1, 1)])
+    for shard, start in enumerate(range(0, len(rows), rows_per_shard)):
+        np.savetxt(os.path.join(directory, f"{prefix}_{shard:05d}.csv"), rows[start:start + rows_per_shard],
+                   delimiter=",", fmt="%.7g")
+    return os.path.join(directory, f"{prefix}_*.csv")
@@ -0,0 +1,241 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.managers import BaseManager
+import tensorflow as tf
+from checkpoint import Checkpointer, worker_checkpoint_path
+from mocktangle import MockTangle, create_loss_fluctuation_contract, create_significant_environment_change_contract
+from node import Node
+from scheduler import Scheduler
+
+######################
+# Node execution backends
+# - "threads": every node runs as a thread of the current process (the original behaviour).
+# - "processes": nodes are spread over worker processes, each hosting its share of the nodes as threads.
+#   With as many workers as nodes this is a process-per-node pool.
+# - "scheduler": a single event-driven Scheduler drives all nodes, in virtual time or paced by the wall clock.
+#
+# In process mode the tangle lives in a manager server process and nodes talk to it through proxies,
+# while gradients are exchanged through a GradientBoard placed in shared memory.
+######################
+
+BACKENDS = ("threads", "processes", "scheduler")
+
+# Smart contracts that can be deployed by name, so that they can be built next to the tangle in its own process
+CONTRACT_FACTORIES = {
+    "loss_fluctuation": create_loss_fluctuation_contract,
+    "significant_environment_change": create_significant_environment_change_contract,
+}
+
+def build_tangle(ledger_file_path, contracts=(), **tangle_kwargs):
+    """
+    Creates a MockTangle and deploys the requested smart contracts on it.
+
+    Parameters:
+    - ledger_file_path: Path to the ledger file storing transactions.
+    - contracts: Names of contracts from CONTRACT_FACTORIES to deploy.
+    - tangle_kwargs: Additional keyword arguments for MockTangle.
+
+    Returns:
+    - The MockTangle instance.
+    """
+    tangle = MockTangle(ledger_file_path, **tangle_kwargs)
+    for name in contracts:
+        tangle.add_smart_contract(CONTRACT_FACTORIES[name](tangle))
+    return tangle
+
+class TangleManager(BaseManager):
+    """Serves a single MockTangle to node processes through proxies."""
+
+TangleManager.register("MockTangle", callable=build_tangle)
+
+def start_tangle_service(ledger_file_path, contracts=(), **tangle_kwargs):
+    """
+    Starts a manager process hosting the tangle.
+
+    Parameters:
+    - ledger_file_path: Path to the ledger file storing transactions.
+    - contracts: Names of contracts from CONTRACT_FACTORIES to deploy.
+    - tangle_kwargs: Additional keyword arguments for MockTangle.
+
+    Returns:
+    - A tuple (manager, tangle_proxy). Call manager.shutdown() after closing the tangle.
+    """
+    manager = TangleManager(ctx=multiprocessing.get_context("spawn"))
+    manager.start()
+    return manager, manager.MockTangle(ledger_file_path, contracts, **tangle_kwargs)
+
+def configure_gpu(num_nodes):
+    """
+    Limits TensorFlow's memory on the first GPU according to the number of nodes sharing it.
+
+    Parameters:
+    - num_nodes: Number of nodes that will run in this process.
+
+    Returns:
+    - The list of physical GPU devices (empty if running on CPU).
+    """
+    use_gpu = tf.config.list_physical_devices('GPU')
+    if use_gpu:
+        try:
+            tf.config.experimental.set_virtual_device_configuration(
+                use_gpu[0],
+                [tf.config.experimental.VirtualDeviceConfiguration(memory_limit=1024*num_nodes)])
+        except RuntimeError as e:
+            print(e)
+    return use_gpu
+
+def create_nodes(node_ids, tangle, gradient_board, neighbors, node_kwargs, node_states=None):
+    """
+    Creates the Node objects hosted by the current process.
+
+    Parameters:
+    - node_ids: Identifiers of the nodes to create.
+    - tangle: The tangle (or a proxy to it) shared by all nodes.
+    - gradient_board: The GradientBoard shared by all nodes.
+    - neighbors: Dictionary mapping node IDs to lists of neighbor IDs.
+    - node_kwargs: Keyword arguments passed to every Node (run_period, data_size, features, ...).
+    - node_states: Optional dictionary mapping node IDs to checkpointed states to resume from.
+
+    Returns:
+    - A list of Node objects.
+    """
+    node_states = node_states or {}
+    return [Node(node_id, tangle=tangle, neighbors=neighbors.get(node_id, None), gradient_board=gradient_board,
+                 state=node_states.get(node_id), **node_kwargs) for node_id in node_ids]
+
+def run_node_threads(node_ids, tangle, gradient_board, neighbors, node_kwargs, max_steps=None, results=None,
+                     node_states=None, checkpoint_kwargs=None):
+    """
+    Creates the given nodes and runs each of them in its own thread until they stop.
+
+    Parameters:
+    - node_ids: Identifiers of the nodes to host.
+    - tangle: The tangle (or a proxy to it) shared by all nodes.
+    - gradient_board: The GradientBoard shared by all nodes.
+    - neighbors: Dictionary mapping node IDs to lists of neighbor IDs.
+    - node_kwargs: Keyword arguments passed to every Node (run_period, data_size, features, ...).
+    - max_steps: Number of SGD steps each node performs, or None to run forever.
+    - results: Optional queue receiving a (steps, elapsed_seconds) tuple once all nodes have stopped.
+    - node_states: Optional dictionary mapping node IDs to checkpointed states to resume from.
+    - checkpoint_kwargs: If given, keyword arguments of a Checkpointer (path, interval, ...) saving the nodes.
+    """
+    use_gpu = configure_gpu(len(node_ids))
+    nodes = create_nodes(node_ids, tangle, gradient_board, neighbors, node_kwargs, node_states)
+    checkpointer = Checkpointer(nodes=nodes, **checkpoint_kwargs).start() if checkpoint_kwargs is not None else None
+
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=node.run, args=(use_gpu, max_steps, stop_event)) for node in nodes]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        # Let every node finish its current update and record pending losses before exiting
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+        raise
+    finally:
+        if checkpointer is not None:
+            checkpointer.stop()
+    if results is not None:
+        results.put((len(nodes) * (max_steps or 0), time.perf_counter() - start_time))
+
+def run_nodes(backend, num_nodes, tangle, gradient_board, neighbors, node_kwargs, workers=None, max_steps=None,
+              clock=None, scheduler_kwargs=None, node_states=None, checkpoint_kwargs=None):
+    """
+    Runs all nodes with the selected execution backend and waits for them to stop.
+
+    Parameters:
+    - backend: One of BACKENDS.
+    - num_nodes: Number of nodes in the decentralized system.
+    - tangle: The tangle shared by all nodes. Must be a tangle proxy for the "processes" backend.
+    - gradient_board: The GradientBoard shared by all nodes. Must be in shared memory for the "processes" backend.
+    - neighbors: Dictionary mapping node IDs to lists of neighbor IDs.
+    - node_kwargs: Keyword arguments passed to every Node.
+    - workers: Number of worker processes for the "processes" backend (defaults to one per CPU, at most one per node).
+    - max_steps: Number of SGD steps each node performs, or None to run forever.
+    - clock: SimulationClock advanced by the "scheduler" backend. It should also be the gradient board's clock.
+    - scheduler_kwargs: Additional keyword arguments for the Scheduler (virtual_time, jitter, until, ...).
+    - node_states: Optional dictionary mapping node IDs to checkpointed states to resume from.
+    - checkpoint_kwargs: If given, keyword arguments of the Checkpointer (path, interval) that periodically saves
+                         the nodes, the tangle's indexes, the gradient board and the clock.
+
+    Returns:
+    - Measured throughput in SGD steps per second over all nodes (0.0 when running forever is interrupted).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown execution backend '{backend}', expected one of {BACKENDS}.")
+
+    node_ids = list(range(num_nodes))
+    node_states = node_states or {}
+    if backend == "threads":
+        results = queue.Queue() if max_steps else None
+        if checkpoint_kwargs is not None:
+            checkpoint_kwargs = dict(checkpoint_kwargs, tangle=tangle, gradient_board=gradient_board)
+        run_node_threads(node_ids, tangle, gradient_board, neighbors, node_kwargs, max_steps, results, node_states,
+                         checkpoint_kwargs)
+        steps, elapsed = results.get() if results is not None else (0, 0.0)
+        return steps / elapsed if elapsed else 0.0
+
+    if backend == "scheduler":
+        nodes = create_nodes(node_ids, tangle, gradient_board, neighbors, node_kwargs, node_states)
+        scheduler = Scheduler(nodes, use_gpu=configure_gpu(num_nodes), clock=clock, max_steps=max_steps,
+                              **(scheduler_kwargs or {}))
+        checkpointer = None
+        if checkpoint_kwargs is not None:
+            checkpointer = Checkpointer(nodes=nodes, tangle=tangle, gradient_board=gradient_board,
+                                        clock=scheduler.clock, **checkpoint_kwargs).start()
+        start_time = time.perf_counter()
+        try:
+            steps = scheduler.run()
+        finally:
+            if checkpointer is not None:
+                checkpointer.stop()
+        elapsed = time.perf_counter() - start_time
+        return steps / elapsed if elapsed else 0.0
+
+    if gradient_board.shared_memory is None:
+        raise ValueError("The 'processes' backend needs a GradientBoard created with shared=True.")
+
+    # TensorFlow is not fork-safe, so workers are started from a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    workers = max(1, min(workers or os.cpu_count() or 1, num_nodes))
+    results = context.Queue()
+    processes = []
+    for worker in range(workers):
+        worker_node_ids = node_ids[worker::workers]
+        worker_checkpoint_kwargs = None
+        if checkpoint_kwargs is not None:
+            # Every worker saves the nodes it hosts to its own file
+            worker_checkpoint_kwargs = dict(checkpoint_kwargs,
+                                            path=worker_checkpoint_path(checkpoint_kwargs["path"], worker))
+        processes.append(context.Process(target=run_node_threads,
+                                         args=(worker_node_ids, tangle, gradient_board, neighbors, node_kwargs,
+                                               max_steps, results,
+                                               {node_id: node_states[node_id] for node_id in worker_node_ids
+                                                if node_id in node_states},
+                                               worker_checkpoint_kwargs),
+                                         name=f"node-worker-{worker}"))
+    checkpointer = None
+    if checkpoint_kwargs is not None:
+        checkpointer = Checkpointer(tangle=tangle, gradient_board=gradient_board, **checkpoint_kwargs).start()
+    for process in processes:
+        process.start()
+    try:
+        worker_results = [results.get() for _ in processes] if max_steps else []
+        for process in processes:
+            process.join()
+    finally:
+        if checkpointer is not None:
+            checkpointer.stop()
+
+    # Workers run side by side, so the slowest one determines the wall-clock time
+    steps = sum(steps for steps, _ in worker_results)
+    elapsed = max((elapsed for _, elapsed in worker_results), default=0.0)
+    return steps / elapsed if elapsed else 0.0
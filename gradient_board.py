@@ -0,0 +1,180 @@
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+######################
+# Shared gradient board
+# Every node owns one slot of a preallocated array and publishes its latest gradient (or model) there.
+# Neighbors read the slots they need directly from the array, so an exchange costs one array copy per
+# neighbor and no per-step allocations.
+#
+# Each slot is guarded by a sequence counter (seqlock): the publisher makes the counter odd while it writes
+# and even again when it is done. Readers never block publishers; they retry when they observe an odd counter
+# or a counter that changed while they were copying. The published version of a slot is counter // 2.
+#
+# A board can live in a shared memory block so that nodes hosted by different processes use the same slots.
+# Pickling a shared board (e.g. when passing it to a worker process) attaches to the block instead of copying it.
+######################
+
+class GradientBoard:
+    def __init__(self, num_nodes, shape, dtype=np.float32, clock=time.monotonic, shared=False, shared_memory_name=None):
+        """
+        Initializes a board with one slot per node.
+
+        Parameters:
+        - num_nodes: Number of nodes publishing to the board (node IDs are 0..num_nodes-1).
+        - shape: Shape of the tensor published by each node, e.g. (features, 1).
+        - dtype: NumPy dtype of the published tensors.
+        - clock: Callable returning the current time, used for publication timestamps and staleness checks.
+                 It must be comparable across processes when the board is shared (time.monotonic is).
+        - shared: If True, the board is allocated in a new shared memory block owned by this instance.
+        - shared_memory_name: Name of an existing shared memory block to attach to instead of allocating.
+        """
+        self.num_nodes = num_nodes
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.clock = clock
+        self.shared_memory = None
+        self.owns_shared_memory = False
+
+        slot_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        if shared_memory_name is not None:
+            # Child processes share the creator's resource tracker, so the block is only unlinked by the creator
+            self.shared_memory = shared_memory.SharedMemory(name=shared_memory_name)
+        elif shared:
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=16 * num_nodes + slot_size * num_nodes)
+            self.owns_shared_memory = True
+
+        if self.shared_memory is None:
+            self.sequences = np.zeros(num_nodes, dtype=np.int64)
+            self.timestamps = np.full(num_nodes, -np.inf, dtype=np.float64)
+            self.values = np.zeros((num_nodes,) + self.shape, dtype=self.dtype)
+        else:
+            # Layout: sequences (int64) | timestamps (float64) | values
+            buffer = self.shared_memory.buf
+            self.sequences = np.ndarray((num_nodes,), dtype=np.int64, buffer=buffer, offset=0)
+            self.timestamps = np.ndarray((num_nodes,), dtype=np.float64, buffer=buffer, offset=8 * num_nodes)
+            self.values = np.ndarray((num_nodes,) + self.shape, dtype=self.dtype, buffer=buffer, offset=16 * num_nodes)
+            if self.owns_shared_memory:
+                self.sequences[:] = 0
+                self.timestamps[:] = -np.inf
+                self.values[:] = 0
+
+    def __reduce__(self):
+        if self.shared_memory is None:
+            return super().__reduce__()
+        return (GradientBoard, (self.num_nodes, self.shape, self.dtype.str, self.clock, False, self.shared_memory.name))
+
+    def close(self):
+        """
+        Detaches from the shared memory block, and releases it if this instance created it.
+        """
+        if self.shared_memory is None:
+            return
+        # The arrays must not outlive the mapping they point into
+        self.sequences = self.timestamps = self.values = None
+        self.shared_memory.close()
+        if self.owns_shared_memory:
+            self.shared_memory.unlink()
+        self.shared_memory = None
+
+    def publish(self, node_id, tensor):
+        """
+        Publishes a node's latest tensor, replacing its previous version.
+
+        Parameters:
+        - node_id: The identifier of the publishing node.
+        - tensor: An array-like (NumPy array or eager tensor) with the board's shape.
+
+        Returns:
+        - The version number of the published tensor.
+        """
+        sequence = self.sequences[node_id] + 1
+        self.sequences[node_id] = sequence  # Odd: write in progress
+        np.copyto(self.values[node_id], tensor)
+        self.timestamps[node_id] = self.clock()
+        self.sequences[node_id] = sequence + 1
+        return int(sequence + 1) // 2
+
+    def version(self, node_id):
+        """
+        Returns the number of tensors published so far by a node (0 if it never published).
+        """
+        return int(self.sequences[node_id]) // 2
+
+    def read(self, node_id, out, receiver=None):
+        """
+        Copies a node's latest published tensor into a caller-provided buffer.
+
+        Parameters:
+        - node_id: The identifier of the node to read.
+        - out: A preallocated array with the board's shape receiving the tensor.
+        - receiver: The reading node. Unused: every node sees the same slots (see network_emulator.py).
+
+        Returns:
+        - A tuple (version, timestamp), or None if the node has not published anything yet.
+        """
+        while True:
+            sequence = self.sequences[node_id]
+            if sequence == 0:
+                return None
+            if sequence % 2:
+                time.sleep(0)  # The publisher is in the middle of a write; let it finish
+                continue
+            np.copyto(out, self.values[node_id])
+            timestamp = self.timestamps[node_id]
+            if self.sequences[node_id] == sequence:
+                return int(sequence) // 2, float(timestamp)
+
+    def accumulate(self, node_ids, out, scratch, max_staleness=None, receiver=None):
+        """
+        Adds the latest tensors of several nodes into `out`, skipping nodes that never published
+        or whose latest tensor is older than the staleness bound.
+
+        Parameters:
+        - node_ids: Iterable of node identifiers to read, typically a node's neighbors.
+        - out: A preallocated array with the board's shape the tensors are added to.
+        - scratch: A preallocated array with the board's shape used to take consistent copies.
+        - max_staleness: Maximum age (in clock units) of a tensor to be accepted, or None for no bound.
+        - receiver: The reading node. Unused: every node sees the same slots (see network_emulator.py).
+
+        Returns:
+        - The number of tensors added to `out`.
+        """
+        oldest_accepted = -np.inf if max_staleness is None else self.clock() - max_staleness
+        contributions = 0
+        for node_id in node_ids:
+            published = self.read(node_id, scratch)
+            if published is None or published[1] < oldest_accepted:
+                continue
+            np.add(out, scratch, out=out)
+            contributions += 1
+        return contributions
+
+    def get_state(self):
+        """
+        Takes a consistent copy of every slot for checkpoints. Publication times are saved as ages, since the
+        clock of a resumed run does not continue from the same value.
+
+        Returns:
+        - A dictionary with the arrays "versions", "ages" (inf for nodes that never published) and "values".
+        """
+        versions = np.zeros(self.num_nodes, dtype=np.int64)
+        ages = np.full(self.num_nodes, np.inf)
+        values = np.zeros_like(self.values)
+        now = self.clock()
+        for node_id in range(self.num_nodes):
+            published = self.read(node_id, values[node_id])
+            if published is not None:
+                versions[node_id] = published[0]
+                ages[node_id] = now - published[1]
+        return {"versions": versions, "ages": ages, "values": values}
+
+    def set_state(self, state):
+        """
+        Restores the slots from a state returned by get_state, with publication times relative to the current
+        time of the board's clock. Nodes must not publish concurrently.
+        """
+        self.values[:] = state["values"]
+        self.timestamps[:] = self.clock() - state["ages"]
+        self.sequences[:] = 2 * state["versions"]
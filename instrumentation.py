@@ -0,0 +1,347 @@
+import atexit
+import bisect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+######################
+# Metrics and logging instrumentation
+# Metrics: counters and latency histograms are recorded into per-thread buffers. A thread only ever writes to its
+# own buffer, so recording takes no lock; the buffers of all threads are merged when metrics are exported.
+# MetricsExporter writes the merged metrics periodically to a Prometheus text file (for the node exporter's
+# textfile collector) and/or a JSON file, from a background thread.
+#
+# Logging: start_async_logging puts a DeferredFormattingQueueHandler on the root logger, so emitting a record only
+# enqueues it; a QueueListener thread formats it and performs the console and file I/O. Node loggers have no
+# handlers of their own (their records reach the root logger), so creating a node twice no longer duplicates its
+# output, and per-node log files are opened by the listener.
+#
+# In process mode every process has its own registry; the tangle's metrics are those of the tangle's process.
+######################
+
+# Upper bounds (seconds) of the latency histogram buckets, from 1 us to 10 s
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2,
+                   5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Initializes an empty registry.
+
+        Parameters:
+        - buckets: Upper bounds of the histogram buckets, in ascending order.
+        """
+        self.buckets = tuple(buckets)
+        self.local = threading.local()
+        self.buffers = []  # One (counters, histograms) pair per thread that recorded anything
+        self.lock = threading.Lock()  # Only taken when a thread records its first metric
+
+    def _buffer(self):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            buffer = self.local.buffer = ({}, {})
+            with self.lock:
+                self.buffers.append(buffer)
+        return buffer
+
+    def increment(self, name, value=1, **labels):
+        """
+        Adds to a counter.
+
+        Parameters:
+        - name: Metric name (e.g. "sgd_steps_total").
+        - value: Amount added.
+        - labels: Label values distinguishing series of the same metric (e.g. node=3).
+        """
+        counters = self._buffer()[0]
+        key = (name, tuple(sorted(labels.items()))) if labels else (name, ())
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Records a latency into a histogram.
+
+        Parameters:
+        - name: Metric name (e.g. "sgd_step_seconds").
+        - seconds: The observed duration.
+        - labels: Label values distinguishing series of the same metric.
+        """
+        histograms = self._buffer()[1]
+        key = (name, tuple(sorted(labels.items()))) if labels else (name, ())
+        histogram = histograms.get(key)
+        if histogram is None:
+            # [count, sum, per-bucket counts..., overflow count]
+            histogram = histograms[key] = [0, 0.0] + [0] * (len(self.buckets) + 1)
+        histogram[0] += 1
+        histogram[1] += seconds
+        histogram[2 + bisect.bisect_left(self.buckets, seconds)] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Context manager recording the duration of its block into a histogram.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def snapshot(self):
+        """
+        Merges the buffers of all threads.
+
+        Returns:
+        - A tuple (counters, histograms) of dictionaries keyed by (name, labels); histogram values are lists
+          [count, sum, per-bucket counts..., overflow count].
+        """
+        with self.lock:
+            buffers = list(self.buffers)
+        counters = {}
+        histograms = {}
+        for thread_counters, thread_histograms in buffers:
+            # Copying a dict is atomic under the GIL, even while its owner thread keeps recording
+            for key, value in list(thread_counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, value in list(thread_histograms.items()):
+                merged = histograms.get(key)
+                histograms[key] = list(value) if merged is None else [a + b for a, b in zip(merged, value)]
+        return counters, histograms
+
+    def to_prometheus(self):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        counters, histograms = self.snapshot()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (series, labels), value in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), value[2:]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value[1]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[0]}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """
+        Renders the metrics as a JSON-serializable dictionary, with mean and approximate percentiles
+        (bucket upper bounds) for the histograms.
+        """
+        counters, histograms = self.snapshot()
+        result = {"timestamp": time.time(), "counters": [], "histograms": []}
+        for (name, labels), value in sorted(counters.items()):
+            result["counters"].append({"name": name, "labels": dict(labels), "value": value})
+        for (name, labels), value in sorted(histograms.items()):
+            count = value[0]
+            result["histograms"].append({
+                "name": name, "labels": dict(labels), "count": count, "sum": value[1],
+                "mean": value[1] / count if count else 0.0,
+                "p50": self._percentile(value, 0.5), "p90": self._percentile(value, 0.9),
+                "p99": self._percentile(value, 0.99),
+            })
+        return result
+
+    def _percentile(self, histogram, fraction):
+        target = histogram[0] * fraction
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), histogram[2:]):
+            cumulative += count
+            if count and cumulative >= target:
+                return bound if bound != float("inf") else self.buckets[-1]  # Overflow: at least the last bound
+        return 0.0
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+# Registry shared by the nodes, the tangle and the contract engine of this process
+METRICS = MetricsRegistry()
+
+class MetricsExporter:
+    def __init__(self, registry=METRICS, prometheus_path=None, json_path=None, interval=10.0):
+        """
+        Periodically writes the registry's metrics to files, from a background thread.
+
+        Parameters:
+        - registry: The MetricsRegistry to export.
+        - prometheus_path: Path of the Prometheus text file, or None.
+        - json_path: Path of the JSON file, or None.
+        - interval: Seconds between two exports.
+        """
+        self.registry = registry
+        self.prometheus_path = prometheus_path
+        self.json_path = json_path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def export(self):
+        """
+        Writes the current metrics. Files are replaced atomically, so readers never see a partial export.
+        """
+        if self.prometheus_path is not None:
+            _write_atomically(self.prometheus_path, self.registry.to_prometheus())
+        if self.json_path is not None:
+            _write_atomically(self.json_path, json.dumps(self.registry.to_json(), indent=2))
+
+    def stop(self):
+        """
+        Stops the exporter thread after a final export.
+        """
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.export()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Failed to export metrics: {e}")
+
+def _write_atomically(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", 'w') as file:
+        file.write(content)
+    os.replace(f"{path}.tmp", path)
+
+######################
+# Asynchronous logging
+######################
+
+class NodeFileHandler(logging.Handler):
+    def __init__(self, log_directory, formatter=None):
+        """
+        Writes the records of each node logger ("Node <id>") to logs/node_<id>.log, opening files on demand.
+        Runs in the listener thread only.
+
+        Parameters:
+        - log_directory: Directory of the per-node log files.
+        - formatter: Formatter of the per-node files.
+        """
+        super().__init__()
+        self.log_directory = log_directory
+        self.handlers = {}
+        if formatter is not None:
+            self.setFormatter(formatter)
+
+    def emit(self, record):
+        if not record.name.startswith("Node "):
+            return
+        handler = self.handlers.get(record.name)
+        if handler is None:
+            node_id = record.name[len("Node "):]
+            handler = logging.FileHandler(os.path.join(self.log_directory, f"node_{node_id}.log"))
+            handler.setFormatter(self.formatter)
+            self.handlers[record.name] = handler
+        handler.emit(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+class DeferredFormattingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues records as they are, leaving the %-formatting of the message to the listener
+    thread (the standard QueueHandler formats it in the emitting thread). Log arguments must therefore not be
+    mutated after the call; the simulation only logs immutable values. Records carrying an exception are still
+    prepared by the emitting thread, so that the listener never holds on to traceback frames.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+_listener = None
+_queue_handler = None
+_listener_lock = threading.Lock()
+
+def start_async_logging(log_directory="logs", activity_log=None, console=True, level=logging.INFO):
+    """
+    Routes all log records through a queue to a background listener thread. Safe to call several times;
+    only the first call configures logging.
+
+    Parameters:
+    - log_directory: Directory of the per-node log files (created if needed).
+    - activity_log: Optional path of a file receiving every record.
+    - console: If True, records are also printed to the console.
+    - level: Level of the root logger.
+
+    Returns:
+    - The QueueListener.
+    """
+    global _listener, _queue_handler
+    with _listener_lock:
+        if _listener is not None:
+            return _listener
+        os.makedirs(log_directory, exist_ok=True)
+        formatter = logging.Formatter("%(asctime)s - %(message)s", datefmt='%Y-%m-%d %H:%M:%S')
+        handlers = [NodeFileHandler(log_directory, formatter)]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+        if activity_log is not None:
+            activity_handler = logging.FileHandler(activity_log)
+            activity_handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(asctime)s:%(message)s"))
+            handlers.append(activity_handler)
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        _queue_handler = DeferredFormattingQueueHandler(queue.SimpleQueue())
+        root.addHandler(_queue_handler)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers)
+        _listener.start()
+        atexit.register(stop_async_logging)
+        return _listener
+
+def stop_async_logging():
+    """
+    Writes out the queued records and stops the listener thread.
+    """
+    global _listener, _queue_handler
+    with _listener_lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def get_node_logger(node_id, log_directory="logs"):
+    """
+    Returns the logger of a node, starting asynchronous logging if needed. The logger has no handlers of its own,
+    so calling this again for the same node does not duplicate its output.
+    """
+    start_async_logging(log_directory)
+    logger = logging.getLogger(f"Node {node_id}")
+    logger.setLevel(logging.INFO)
+    return logger
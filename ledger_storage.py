@@ -0,0 +1,419 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from instrumentation import METRICS
+
+######################
+# Append-only ledger storage
+# The ledger is persisted as two files:
+# 1. Snapshot: a JSON document in the same layout as mocked_iota_ledger.json ({"transactions": [...]}),
+#    or a columnar ledger directory (see columnar_ledger.py) when the snapshot path ends with '.columns'.
+#    It is only rewritten during compaction.
+# 2. Write-ahead log: a JSON Lines file where every new transaction is appended as one record.
+#    Records are flushed on every append and fsync'ed in batches to bound the cost of durability.
+#
+# At startup the snapshot is loaded and the log is replayed on top of it. Compaction writes a fresh
+# snapshot (atomically, through a temporary file) and truncates the log.
+#
+# GroupCommitter puts a single writer in front of the store so that many producer threads can
+# hand over transactions without touching the files themselves.
+#
+# When a ledger is pruned, the snapshot also carries a summary of the pruned history (stored next to the
+# transactions), and the pruned transactions themselves move to a LedgerArchive.
+######################
+
+COLUMNAR_SUFFIX = ".columns"  # Snapshot paths with this suffix are stored in the columnar format
+
+class AppendOnlyLedgerStore:
+    def __init__(self, snapshot_path, log_path=None, fsync_every=32, fsync_interval=1.0, compact_every=10000):
+        """
+        Initializes the storage backend for a ledger.
+
+        Parameters:
+        - snapshot_path: Path to the JSON snapshot file (the existing ledger file format), or to a columnar
+                         ledger directory if it ends with '.columns'.
+        - log_path: Path to the JSON Lines write-ahead log. Defaults to the snapshot path with a '.log.jsonl' suffix.
+        - fsync_every: Number of appended records after which the log is fsync'ed.
+        - fsync_interval: Maximum number of seconds between two fsync calls while records are pending.
+        - compact_every: Number of log records after which a compaction is recommended.
+        """
+        self.snapshot_path = snapshot_path.rstrip(os.sep)
+        self.columnar = self.snapshot_path.endswith(COLUMNAR_SUFFIX)
+        self.log_path = log_path or f"{os.path.splitext(self.snapshot_path)[0]}.log.jsonl"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self.summary = None  # Summary of pruned history, stored in the snapshot next to the transactions
+        self.log_records = 0  # Records currently held in the log (not yet compacted into the snapshot)
+        self.pending_sync = 0  # Records written since the last fsync
+        self.last_sync_time = time.monotonic()
+        self.log_file = None
+
+    def load(self):
+        """
+        Loads the snapshot and replays the write-ahead log on top of it.
+
+        Returns:
+        - A list of transactions (a ColumnarTransactions sequence for a columnar snapshot), or None if neither
+          the snapshot nor the log exists.
+        """
+        if self.columnar and not os.path.exists(self.snapshot_path) and os.path.exists(f"{self.snapshot_path}.old"):
+            # A crash in the middle of swapping columnar snapshots leaves only the previous one in place
+            os.replace(f"{self.snapshot_path}.old", self.snapshot_path)
+        snapshot_exists = os.path.exists(self.snapshot_path)
+        log_exists = os.path.exists(self.log_path)
+        if not snapshot_exists and not log_exists:
+            return None
+
+        transactions = []
+        columnar_rows = False
+        if snapshot_exists and self.columnar:
+            from columnar_ledger import ColumnarLedger, ColumnarTransactions
+            ledger = ColumnarLedger(self.snapshot_path)
+            # The memory-mapped columns stay the backing store; transactions are only rebuilt when read
+            transactions = ColumnarTransactions(ledger)
+            columnar_rows = True
+            self.summary = ledger.summary
+        elif snapshot_exists:
+            with open(self.snapshot_path, 'r') as file:
+                ledger = json.load(file)
+            transactions = ledger.get("transactions", [])
+            self.summary = ledger.get("summary")
+
+        if log_exists:
+            # A crash between writing a snapshot and truncating the log leaves records present in both
+            known_hashes = set() if columnar_rows else {tx["hash"] for tx in transactions}
+            self.log_records = 0
+            valid_length = 0
+            with open(self.log_path, 'rb') as file:
+                for line_number, line in enumerate(file, start=1):
+                    try:
+                        transaction = json.loads(line) if line.strip() else None
+                    except json.JSONDecodeError:
+                        transaction = None
+                    if transaction is None or not line.endswith(b"\n"):
+                        if line.strip():
+                            # Only the last record can be torn by a crash mid-write; everything after it is unusable
+                            print(f"Ignoring truncated record at line {line_number} of {self.log_path}.")
+                            break
+                        valid_length += len(line)
+                        continue
+                    valid_length += len(line)
+                    self.log_records += 1
+                    if transaction["hash"] in known_hashes or \
+                       (columnar_rows and transactions.find(transaction["hash"]) is not None):
+                        continue
+                    known_hashes.add(transaction["hash"])
+                    transactions.append(transaction)
+            # Drop the torn tail so that new records are not appended to a partial line
+            if valid_length < os.path.getsize(self.log_path):
+                with open(self.log_path, 'r+b') as file:
+                    file.truncate(valid_length)
+
+        return transactions
+
+    def append(self, transaction):
+        """
+        Appends a single transaction record to the write-ahead log.
+
+        Parameters:
+        - transaction: The transaction dictionary to persist.
+        """
+        self.append_batch([transaction])
+
+    def append_batch(self, transactions):
+        """
+        Appends several transaction records to the write-ahead log with a single write call.
+
+        Parameters:
+        - transactions: A list of transaction dictionaries to persist.
+        """
+        if not transactions:
+            return
+        log_file = self._open_log()
+        log_file.write("".join(json.dumps(tx, separators=(',', ':')) + "\n" for tx in transactions))
+        log_file.flush()
+        self.log_records += len(transactions)
+        self.pending_sync += len(transactions)
+        if self.pending_sync >= self.fsync_every or time.monotonic() - self.last_sync_time >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Forces pending log records to stable storage.
+        """
+        if self.log_file is not None and self.pending_sync:
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+        self.pending_sync = 0
+        self.last_sync_time = time.monotonic()
+
+    def needs_compaction(self):
+        """
+        Returns True if the log holds enough records to be worth folding into the snapshot.
+        """
+        return self.compact_every is not None and self.log_records >= self.compact_every
+
+    def compact(self, transactions, summary=None):
+        """
+        Writes a full snapshot of the given transactions and truncates the write-ahead log.
+
+        Parameters:
+        - transactions: The complete list of live transactions to store in the snapshot.
+        - summary: Summary of the pruned history to store with them. Defaults to the current summary.
+        """
+        if summary is not None:
+            self.summary = summary
+        if self.columnar:
+            self._write_columnar_snapshot(transactions)
+        else:
+            temporary_path = f"{self.snapshot_path}.tmp"
+            ledger = {"transactions": transactions}
+            if self.summary is not None:
+                ledger["summary"] = self.summary
+            with open(temporary_path, 'w') as file:
+                json.dump(ledger, file, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, self.snapshot_path)
+
+        # The snapshot is durable, so the log can be started over
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = open(self.log_path, 'w')
+        self.log_records = 0
+        self.pending_sync = 0
+        self.last_sync_time = time.monotonic()
+
+    def close(self):
+        """
+        Syncs and closes the write-ahead log.
+        """
+        if self.log_file is not None:
+            self.sync()
+            self.log_file.close()
+            self.log_file = None
+
+    def _write_columnar_snapshot(self, transactions):
+        from columnar_ledger import write_columnar_ledger
+        # Directories cannot be replaced atomically: write the new one aside, then swap it in through two renames
+        temporary_path = f"{self.snapshot_path}.tmp"
+        previous_path = f"{self.snapshot_path}.old"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        write_columnar_ledger(transactions, temporary_path, summary=self.summary)
+        for name in os.listdir(temporary_path):
+            with open(os.path.join(temporary_path, name), 'rb') as file:
+                os.fsync(file.fileno())
+        shutil.rmtree(previous_path, ignore_errors=True)
+        if os.path.exists(self.snapshot_path):
+            os.replace(self.snapshot_path, previous_path)
+        os.replace(temporary_path, self.snapshot_path)
+        shutil.rmtree(previous_path, ignore_errors=True)
+
+    def _open_log(self):
+        if self.log_file is None:
+            self.log_file = open(self.log_path, 'a')
+        return self.log_file
+
+class LedgerArchive:
+    def __init__(self, directory):
+        """
+        Stores pruned ledger history as JSON Lines segments, one file per pruning, named after the ledger
+        sequence range they cover. Segments are only read when transactions are requested.
+
+        Parameters:
+        - directory: Directory holding the segment files. Created on the first write.
+        """
+        self.directory = directory
+
+    def write_segment(self, first_sequence, transactions):
+        """
+        Durably writes a segment of consecutive pruned transactions.
+
+        Parameters:
+        - first_sequence: Ledger sequence of the first transaction.
+        - transactions: The pruned transactions, in ledger order.
+        """
+        if not transactions:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # A crash before the pruned ledger was snapshotted replays the pruned transactions from the log, and the
+        # next pruning archives them again: drop segments the new one supersedes
+        for first, _, name in self.segments():
+            if first >= first_sequence:
+                os.remove(os.path.join(self.directory, name))
+
+        last_sequence = first_sequence + len(transactions) - 1
+        path = os.path.join(self.directory, f"segment_{first_sequence:012d}_{last_sequence:012d}.jsonl")
+        with open(f"{path}.tmp", 'w') as file:
+            file.write("".join(json.dumps(tx, separators=(',', ':')) + "\n" for tx in transactions))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def segments(self):
+        """
+        Lists the archived segments.
+
+        Returns:
+        - A list of (first_sequence, last_sequence, file_name) tuples, oldest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith("segment_") and name.endswith(".jsonl"):
+                first, last = name[len("segment_"):-len(".jsonl")].split("_")
+                segments.append((int(first), int(last), name))
+        return sorted(segments)
+
+    def iter_transactions(self, first_sequence=0, last_sequence=None):
+        """
+        Reads archived transactions, opening only the segments overlapping the requested range.
+
+        Parameters:
+        - first_sequence: Ledger sequence of the first transaction to read.
+        - last_sequence: Ledger sequence of the last transaction to read (defaults to the end of the archive).
+
+        Yields:
+        - Transaction dictionaries, in ledger order.
+        """
+        for first, last, name in self.segments():
+            if last < first_sequence or (last_sequence is not None and first > last_sequence):
+                continue
+            with open(os.path.join(self.directory, name), 'r') as file:
+                for sequence, line in enumerate(file, start=first):
+                    if sequence < first_sequence:
+                        continue
+                    if last_sequence is not None and sequence > last_sequence:
+                        break
+                    yield json.loads(line)
+
+    def get_transaction(self, transaction_hash):
+        """
+        Retrieves an archived transaction by its hash.
+
+        Parameters:
+        - transaction_hash: The hash of the transaction ("genesis" or "tx_<sequence>").
+
+        Returns:
+        - The transaction, or None if it is not archived.
+        """
+        if transaction_hash == "genesis":
+            sequence = 0
+        elif transaction_hash.startswith("tx_") and transaction_hash[3:].isdigit():
+            sequence = int(transaction_hash[3:])
+        else:
+            return None
+        for transaction in self.iter_transactions(sequence, sequence):
+            if transaction["hash"] == transaction_hash:
+                return transaction
+        return None
+
+class GroupCommitter:
+    def __init__(self, store, compaction_source, threaded=True, max_batch=512):
+        """
+        Serializes all writes to a ledger store. In threaded mode, transactions are queued by any number of
+        producer threads and a single committer thread drains the queue, writing many records per flush.
+
+        Parameters:
+        - store: The AppendOnlyLedgerStore receiving the records.
+        - compaction_source: A callable returning a (transactions, summary) tuple to snapshot during compaction:
+                             the full list of live transactions and the summary of pruned history (or None).
+        - threaded: If False, records are written synchronously by the calling thread.
+        - max_batch: Maximum number of records written by a single group commit.
+        """
+        self.store = store
+        self.compaction_source = compaction_source
+        self.max_batch = max_batch
+        self.lock = threading.Lock()  # Guards the store, which is not thread-safe by itself
+        self.committed = 0
+        self.batches = 0
+        self.queue = None
+        self.thread = None
+        if threaded:
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self._drain, name="ledger-committer", daemon=True)
+            self.thread.start()
+
+    def submit(self, transaction):
+        """
+        Hands a transaction over for persistence.
+
+        Parameters:
+        - transaction: The transaction dictionary to persist.
+        """
+        if self.queue is None:
+            self._commit([transaction])
+        else:
+            self.queue.put(transaction)
+
+    def flush(self):
+        """
+        Blocks until every submitted transaction has been written and synced.
+        """
+        if self.queue is not None:
+            self.queue.join()
+        with self.lock:
+            self.store.sync()
+
+    def compact(self):
+        """
+        Flushes pending records and rewrites the snapshot.
+        """
+        if self.queue is not None:
+            self.queue.join()
+        with self.lock:
+            self.store.compact(*self.compaction_source())
+
+    def close(self):
+        """
+        Commits everything still queued, stops the committer thread and closes the store.
+        """
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            self.store.close()
+
+    def _drain(self):
+        while True:
+            batch = [self.queue.get()]
+            # Group everything that piled up while the previous batch was being written
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(tx is _STOP for tx in batch)
+            records = [tx for tx in batch if tx is not _STOP]
+            try:
+                self._commit(records, sync=self.queue.empty())
+            except Exception as e:
+                print(f"Failed to commit {len(records)} transactions to {self.store.log_path}: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def _commit(self, records, sync=False):
+        with self.lock:
+            start_time = time.perf_counter()
+            self.store.append_batch(records)
+            if sync:
+                self.store.sync()
+            self.committed += len(records)
+            self.batches += 1
+            METRICS.observe("ledger_commit_seconds", time.perf_counter() - start_time)
+            METRICS.increment("ledger_committed_transactions_total", len(records))
+            if self.store.needs_compaction():
+                self.store.compact(*self.compaction_source())
+
+# Sentinel telling the committer thread to exit once the queue is drained
+_STOP = object()
@@ -0,0 +1,272 @@
+import math
+import threading
+from array import array
+import numpy as np
+
+######################
+# Streaming per-node loss statistics
+# Every node gets a slot in a set of flat arrays (one array per statistic, plus one ring buffer array holding
+# the last `window` losses of all nodes back to back). Each new loss updates its node's slot in O(1):
+# - last and previous value, count, all-time min and max
+# - exponentially weighted moving average (EWMA)
+# - mean and variance over the rolling window, maintained with Welford's update for the value entering the
+#   window and its inverse for the value leaving it, so the ledger never has to be rescanned.
+######################
+
+class LossStatistics:
+    # Per-slot arrays, in the order they are saved by get_state
+    COLUMNS = ("count", "last", "previous", "ewma", "minimum", "maximum", "window_count", "window_mean", "window_m2",
+               "ring_position", "ring")
+
+    def __init__(self, window=32, ewma_alpha=0.1, initial_capacity=16):
+        """
+        Initializes an empty statistics table.
+
+        Parameters:
+        - window: Number of most recent losses per node covered by the rolling mean and variance.
+        - ewma_alpha: Weight of the newest loss in the exponentially weighted moving average.
+        - initial_capacity: Number of node slots allocated up front (grows on demand).
+        """
+        self.window = max(1, window)
+        self.ewma_alpha = ewma_alpha
+        self.slots = {}  # node -> slot index
+        self.allocation_lock = threading.Lock()
+        self.capacity = 0
+
+        self.count = array('q')
+        self.last = array('d')
+        self.previous = array('d')
+        self.ewma = array('d')
+        self.minimum = array('d')
+        self.maximum = array('d')
+        self.window_count = array('q')
+        self.window_mean = array('d')
+        self.window_m2 = array('d')  # Sum of squared deviations from the window mean
+        self.ring_position = array('q')
+        self.ring = array('d')
+        self._grow(max(1, initial_capacity))
+
+    def _grow(self, capacity):
+        # Arrays are extended in place, so slots handed out earlier keep their positions
+        added = capacity - self.capacity
+        for column in (self.count, self.window_count, self.ring_position):
+            column.extend([0] * added)
+        for column in (self.last, self.previous, self.ewma):
+            column.extend([math.nan] * added)
+        for column in (self.window_mean, self.window_m2):
+            column.extend([0.0] * added)
+        self.minimum.extend([math.inf] * added)
+        self.maximum.extend([-math.inf] * added)
+        self.ring.extend([0.0] * (added * self.window))
+        self.capacity = capacity
+
+    def _slot(self, node):
+        slot = self.slots.get(node)
+        if slot is None:
+            with self.allocation_lock:
+                slot = self.slots.get(node)
+                if slot is None:
+                    slot = len(self.slots)
+                    if slot >= self.capacity:
+                        self._grow(self.capacity * 2)
+                    self.slots[node] = slot
+        return slot
+
+    def update(self, node, value):
+        """
+        Adds a node's new loss to its statistics. Updates of the same node must not run concurrently.
+
+        Parameters:
+        - node: The identifier of the node that recorded the loss.
+        - value: The loss value.
+
+        Returns:
+        - The node's loss before this one, or None for its first loss.
+        """
+        slot = self._slot(node)
+        value = float(value)
+
+        count = self.count[slot]
+        previous = self.last[slot]
+        self.previous[slot] = previous
+        self.last[slot] = value
+        self.count[slot] = count + 1
+        self.ewma[slot] = value if count == 0 else self.ewma_alpha * value + (1 - self.ewma_alpha) * self.ewma[slot]
+        if value < self.minimum[slot]:
+            self.minimum[slot] = value
+        if value > self.maximum[slot]:
+            self.maximum[slot] = value
+
+        # Rolling window: the ring slot being overwritten holds the value leaving the window
+        ring_index = slot * self.window + self.ring_position[slot]
+        self.ring_position[slot] = (self.ring_position[slot] + 1) % self.window
+        window_count = self.window_count[slot]
+        mean = self.window_mean[slot]
+        m2 = self.window_m2[slot]
+        if window_count < self.window:
+            window_count += 1
+            delta = value - mean
+            mean += delta / window_count
+            m2 += delta * (value - mean)
+        else:
+            leaving = self.ring[ring_index]
+            new_mean = mean + (value - leaving) / window_count
+            m2 += (value - leaving) * (value - new_mean + leaving - mean)
+            mean = new_mean
+        self.ring[ring_index] = value
+        self.window_count[slot] = window_count
+        self.window_mean[slot] = mean
+        self.window_m2[slot] = max(m2, 0.0)  # Guard against rounding below zero
+        return previous if count else None
+
+    def seed(self, node, count, last, previous=None, ewma=None, minimum=None, maximum=None):
+        """
+        Starts a node's statistics from aggregates of earlier losses that are no longer available one by one
+        (e.g. pruned from the ledger). The rolling window starts empty. Call it before the node's first update.
+
+        Parameters:
+        - node: The identifier of the node.
+        - count: Number of earlier losses.
+        - last: The latest of them.
+        - previous: The one before it, if known.
+        - ewma: Their exponentially weighted moving average (defaults to the latest loss).
+        - minimum: Their minimum (defaults to the latest loss).
+        - maximum: Their maximum (defaults to the latest loss).
+        """
+        if not count:
+            return
+        slot = self._slot(node)
+        self.count[slot] = count
+        self.last[slot] = last
+        self.previous[slot] = math.nan if previous is None else previous
+        self.ewma[slot] = last if ewma is None else ewma
+        self.minimum[slot] = last if minimum is None else minimum
+        self.maximum[slot] = last if maximum is None else maximum
+        # The window restarts at ring position 0, where update, extend and recent expect an empty window to start
+        self.window_count[slot] = 0
+        self.window_mean[slot] = 0.0
+        self.window_m2[slot] = 0.0
+        self.ring_position[slot] = 0
+
+    def extend(self, node, values):
+        """
+        Adds a node's losses in order, with the same result as calling update for each of them (up to rounding),
+        in a few vectorized operations. Used to index a whole ledger at once. Updates of the same node must not
+        run concurrently.
+
+        Parameters:
+        - node: The identifier of the node that recorded the losses.
+        - values: The losses, oldest first (array-like).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        added = len(values)
+        if not added:
+            return
+        slot = self._slot(node)
+        count = self.count[slot]
+        total = count + added
+        window_values = np.concatenate([self.recent(node), values])[-self.window:]
+
+        self.previous[slot] = values[-2] if added > 1 else self.last[slot]
+        self.last[slot] = values[-1]
+        self.count[slot] = total
+        # EWMA unrolled: every value weighs alpha * (1 - alpha)^(number of values after it)
+        decay = 1 - self.ewma_alpha
+        ewma, averaged = (self.ewma[slot], values) if count else (values[0], values[1:])
+        weights = self.ewma_alpha * decay ** np.arange(len(averaged) - 1, -1, -1)
+        self.ewma[slot] = decay ** len(averaged) * ewma + float(np.dot(weights, averaged))
+        self.minimum[slot] = min(self.minimum[slot], float(values.min()))
+        self.maximum[slot] = max(self.maximum[slot], float(values.max()))
+
+        # Rolling window, laid out as update leaves it: the ring position advances by one per loss, and the window
+        # ends right before it (a seeded node's window starts at position 0, like a new node's)
+        window_count = len(window_values)
+        mean = float(window_values.mean())
+        self.window_count[slot] = window_count
+        self.window_mean[slot] = mean
+        self.window_m2[slot] = float(np.sum((window_values - mean) ** 2))
+        ring_start = slot * self.window
+        position = (self.ring_position[slot] + added) % self.window
+        for index, value in enumerate(window_values.tolist(), start=position - window_count):
+            self.ring[ring_start + index % self.window] = value
+        self.ring_position[slot] = position
+
+    def get(self, node):
+        """
+        Retrieves a node's current statistics.
+
+        Parameters:
+        - node: The identifier of the node.
+
+        Returns:
+        - A dictionary with count, last, previous, ewma, min, max, mean, variance and std (the last three over
+          the rolling window), or None if the node has not recorded any loss.
+        """
+        slot = self.slots.get(node)
+        if slot is None:
+            return None
+        count = self.count[slot]
+        window_count = self.window_count[slot]
+        variance = self.window_m2[slot] / (window_count - 1) if window_count > 1 else 0.0
+        return {
+            "count": count,
+            "last": self.last[slot],
+            "previous": self.previous[slot] if count > 1 else None,
+            "ewma": self.ewma[slot],
+            "min": self.minimum[slot],
+            "max": self.maximum[slot],
+            "window_count": window_count,
+            "mean": self.window_mean[slot],
+            "variance": variance,
+            "std": math.sqrt(variance),
+        }
+
+    def recent(self, node):
+        """
+        Retrieves a node's losses currently in the rolling window.
+
+        Parameters:
+        - node: The identifier of the node.
+
+        Returns:
+        - A list of up to `window` losses, oldest first (empty if the node has not recorded any loss).
+        """
+        slot = self.slots.get(node)
+        if slot is None:
+            return []
+        start = slot * self.window
+        window_count = self.window_count[slot]
+        position = self.ring_position[slot]
+        ring = self.ring[start:start + self.window]
+        if window_count < self.window:
+            return ring[:window_count].tolist()
+        return (ring[position:] + ring[:position]).tolist()
+
+    def nodes(self):
+        """
+        Returns the identifiers of all nodes with recorded losses.
+        """
+        return list(self.slots)
+
+    def get_state(self):
+        """
+        Returns a copy of the table for checkpoints: the node slots and every column as a NumPy array.
+        Updates must not run concurrently.
+        """
+        state = {"window": self.window, "slots": [[node, slot] for node, slot in self.slots.items()]}
+        for name in self.COLUMNS:
+            state[name] = np.array(getattr(self, name))
+        return state
+
+    def set_state(self, state):
+        """
+        Replaces the table with a state returned by get_state. The window must match.
+        """
+        if state["window"] != self.window:
+            raise ValueError(f"Loss statistics window {state['window']} does not match {self.window}.")
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            del column[:]
+            column.frombytes(np.ascontiguousarray(state[name], dtype=column.typecode).tobytes())
+        self.capacity = len(self.count)
+        self.slots = {node: slot for node, slot in state["slots"]}
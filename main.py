@@ -1,10 +1,13 @@
+import argparse
 import time
-import logging
 import os
-from mocktangle import MockTangle, create_loss_fluctuation_contract, create_significant_environment_change_contract
-from node import Node
-import threading
-import tensorflow as tf
+from checkpoint import load_checkpoint
+from gradient_board import GradientBoard
+from execution_backends import BACKENDS, build_tangle, run_nodes, start_tangle_service
+from instrumentation import MetricsExporter, start_async_logging
+from network_emulator import COMPRESSORS, ChurnModel, EmulatedNetwork, LinkModel, NetworkedTangle
+from scheduler import SimulationClock
+from tip_selection import WeightedRandomWalk
 from network_topology.network_topology import load_and_check_network_topology
 
 # Suppress TensorFlow logging except for errors
@@ -16,49 +19,183 @@ num_nodes = 5
 # All processes will run cyclically
 run_period = 5 # seconds
 
-def init_and_run_threads(tangle, num_nodes, neighbors):
-    threads = []
-
-    # Check for GPU availability and configure TensorFlow to use GPU
-    use_gpu = tf.config.list_physical_devices('GPU')
-    
-    # Configure TensorFlow to use only specified GPU and limit memory
-    if use_gpu:
-        try:
-            tf.config.experimental.set_virtual_device_configuration(
-                use_gpu[0],
-                [tf.config.experimental.VirtualDeviceConfiguration(memory_limit=1024*num_nodes)])
-        except RuntimeError as e:
-            print(e)
-
-    # Create and start a thread for each node
-    for node_id in range(num_nodes):
-        node = Node(node_id, run_period, tangle, neighbors.get(node_id, None), \
-                    data_size=100, features=10) # Create a Node object
-        thread = threading.Thread(target=node.run, args=(use_gpu,)) # Initialize thread for the node
-        threads.append(thread) # Add thread to the list
-        thread.start() # Start the thread
-
-    # Wait for all threads to complete (optional)
-    for thread in threads:
-        thread.join()
+# Number of features of each node's model
+features = 10
+
+# Neighbor gradients older than this are left out of the aggregation
+max_gradient_staleness = 3 * run_period # seconds
+
+def init_and_run_nodes(tangle, num_nodes, neighbors, backend="threads", workers=None, compile_step=False,
+                       max_steps=None, scheduler_kwargs=None, batch_size=None, checkpoint=None, checkpoint_kwargs=None,
+                       network_kwargs=None, asynchronous=False, staleness_decay=1.0):
+    checkpoint = checkpoint or {}
+
+    # With the event-driven scheduler, gradient timestamps and staleness follow the simulation clock
+    clock = SimulationClock(checkpoint.get("clock") or 0.0) if backend == "scheduler" else None
+
+    # Shared board through which the nodes exchange their latest gradients.
+    # Worker processes can only reach it if it lives in shared memory.
+    # With network emulation, gradients and transactions travel over simulated links instead
+    if network_kwargs is not None:
+        gradient_board = EmulatedNetwork(num_nodes, (features, 1), neighbors,
+                                         clock=clock.now if clock is not None else time.monotonic, **network_kwargs)
+        tangle = NetworkedTangle(tangle, gradient_board)
+    else:
+        gradient_board = GradientBoard(num_nodes, (features, 1), shared=(backend == "processes"),
+                                       clock=clock.now if clock is not None else time.monotonic)
+    board_state = checkpoint.get("gradient_board")
+    if board_state is not None and board_state["values"].shape == gradient_board.values.shape:
+        gradient_board.set_state(board_state)
+
+    node_kwargs = {"run_period": run_period, "data_size": 100, "features": features,
+                   "max_staleness": max_gradient_staleness, "compile_step": compile_step, "batch_size": batch_size,
+                   "asynchronous": asynchronous, "staleness_decay": staleness_decay}
+
+    # Create and start every node with the selected backend and wait for them to complete (optional)
+    try:
+        run_nodes(backend, num_nodes, tangle, gradient_board, neighbors, node_kwargs, workers=workers,
+                  max_steps=max_steps, clock=clock, scheduler_kwargs=scheduler_kwargs,
+                  node_states=checkpoint.get("nodes"), checkpoint_kwargs=checkpoint_kwargs)
+    finally:
+        if network_kwargs is not None:
+            stats = gradient_board.stats()
+            print(f"Network: {stats['bytes_sent']} bytes in {stats['messages_sent']} messages, "
+                  f"{stats['messages_dropped']} dropped, mean delay {stats['mean_delay'] * 1e3:.1f} ms")
+        gradient_board.close()
 
 if __name__ == "__main__":
-    # Configure logging for the application. Use a more meaningful format for the log file name
-    logging.basicConfig(filename=f"logs/node_activity_{time.strftime('%Y-%m-%d_%H-%M-%S')}.log", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Decentralized SGD simulation over a mocked IOTA Tangle.")
+    parser.add_argument("--backend", choices=BACKENDS, default="threads",
+                        help="Run nodes as threads of this process, or spread them over worker processes")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for the 'processes' backend (default: one per CPU)")
+    parser.add_argument("--compile-step", action="store_true",
+                        help="Run each node's SGD step as a compiled tf.function graph")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Train each step on a mini-batch of this size instead of the node's full dataset")
+    parser.add_argument("--max-steps", type=int, default=None,
+                        help="Stop each node after this many SGD updates (default: run until interrupted)")
+    parser.add_argument("--tip-selection", choices=["recent", "random-walk"], default="recent",
+                        help="Approve the neighbors' most recent transactions, or tips found by weighted random walks")
+    parser.add_argument("--async", dest="asynchronous", action="store_true",
+                        help="Average models with whichever neighbor versions are available instead of gradients")
+    parser.add_argument("--staleness-decay", type=float, default=1.0,
+                        help="With --async, weight neighbor models by 1 / (1 + decay * age / run period)")
+    parser.add_argument("--max-live-transactions", type=int, default=None,
+                        help="Prune and archive ledger history once the tangle holds more transactions than this")
+    parser.add_argument("--prune-horizon", type=int, default=None,
+                        help="Number of most recent transactions kept when pruning (default: half of "
+                             "--max-live-transactions)")
+    checkpoint_group = parser.add_argument_group("checkpoints")
+    checkpoint_group.add_argument("--checkpoint", default="checkpoints/simulation.npz",
+                                  help="Checkpoint file written by --checkpoint-interval and read by --resume")
+    checkpoint_group.add_argument("--checkpoint-interval", type=float, default=None,
+                                  help="Checkpoint the nodes, tangle indexes and gradient board every this many "
+                                       "seconds, and when the run stops")
+    checkpoint_group.add_argument("--resume", action="store_true",
+                                  help="Resume the nodes and tangle indexes from the checkpoint instead of "
+                                       "starting over")
+    network_group = parser.add_argument_group("network emulation (threads and scheduler backends)")
+    network_group.add_argument("--emulate-network", action="store_true",
+                               help="Send gradients and transactions over emulated links between neighbors")
+    network_group.add_argument("--latency", type=float, default=0.05, help="Link latency in seconds")
+    network_group.add_argument("--latency-jitter", type=float, default=0.0,
+                               help="Maximum random extra latency per message in seconds")
+    network_group.add_argument("--bandwidth", type=float, default=None, help="Link bandwidth in bytes per second")
+    network_group.add_argument("--drop-rate", type=float, default=0.0, help="Probability that a message is lost")
+    network_group.add_argument("--churn", type=float, nargs=2, default=None, metavar=("UPTIME", "DOWNTIME"),
+                               help="Take nodes offline and back online, with these mean durations in seconds")
+    network_group.add_argument("--compression", choices=list(COMPRESSORS), default="none",
+                               help="Gradient compression: top-k sparsification or quantization")
+    network_group.add_argument("--topk-ratio", type=float, default=0.1, help="Fraction of the entries sent by top-k")
+    network_group.add_argument("--quantization-bits", type=int, default=8, help="Bits per entry when quantizing")
+    network_group.add_argument("--network-seed", type=int, default=None, help="Seed for drops, jitter and churn")
+    metrics_group = parser.add_argument_group("metrics")
+    metrics_group.add_argument("--metrics-prometheus", default=None,
+                               help="Periodically write the metrics to this file in the Prometheus text format")
+    metrics_group.add_argument("--metrics-json", default=None,
+                               help="Periodically write the metrics (with latency percentiles) to this JSON file")
+    metrics_group.add_argument("--metrics-interval", type=float, default=10.0,
+                               help="Seconds between two metrics exports")
+    scheduler_group = parser.add_argument_group("scheduler backend")
+    scheduler_group.add_argument("--real-time", action="store_true",
+                                 help="Pace the simulation with the wall clock instead of running as fast as possible")
+    scheduler_group.add_argument("--time-scale", type=float, default=1.0,
+                                 help="Simulated seconds per wall-clock second in real-time mode")
+    scheduler_group.add_argument("--duration", type=float, default=None,
+                                 help="Simulated seconds after which the run stops, e.g. 86400 for one day")
+    scheduler_group.add_argument("--jitter", type=float, default=0.0,
+                                 help="Relative random variation of each node's period, e.g. 0.1 for +/-10%%")
+    scheduler_group.add_argument("--seed", type=int, default=None, help="Seed for the scheduling jitter")
+    args = parser.parse_args()
+
+    # Configure logging for the application. Use a more meaningful format for the log file name.
+    # Records are written by a background thread, off the nodes' update path.
+    start_async_logging("logs", activity_log=f"logs/node_activity_{time.strftime('%Y-%m-%d_%H-%M-%S')}.log")
+    exporter = None
+    if args.metrics_prometheus is not None or args.metrics_json is not None:
+        exporter = MetricsExporter(prometheus_path=args.metrics_prometheus, json_path=args.metrics_json,
+                                   interval=args.metrics_interval).start()
 
     # Load and check the consistency of the network topology
     neighbors = load_and_check_network_topology()
 
+    checkpoint = None
+    if args.resume:
+        checkpoint = load_checkpoint(args.checkpoint)
+        if checkpoint is None:
+            print(f"No checkpoint found at {args.checkpoint}. Starting a new run.")
+    network_kwargs = None
+    if args.emulate_network:
+        if args.backend == "processes":
+            parser.error("--emulate-network runs in a single process; use the 'threads' or 'scheduler' backend")
+        if args.asynchronous and args.compression != "none":
+            # Compressors are built for gradients: they would replace whole models with their sparse or quantized
+            # version, and top-k error feedback would accumulate model residuals
+            parser.error("--async exchanges whole models; it cannot be combined with --compression")
+        compressor_kwargs = {"topk": {"ratio": args.topk_ratio},
+                             "quantize": {"bits": args.quantization_bits, "seed": args.network_seed}}
+        network_kwargs = {
+            "link": LinkModel(args.latency, args.latency_jitter, args.bandwidth, args.drop_rate),
+            "churn": ChurnModel(*args.churn, seed=args.network_seed) if args.churn is not None else None,
+            "compressor": COMPRESSORS[args.compression](**compressor_kwargs.get(args.compression, {})),
+            "seed": args.network_seed,
+        }
+    checkpoint_kwargs = None
+    if args.checkpoint_interval is not None:
+        checkpoint_kwargs = {"path": args.checkpoint, "interval": args.checkpoint_interval}
+
     """ Initialize the Directed Acyclic Graph object (NOT blockchain)
     NOTE: This object will simulate the shared ledger where all transactions and smart contracts reside.
           Even though in a real decentralized environment each node has its copy of the ledger,
           for simplicity, using one instance can simulate the collective behavior and interaction
           of nodes with the Tangle.
     """
-    mocked_tangle = MockTangle("mocktangle/mocked_iota_ledger.json")
-    mocked_tangle.add_smart_contract(create_loss_fluctuation_contract(mocked_tangle))
-    # mocked_tangle.add_smart_contract(create_significant_environment_change_contract(mocked_tangle))
+    contracts = ["loss_fluctuation"]  # , "significant_environment_change"
+    max_live, horizon = args.max_live_transactions, args.prune_horizon
+    if max_live is not None and horizon is not None and horizon >= max_live:
+        parser.error("--prune-horizon must be below --max-live-transactions")
+    tangle_kwargs = {"max_live_transactions": args.max_live_transactions, "prune_horizon": args.prune_horizon,
+                     "index_state": checkpoint["tangle"] if checkpoint is not None else None}
+    if args.tip_selection == "random-walk":
+        tangle_kwargs["tip_selector"] = WeightedRandomWalk()
+    manager = None
+    if args.backend == "processes":
+        # Worker processes reach the tangle through a local IPC service
+        manager, mocked_tangle = start_tangle_service("mocktangle/mocked_iota_ledger.json", contracts, **tangle_kwargs)
+    else:
+        mocked_tangle = build_tangle("mocktangle/mocked_iota_ledger.json", contracts, **tangle_kwargs)
 
-    # Create and start threads for each node
-    init_and_run_threads(mocked_tangle, num_nodes, neighbors)
\ No newline at end of file
+    # Create and start the nodes
+    try:
+        scheduler_kwargs = {"virtual_time": not args.real_time, "time_scale": args.time_scale, "until": args.duration,
+                            "jitter": args.jitter, "seed": args.seed}
+        init_and_run_nodes(mocked_tangle, num_nodes, neighbors, args.backend, args.workers, args.compile_step,
+                           args.max_steps, scheduler_kwargs, args.batch_size, checkpoint, checkpoint_kwargs,
+                           network_kwargs, args.asynchronous, args.staleness_decay)
+    finally:
+        mocked_tangle.close()
+        if manager is not None:
+            manager.shutdown()
+        if exporter is not None:
+            exporter.stop()
@@ -1,16 +1,32 @@
-import json
+import heapq
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+import numpy as np
+from columnar_ledger import ColumnarTransactions, hash_to_id, id_to_hash
+from contract_engine import ContractEngine
+from instrumentation import METRICS
+from ledger_storage import AppendOnlyLedgerStore, GroupCommitter, LedgerArchive
+from loss_statistics import LossStatistics
 
 class SmartContract:
-    def __init__(self, conditions, action):
+    def __init__(self, conditions, action, subscriptions=None, name=None):
         """
         Initializes a smart contract with specific conditions and an action to be executed.
 
         Parameters:
         - conditions: A callable that takes transaction data as input and returns True if the action should be executed.
         - action: A callable that defines the action to be executed when conditions are met.
+        - subscriptions: Transaction data keys the contract reacts to (e.g. ["loss"]). If None, the contract
+                         is evaluated for every transaction.
+        - name: Name under which the contract's metrics are reported.
         """
         self.conditions = conditions
         self.action = action
+        self.subscriptions = frozenset(subscriptions) if subscriptions else None
+        self.name = name
 
     def evaluate_and_execute(self, transaction_data):
         """
@@ -18,36 +34,378 @@ class SmartContract:
 
         Parameters:
         - transaction_data: The data associated with a transaction to be evaluated.
+
+        Returns:
+        - True if the action was executed, False otherwise.
         """
         if self.conditions(transaction_data):
             self.action(transaction_data)
+            return True
+        return False
+
+class LedgerView:
+    def __init__(self, transactions, length):
+        """
+        Read-only view of the first `length` transactions of a ledger.
+        The ledger list is only ever appended to, so the view stays stable without copying it.
+
+        Parameters:
+        - transactions: The ledger's list of transactions.
+        - length: Number of transactions visible through the view.
+        """
+        self._transactions = transactions
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return islice(self._transactions, self._length)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._transactions[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("ledger view index out of range")
+        return self._transactions[index]
+
+def summary_node(key):
+    """
+    Converts a node key of the ledger summary (a string, since JSON object keys are strings) back to the node ID.
+    """
+    if key == "None":
+        return None
+    try:
+        return int(key)
+    except ValueError:
+        return key
+
+def is_column_key(node):
+    """
+    Whether a node ID can be used as a key of the int64 node key arrays built when indexing a columnar ledger,
+    where negative keys are markers.
+    """
+    return type(node) is int and 0 <= node < 2 ** 63
 
 class MockTangle:
-    def __init__(self, ledger_file_path):
+    def __init__(self, ledger_file_path, log_file_path=None, fsync_every=32, compact_every=10000, recent_per_node=8,
+                 group_commit=True, lock_stripes=16, threaded_contracts=True, max_contract_depth=1,
+                 loss_window=32, loss_ewma_alpha=0.1, tip_selector=None, max_live_transactions=None,
+                 prune_horizon=None, archive_path=None, index_state=None):
         """
         Initializes the mock Tangle with a specified ledger file path.
 
+        The tangle is shared by all node threads: hash allocation and ledger appends are serialized by a short
+        append lock, per-node indexes are guarded by striped locks, and persistence is handed over to a
+        single committer thread that writes queued transactions in groups.
+
         Parameters:
-        - ledger_file_path: Path to the ledger file storing transactions.
+        - ledger_file_path: Path to the ledger file storing transactions (snapshot). Paths ending with '.columns'
+                            are stored in the memory-mapped columnar format.
+        - log_file_path: Path to the append-only log holding transactions added since the last snapshot.
+        - fsync_every: Number of appended transactions after which the log is fsync'ed.
+        - compact_every: Number of logged transactions after which the snapshot is rewritten and the log truncated.
+        - recent_per_node: Number of recent transaction hashes kept per node for approval selection.
+        - group_commit: If True, transactions are persisted by a background committer thread.
+        - lock_stripes: Number of locks sharing the per-node indexes.
+        - threaded_contracts: If True, smart contracts are evaluated by a background worker instead of the writer.
+        - max_contract_depth: Transactions emitted through this many nested contract actions are not evaluated again.
+        - loss_window: Number of most recent losses per node covered by the rolling loss statistics.
+        - loss_ewma_alpha: Weight of the newest loss in the per-node exponentially weighted moving average.
+        - tip_selector: Optional WeightedRandomWalk (see tip_selection.py). If given, transactions to approve are
+                        selected by weighted random walks instead of from the neighbors' most recent transactions,
+                        and confirmation confidences can be queried.
+        - max_live_transactions: Memory cap: once the ledger holds more transactions, it is pruned down to
+                                 prune_horizon transactions (by a background thread with group commit, so
+                                 writers keep adding transactions meanwhile). None disables automatic pruning.
+        - prune_horizon: Number of most recent transactions kept live when pruning. Must be below
+                         max_live_transactions; defaults to half of it (10000 without a cap).
+        - archive_path: Directory receiving the pruned transactions. Defaults to the ledger path with an
+                        '.archive' suffix.
+        - index_state: Indexes saved by get_index_state (e.g. from a checkpoint). They replace indexing the whole
+                       ledger on startup; only transactions logged after they were saved are indexed.
         """
         self.ledger_file_path = ledger_file_path
+        self.store = AppendOnlyLedgerStore(ledger_file_path, log_file_path, fsync_every=fsync_every, compact_every=compact_every)
         self.transactions = self.load_ledger()
-        self.smart_contracts = []  # List to hold deployed smart contracts
+        # Pruned history: per-node loss aggregates, unapproved tips and the number of pruned transactions
+        self.summary = self.store.summary or {"pruned_transactions": 0, "nodes": {}, "tips": []}
+        self.archive = LedgerArchive(archive_path or f"{os.path.splitext(self.store.snapshot_path)[0]}.archive")
+        if prune_horizon is None:
+            prune_horizon = 10000 if max_live_transactions is None else max_live_transactions // 2
+        if max_live_transactions is not None:
+            # Pruning down to the cap or above it would prune (and rewrite the snapshot) on every add
+            horizon = prune_horizon if tip_selector is None else max(prune_horizon, tip_selector.weight_horizon)
+            if horizon >= max_live_transactions:
+                raise ValueError(f"The prune horizon ({horizon} transactions) must be below "
+                                 f"max_live_transactions ({max_live_transactions}).")
+        self.max_live_transactions = max_live_transactions
+        self.prune_horizon = prune_horizon
+        self.contract_engine = ContractEngine(threaded=threaded_contracts, max_depth=max_contract_depth)
+        self.smart_contracts = self.contract_engine.contracts  # List to hold deployed smart contracts
+
+        # Incremental indexes, kept up to date on every added transaction so lookups never scan the ledger
+        self.recent_per_node = max(2, recent_per_node)
+        self.next_sequence = self.summary["pruned_transactions"]  # Ledger position assigned to the next indexed transaction
+        self.transactions_by_hash = {}  # hash -> transaction
+        self.recent_by_node = {}  # added_by -> deque of (sequence, hash) of its most recent transactions
+        self.loss_statistics = LossStatistics(window=loss_window, ewma_alpha=loss_ewma_alpha)  # Streaming stats per node
+        self.tips = dict.fromkeys(self.summary["tips"])  # Unapproved transaction hashes, in insertion order (dict used as an ordered set)
+        self.tip_selector = tip_selector  # Cumulative weights, maintained under the append lock
+
+        # Locking: the append lock covers hash allocation, the ledger list, the hash index and the tip set;
+        # per-node indexes are spread over striped locks so that nodes do not contend with each other
+        self.append_lock = threading.Lock()
+        self.node_locks = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        # Pruning replaces the ledger list and the summary together; compactions must see both or neither
+        self.state_lock = threading.Lock()
+        self.prune_lock = threading.Lock()
+        # Pruning runs on a background thread in group commit mode, so that the writer crossing
+        # max_live_transactions does not write the archive and the snapshot itself
+        self.prune_requested = threading.Event()
+        self.pruner_stopping = False
+        # Sequences allocated under the append lock whose per-node indexing has not completed yet; the condition
+        # is notified when the last one completes (lock order: append lock, then the condition's lock)
+        self.in_flight = set()
+        self.in_flight_done = threading.Condition(threading.Lock())
+
+        if index_state is None or not self.restore_index_state(index_state):
+            # Per-node loss statistics of a pruned ledger continue from the aggregates of its pruned history
+            for node, aggregates in self.summary["nodes"].items():
+                self.loss_statistics.seed(summary_node(node), aggregates["count"], aggregates["last"],
+                                          aggregates.get("previous"), aggregates.get("ewma"), aggregates["min"],
+                                          aggregates["max"])
+            transactions = self.transactions
+            if isinstance(transactions, ColumnarTransactions):
+                # Rows of a columnar snapshot are indexed straight from the column arrays, without rebuilding them
+                self._index_columns(transactions)
+                transactions = transactions.appended
+            for transaction in transactions:
+                self.index_transaction(transaction)
+
+        self.committer = GroupCommitter(self.store, self._compaction_source, threaded=group_commit)
+        self.pruner = None
+        if group_commit and max_live_transactions is not None:
+            self.pruner = threading.Thread(target=self._prune_when_requested, name="ledger-pruner", daemon=True)
+            self.pruner.start()
+
+    def _compaction_source(self):
+        with self.state_lock:
+            view, summary = self.get_view(), self.summary
+        return list(view), summary
+
+    def index_transaction(self, transaction):
+        """
+        Updates the lookup indexes with a transaction appended to the ledger.
+
+        Parameters:
+        - transaction: The transaction that was appended.
+
+        Returns:
+        - The ledger sequence number assigned to the transaction.
+        """
+        with self.append_lock:
+            sequence = self._index_globally(transaction)
+        self._index_per_node(transaction, sequence)
+        return sequence
+
+    def _index_globally(self, transaction):
+        # Caller holds the append lock; the caller must index the transaction per node next
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        with self.in_flight_done:
+            self.in_flight.add(sequence)
+        transaction_hash = transaction["hash"]
+        self.transactions_by_hash[transaction_hash] = transaction
+        for approved_hash in transaction["approving_transactions"]:
+            self.tips.pop(approved_hash, None)
+        self.tips[transaction_hash] = None
+        if self.tip_selector is not None:
+            self.tip_selector.add(transaction_hash, transaction["approving_transactions"])
+        return sequence
+
+    def _index_per_node(self, transaction, sequence):
+        # Returns the node's loss before this transaction's, or None (first loss, or no loss indexed)
+        previous_loss = None
+        try:
+            data = transaction['data']
+
+            added_by = data.get("added_by")
+            with self._node_lock(added_by):
+                recent = self.recent_by_node.get(added_by)
+                if recent is None:
+                    recent = self.recent_by_node[added_by] = deque(maxlen=self.recent_per_node)
+                recent.append((sequence, transaction["hash"]))
+
+            # Contract-emitted transactions repeat losses that were already counted
+            loss = data.get('loss')
+            if isinstance(loss, (int, float)) and not transaction.get("contract_depth"):
+                node = data.get("added_by", data.get('node_id'))
+                with self._node_lock(node):
+                    previous_loss = self.loss_statistics.update(node, loss)
+        finally:
+            # Even a transaction that could not be indexed must not block checkpoints forever
+            with self.in_flight_done:
+                self.in_flight.discard(sequence)
+                if not self.in_flight:
+                    self.in_flight_done.notify_all()
+        return previous_loss
+
+    def _index_columns(self, transactions):
+        # Bulk equivalent of index_transaction for the columnar rows of the ledger, with NumPy over the memory-mapped
+        # columns. Called by the constructor before any writer runs. The hash index is not filled: get_transaction
+        # looks the columnar rows up in the columns.
+        ledger = transactions.ledger
+        start, stop = transactions.start, len(ledger)
+        first_sequence = self.next_sequence
+        self.next_sequence += stop - start
+        hash_ids = np.asarray(ledger.hash_id[start:stop])
+        offsets = np.asarray(ledger.approval_offsets[start:stop + 1])
+        approvals = np.asarray(ledger.approvals[offsets[0]:offsets[-1]])
+
+        # Tips: pruned tips and rows that no row approves (hash ids are dense, so membership is a table lookup)
+        tip_ids = np.array([hash_to_id(tip) for tip in self.tips], dtype=np.int64)
+        kept = ~np.isin(tip_ids, approvals, kind="table")
+        self.tips = dict.fromkeys(tip for tip, keep in zip(self.tips, kept) if keep)
+        unapproved = hash_ids[~np.isin(hash_ids, approvals, kind="table")]
+        self.tips.update(dict.fromkeys(map(id_to_hash, unapproved.tolist())))
+        if self.tip_selector is not None:
+            approval_hashes = [id_to_hash(approved_id) for approved_id in approvals.tolist()]
+            relative = (offsets - offsets[0]).tolist()
+            for index, hash_id in enumerate(hash_ids.tolist()):
+                self.tip_selector.add(id_to_hash(hash_id), approval_hashes[relative[index]:relative[index + 1]])
+
+        # Per-node keys as _index_per_node derives them: -1 stands for None, -2 for rows handled one by one
+        # (nodes that are not int64 keys, e.g. negative ints or strings, see is_column_key)
+        recent_keys = np.asarray(ledger.added_by[start:stop], dtype=np.int64)
+        loss_keys = recent_keys.copy()
+        others = []  # (row, added_by, loss node) of rows whose node keys are not integers
+        for row, data in ledger.extras.items():
+            if not start <= row < stop:
+                continue
+            index = row - start
+            if not isinstance(data, dict):
+                recent_keys[index] = -1
+                continue
+            added_by, loss_node = data.get("added_by"), data.get("added_by", data.get("node_id"))
+            for keys, node in ((recent_keys, added_by), (loss_keys, loss_node)):
+                keys[index] = -1 if node is None else node if is_column_key(node) else -2
+            if any(node is not None and not is_column_key(node) for node in (added_by, loss_node)):
+                others.append((index, added_by, loss_node))
+
+        for node, rows in self._group_rows(recent_keys, np.arange(stop - start)):
+            rows = rows[-self.recent_per_node:].tolist()
+            self.recent_by_node[node] = deque(((first_sequence + index, id_to_hash(int(hash_ids[index])))
+                                               for index in rows), maxlen=self.recent_per_node)
+        # Contract-emitted transactions repeat losses that were already counted
+        losses = np.asarray(ledger.loss[start:stop])
+        counted = np.flatnonzero(~np.isnan(losses) & (np.asarray(ledger.contract_depth[start:stop]) == 0))
+        for node, rows in self._group_rows(loss_keys[counted], counted):
+            self.loss_statistics.extend(node, losses[rows])
+
+        for index, added_by, loss_node in others:
+            if added_by is not None and not is_column_key(added_by):
+                recent = self.recent_by_node.setdefault(added_by, deque(maxlen=self.recent_per_node))
+                recent.append((first_sequence + index, id_to_hash(int(hash_ids[index]))))
+            if loss_node is not None and not is_column_key(loss_node) and index in counted:
+                self.loss_statistics.update(loss_node, losses[index])
+
+    @staticmethod
+    def _group_rows(keys, rows):
+        # Yields (node, rows in ledger order) for every node key other than -2; -1 stands for None
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for group_keys, group_rows in zip(np.split(keys, bounds), np.split(rows, bounds)):
+            if len(group_keys) and group_keys[0] != -2:
+                yield None if group_keys[0] == -1 else int(group_keys[0]), group_rows
+
+    def _node_lock(self, node):
+        return self.node_locks[hash(node) % len(self.node_locks)]
+
+    def get_index_state(self):
+        """
+        Copies the lookup indexes for a checkpoint. New transactions wait while the copy is taken.
+
+        Returns:
+        - A dictionary of NumPy arrays and JSON-serializable values, covering the transactions before
+          "next_sequence" exactly. Pass it as MockTangle(index_state=...) to resume.
+        """
+        with self.append_lock:
+            # Transactions already allocated finish their per-node indexing without the append lock
+            with self.in_flight_done:
+                self.in_flight_done.wait_for(lambda: not self.in_flight)
+            state = {
+                "next_sequence": self.next_sequence,
+                "tips": list(self.tips),
+                "recent_by_node": [[node, [list(entry) for entry in recent]]
+                                   for node, recent in self.recent_by_node.items()],
+                "loss_statistics": self.loss_statistics.get_state(),
+            }
+            if self.tip_selector is not None:
+                state["tip_selector"] = self.tip_selector.get_state()
+        return state
+
+    def restore_index_state(self, state):
+        """
+        Restores the lookup indexes from get_index_state and indexes the transactions logged after it was taken.
+        Called by the constructor.
+
+        Parameters:
+        - state: The saved indexes.
+
+        Returns:
+        - True if they were restored, False if they do not match the loaded ledger (the caller then indexes
+          the whole ledger).
+        """
+        first_sequence = self.summary["pruned_transactions"]
+        next_sequence = state["next_sequence"]
+        if not first_sequence <= next_sequence <= first_sequence + len(self.transactions) \
+           or (self.tip_selector is not None) != ("tip_selector" in state) \
+           or state["loss_statistics"]["window"] != self.loss_statistics.window:
+            print("Saved tangle indexes do not match the ledger; indexing the whole ledger.")
+            return False
+
+        self.next_sequence = next_sequence
+        # Columnar rows are looked up in the columns; only the transactions after them need the hash index
+        column_rows = getattr(self.transactions, "column_rows", 0)
+        self.transactions_by_hash = {self.transactions[index]["hash"]: self.transactions[index]
+                                     for index in range(column_rows, next_sequence - first_sequence)}
+        self.tips = dict.fromkeys(state["tips"])
+        self.recent_by_node = {node: deque(map(tuple, recent), maxlen=self.recent_per_node)
+                               for node, recent in state["recent_by_node"]}
+        self.loss_statistics.set_state(state["loss_statistics"])
+        if self.tip_selector is not None:
+            self.tip_selector.set_state(state["tip_selector"])
+        for transaction in self.transactions[next_sequence - first_sequence:]:
+            self.index_transaction(transaction)
+        return True
+
+    def get_view(self):
+        """
+        Returns a consistent read-only view of the ledger without blocking writers for longer than a length read.
+
+        Returns:
+        - A LedgerView over all live (not pruned) transactions added so far.
+        """
+        transactions = self.transactions
+        return LedgerView(transactions, len(transactions))
 
     def load_ledger(self):
         """
-        Loads transactions from a ledger file, or initializes a new ledger if the file is not found.
+        Loads transactions from the ledger snapshot and replays the append-only log,
+        or initializes a new ledger if neither is found.
 
         Returns:
         - A list of transactions loaded from the ledger.
         """
-        try:
-            with open(self.ledger_file_path, 'r') as file:
-                ledger = json.load(file)
-            return ledger.get("transactions", [])
-        except FileNotFoundError:
+        transactions = self.store.load()
+        if transactions is None:
             print(f"Ledger file {self.ledger_file_path} not found. Creating a new ledger.")
             return self.initialize_ledger()
+        return transactions
 
     def initialize_ledger(self):
         """
@@ -57,7 +415,7 @@ class MockTangle:
         - A list containing the genesis transaction.
         """
         genesis_transaction = {"hash": "genesis", "approving_transactions": [], "data": {"message": "Genesis transaction"}}
-        self.save_ledger([genesis_transaction])
+        self.store.compact([genesis_transaction])
         return [genesis_transaction]
 
     def add_transaction(self, data, approving_transactions):
@@ -71,29 +429,170 @@ class MockTangle:
         Returns:
         - The hash of the added transaction.
         """
-        transaction_hash = f"tx_{len(self.transactions)}"
-        new_transaction = {"hash": transaction_hash, "approving_transactions": approving_transactions, "data": data}
-        self.transactions.append(new_transaction)
-        for contract in self.smart_contracts:
-            contract.evaluate_and_execute(data)
-        self.save_ledger()
+        # Transactions added from within a contract action are one level deeper than the one that triggered it
+        contract_depth = self.contract_engine.current_depth()
+        start_time = time.perf_counter()
+        with self.append_lock:
+            locked_time = time.perf_counter()
+            # The hash is derived from the ledger position, so allocation and append must happen together
+            transaction_hash = f"tx_{self.next_sequence}"
+            new_transaction = {"hash": transaction_hash, "approving_transactions": approving_transactions, "data": data}
+            if contract_depth:
+                new_transaction["contract_depth"] = contract_depth
+            sequence = self._index_globally(new_transaction)
+            self.transactions.append(new_transaction)
+            # Persist only the new record, in ledger order; the committer groups it with other pending writes
+            self.committer.submit(new_transaction)
+        previous_loss = self._index_per_node(new_transaction, sequence)
+        # Contracts are evaluated off the write path, with the node's loss history as of this transaction
+        self.contract_engine.submit(data, contract_depth, {"sequence": sequence, "previous_loss": previous_loss})
+        METRICS.observe("tangle_append_lock_wait_seconds", locked_time - start_time)
+        METRICS.observe("tangle_add_transaction_seconds", time.perf_counter() - start_time)
+        live = len(self.transactions)
+        if self.max_live_transactions is not None and live > self.max_live_transactions and live > self._prune_keep():
+            if self.pruner is not None:
+                self.prune_requested.set()
+            elif not self.prune_lock.locked():
+                self.prune()
         return transaction_hash
 
+    def _prune_when_requested(self):
+        while True:
+            self.prune_requested.wait()
+            self.prune_requested.clear()
+            if self.pruner_stopping:
+                return
+            try:
+                self.prune()
+            except OSError as e:
+                print(f"Failed to prune {self.ledger_file_path}: {e}")
+
+    def prune(self, keep=None):
+        """
+        Moves all but the most recent transactions to the archive and folds them into the ledger summary:
+        per-node loss aggregates and the hashes of pruned transactions that are still tips (at most `keep`
+        of them; older ones are no longer offered for approval). The pruned ledger is then snapshotted,
+        which also truncates the append-only log.
+
+        Parameters:
+        - keep: Number of most recent transactions kept live (defaults to prune_horizon). Never less than the
+                tip selector's weight horizon.
+
+        Returns:
+        - The number of pruned transactions.
+        """
+        keep = self._prune_keep(keep)
+        with self.prune_lock:
+            # The ledger list is only appended to, so its prefix can be read without the append lock
+            transactions = self.transactions
+            count = len(transactions) - keep
+            if count <= 0:
+                return 0
+            pruned = transactions[:count]
+            first_sequence = self.summary["pruned_transactions"]
+            self.archive.write_segment(first_sequence, pruned)
+            summary, dropped_tips = self._summarize(pruned, keep)
+
+            with self.append_lock:
+                live = self.transactions[count:]
+                with self.state_lock:
+                    self.transactions = live  # Existing LedgerViews keep reading the previous list
+                    self.summary = summary
+                for tip in dropped_tips:
+                    self.tips.pop(tip, None)
+                if self.tip_selector is not None:
+                    self.tip_selector.prune(count)
+            for transaction in pruned:
+                self.transactions_by_hash.pop(transaction["hash"], None)
+
+            self.committer.compact()
+            return count
+
+    def _prune_keep(self, keep=None):
+        # Number of transactions actually kept live by prune(keep)
+        keep = self.prune_horizon if keep is None else keep
+        if self.tip_selector is not None:
+            keep = max(keep, self.tip_selector.weight_horizon)
+        return keep
+
+    def _summarize(self, pruned, max_tips):
+        # Merge the pruned transactions into a copy of the current summary. Returns the summary and the tips that
+        # no longer fit in it (the oldest ones), which are then no longer offered for approval.
+        nodes = {node: dict(aggregates) for node, aggregates in self.summary["nodes"].items()}
+        alpha = self.loss_statistics.ewma_alpha
+        for transaction in pruned:
+            data = transaction["data"]
+            loss = data.get("loss") if isinstance(data, dict) else None
+            if not isinstance(loss, (int, float)) or transaction.get("contract_depth"):
+                continue
+            node = str(data.get("added_by", data.get("node_id")))  # JSON object keys are strings
+            aggregates = nodes.get(node)
+            if aggregates is None:
+                aggregates = nodes[node] = {"count": 0, "sum": 0.0, "sum_squares": 0.0, "min": loss, "max": loss,
+                                            "ewma": loss}
+            aggregates["count"] += 1
+            aggregates["sum"] += loss
+            aggregates["sum_squares"] += loss * loss
+            aggregates["min"] = min(aggregates["min"], loss)
+            aggregates["max"] = max(aggregates["max"], loss)
+            aggregates["ewma"] = alpha * loss + (1 - alpha) * aggregates.get("ewma", loss)
+            aggregates["previous"] = aggregates.get("last")
+            aggregates["last"] = loss
+
+        # Tips are re-checked so that references approved since the last pruning are dropped
+        tips = self.tips
+        pruned_tips = [h for h in self.summary["tips"] if h in tips]
+        pruned_tips.extend(transaction["hash"] for transaction in pruned if transaction["hash"] in tips)
+        dropped_tips = pruned_tips[:-max_tips] if len(pruned_tips) > max_tips else []
+        summary = {"pruned_transactions": self.summary["pruned_transactions"] + len(pruned), "nodes": nodes,
+                   "tips": pruned_tips[len(dropped_tips):]}
+        return summary, dropped_tips
+
     def save_ledger(self):
         """
-        Saves the current state of transactions to the ledger file.
+        Saves the current state of transactions to the ledger file and truncates the append-only log.
+        """
+        self.committer.compact()
+
+    def flush(self):
+        """
+        Blocks until every added transaction has been evaluated by the smart contracts
+        and written to the append-only log.
+        """
+        self.contract_engine.flush()
+        self.committer.flush()
+
+    def close(self):
+        """
+        Evaluates pending smart contracts, flushes pending log records to disk, stops the background
+        workers and releases the ledger files.
         """
-        with open(self.ledger_file_path, 'w') as file:
-            json.dump({"transactions": self.transactions}, file, indent=4)
-    
+        self.contract_engine.close()
+        if self.pruner is not None:
+            # A pruning in progress completes first
+            self.pruner_stopping = True
+            self.prune_requested.set()
+            self.pruner.join()
+            self.pruner = None
+        self.committer.close()
+
     def add_smart_contract(self, smart_contract):
         """
-        Adds a smart contract to the list of contracts to be evaluated for each transaction.
+        Adds a smart contract to the contracts evaluated for the transactions it subscribes to.
 
         Parameters:
         - smart_contract: An instance of SmartContract to be added.
         """
-        self.smart_contracts.append(smart_contract)
+        self.contract_engine.register(smart_contract)
+
+    def get_contract_metrics(self):
+        """
+        Retrieves evaluation counts and latencies of the deployed smart contracts.
+
+        Returns:
+        - A dictionary of metrics as returned by ContractEngine.get_metrics.
+        """
+        return self.contract_engine.get_metrics()
 
     def get_recent_transactions(self):
         """
@@ -102,26 +601,121 @@ class MockTangle:
         Returns:
         - A list containing hashes of the two most recent transactions.
         """
-        return [tx["hash"] for tx in self.transactions[-2:]]
+        return [tx["hash"] for tx in self.get_view()[-2:]]
 
     def get_last_loss(self, node_id):
         """
         Retrieves the last recorded loss for a specific node.
 
         Parameters:
-        - node_id: The identifier of the node whose last loss is to be retrieved.
+        - node_id: The identifier of the node whose last loss is to be retrieved (the transactions' "added_by").
 
         Returns:
         - The last loss recorded for the node, or None if not found.
         """
-        for transaction in reversed(self.transactions):
-            if transaction['data'].get('node_id') == node_id:
-                return transaction['data'].get('loss')
-        return None
+        statistics = self.loss_statistics.get(node_id)
+        return statistics["last"] if statistics is not None else None
+
+    def get_loss_stats(self, node_id):
+        """
+        Retrieves streaming loss statistics for a specific node, maintained incrementally as transactions are added.
+
+        Parameters:
+        - node_id: The identifier of the node (the transactions' "added_by").
+
+        Returns:
+        - A dictionary with count, last, previous, ewma, min, max, and the rolling window's mean, variance and std,
+          or None if the node has not recorded any loss.
+        """
+        with self._node_lock(node_id):
+            return self.loss_statistics.get(node_id)
+
+    def get_recent_losses(self, node_id):
+        """
+        Retrieves the losses of a specific node covered by its rolling statistics window.
+
+        Parameters:
+        - node_id: The identifier of the node (the transactions' "added_by").
+
+        Returns:
+        - A list of losses, oldest first.
+        """
+        with self._node_lock(node_id):
+            return self.loss_statistics.recent(node_id)
+
+    def get_transaction(self, transaction_hash, include_archive=False):
+        """
+        Retrieves a transaction by its hash.
+
+        Parameters:
+        - transaction_hash: The hash of the transaction.
+        - include_archive: If True, pruned transactions are looked up in the archive (reads one segment file).
+
+        Returns:
+        - The transaction, or None if not found.
+        """
+        transaction = self.transactions_by_hash.get(transaction_hash)
+        transactions = self.transactions
+        if transaction is None and isinstance(transactions, ColumnarTransactions):
+            transaction = transactions.find(transaction_hash)
+        if transaction is None and include_archive:
+            transaction = self.archive.get_transaction(transaction_hash)
+        return transaction
+
+    def get_archived_transactions(self, first_sequence=0, last_sequence=None):
+        """
+        Lazily reads pruned transactions from the archive, e.g. for audits.
+
+        Parameters:
+        - first_sequence: Ledger sequence (the number in "tx_<n>") of the first transaction to read.
+        - last_sequence: Ledger sequence of the last transaction to read (defaults to the last pruned one).
+
+        Returns:
+        - An iterator over the archived transactions, in ledger order.
+        """
+        return self.archive.iter_transactions(first_sequence, last_sequence)
+
+    def get_summary(self):
+        """
+        Retrieves the summary of pruned history.
+
+        Returns:
+        - A dictionary with the number of pruned transactions, per-node loss aggregates of the pruned transactions
+          (count, sum, sum_squares, min, max, ewma, previous, last; keyed by the node ID as a string) and the
+          hashes of pruned transactions that are still tips.
+        """
+        return self.summary
+
+    def get_tips(self):
+        """
+        Retrieves the hashes of transactions that are not yet approved by any other transaction.
+
+        Returns:
+        - A list of tip hashes, oldest first.
+        """
+        with self.append_lock:
+            return list(self.tips)
+
+    def get_confirmation_confidence(self, transaction_hash, samples=100):
+        """
+        Estimates the share of tip selections that directly or indirectly approve a transaction.
+
+        Parameters:
+        - transaction_hash: The hash of the transaction.
+        - samples: Number of random walks.
+
+        Returns:
+        - A confidence between 0.0 and 1.0, or None if the transaction is unknown or the tangle has no tip selector.
+        """
+        if self.tip_selector is None:
+            return None
+        with self.append_lock:
+            return self.tip_selector.confirmation_confidence(transaction_hash, samples)
 
     def get_transactions_for_approval(self, node_id, neighbors):
         """
         Selects transactions for a node to approve, prioritizing those added by neighbors.
+        With a tip selector, two tips are selected by weighted random walks instead.
 
         Parameters:
         - node_id: The identifier of the node making the approval.
@@ -130,9 +724,19 @@ class MockTangle:
         Returns:
         - A list of transaction hashes for the node to approve.
         """
-        neighbor_transactions = [tx for tx in self.transactions if tx['data'].get("added_by") in neighbors]
-        if neighbor_transactions:
-            return [tx["hash"] for tx in neighbor_transactions[-2:]]
+        if self.tip_selector is not None:
+            with self.append_lock:
+                return sorted(set(self.tip_selector.select_tips(2)))
+
+        # Only the two most recent transactions of each neighbor can be among the two most recent overall
+        candidates = []
+        for neighbor in set(neighbors or ()):
+            with self._node_lock(neighbor):
+                recent = self.recent_by_node.get(neighbor)
+                if recent:
+                    candidates.extend(recent)
+        if candidates:
+            return [transaction_hash for _, transaction_hash in sorted(heapq.nlargest(2, candidates))]
         else:
             return self.get_recent_transactions()
 
@@ -143,31 +747,39 @@ class MockTangle:
 
 ################## Smart Contract 1 ##################
 # Instantiate the SmartContract with a wrapper function to include the dynamic check for loss fluctuation
-def create_loss_fluctuation_contract(tangle, initial_loss=None):
-    # Initialize last_loss with initial_loss to maintain state across calls
-    last_loss = {'value': initial_loss}
+def create_loss_fluctuation_contract(tangle, initial_loss=None, threshold=0.05):
+    # Per-node loss history comes from the tangle's streaming statistics, so nodes no longer share one last loss
+
+    def reference_loss():
+        """Loss the current one is compared with: the node's previous loss, or initial_loss for its first one."""
+        # Contracts are evaluated behind the writers, so the node may have recorded newer losses already;
+        # the tangle records the node's previous loss when it indexes the transaction and submits it along
+        context = tangle.contract_engine.current_context() or {}
+        previous_loss = context.get("previous_loss")
+        return initial_loss if previous_loss is None else previous_loss
 
     def loss_conditions(data):
-        """Check if the current loss is fluctuating within 5% of the last loss."""
+        """Check if the current loss deviates by more than the threshold (5% by default) from the node's last loss."""
         current_loss = data.get("loss")
-        # Check if last_loss['value'] is not None to ensure it has been set previously
-        if last_loss['value'] is None or current_loss is None:
+        if current_loss is None:
+            return False
+        last_loss = reference_loss()
+        # Check if the node's last loss has been set previously
+        if last_loss is None or last_loss == 0:
             return False
-        fluctuation = abs(current_loss - last_loss['value']) / last_loss['value']
-        return fluctuation <= 0.05
+        fluctuation = abs(current_loss - last_loss) / last_loss
+        return fluctuation > threshold
 
     def loss_action(data):
-        """Update the transaction message to 'Abnormal Loss' and announce to neighbors."""
-        # Modify the message for transactions with abnormal loss fluctuation
-        data["message"] = "Abnormal Loss"
+        """Announce the transaction as 'Abnormal Loss' to neighbors."""
+        # Committed transactions are immutable, so the alert is a copy with the modified message
+        alert = dict(data, message="Abnormal Loss")
         print(f"Abnormal loss detected. Notifying neighbors.")
         # Add a transaction to the tangle for demonstration
-        tangle.add_transaction(data, ["genesis"])  # Simplify the approval process for demonstration
-        # Update last_loss after acting on the current loss
-        last_loss['value'] = data.get("loss")
+        tangle.add_transaction(alert, ["genesis"])  # Simplify the approval process for demonstration
 
     # Return a SmartContract instance with the wrapped condition and action
-    return SmartContract(loss_conditions, loss_action)
+    return SmartContract(loss_conditions, loss_action, subscriptions=["loss"], name="loss_fluctuation")
 
 
 ################## Smart Contract 2 ##################
@@ -196,7 +808,8 @@ def create_significant_environment_change_contract(tangle, initial_env_data=None
         last_env_data['value'] = data.get("env_data", 0)
         significant_environment_change_action(data, tangle, data.get("node_id"), data.get("neighbors", []))
 
-    return SmartContract(wrapped_conditions, wrapped_action)
+    return SmartContract(wrapped_conditions, wrapped_action, subscriptions=["env_data"],
+                         name="significant_environment_change")
 
 #######################################################
 def test_tangle(mocked_tangle):
@@ -0,0 +1,401 @@
+import bisect
+import heapq
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import numpy as np
+from gradient_board import GradientBoard
+from instrumentation import METRICS
+
+######################
+# Local network emulation
+# EmulatedNetwork replaces the GradientBoard when communication costs matter: a published gradient is no longer
+# visible to every neighbor at once, but sent as one message per neighbor over the links of the topology
+# (network_topology.json). Every link models:
+# - latency: fixed propagation delay, plus optional uniform jitter
+# - bandwidth: bytes per second; messages on the same directed link are serialized one after the other, so a
+#   large gradient also delays the messages queued behind it
+# - drop rate: probability that a message is lost
+# Node churn takes nodes offline and back online (exponentially distributed up and down times); an offline node
+# neither sends nor receives, while it keeps training on its own data.
+#
+# Each receiver keeps the latest gradient delivered from each neighbor. A message is delivered once the clock
+# passes its arrival time, when the receiver next aggregates; messages arriving out of order never replace a
+# newer version. All times come from the network's clock, so with the scheduler backend messages travel in
+# simulated time.
+#
+# Gradients can be compressed before they are sent (top-k sparsification, quantization), which reduces the bytes
+# on the links at the cost of a less accurate average. Transactions recorded to the tangle through a
+# NetworkedTangle are broadcast to the recording node's neighbors as well, so their bytes are accounted; the
+# ledger itself stays shared.
+#
+# The emulator runs entirely in this process: it supports the "threads" and "scheduler" backends.
+######################
+
+FLOAT_BYTES = 4  # Gradients are float32
+INDEX_BYTES = 4  # Sparse indices are int32
+
+class LinkModel:
+    def __init__(self, latency=0.05, jitter=0.0, bandwidth=None, drop_rate=0.0):
+        """
+        Describes the links between neighbors.
+
+        Parameters:
+        - latency: Propagation delay in seconds.
+        - jitter: Maximum extra delay in seconds, drawn uniformly for every message.
+        - bandwidth: Link capacity in bytes per second, or None for unlimited.
+        - drop_rate: Probability that a message is lost.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.drop_rate = drop_rate
+
+class ChurnModel:
+    def __init__(self, mean_uptime, mean_downtime, seed=None):
+        """
+        Takes nodes offline and back online. Every node starts online; up and down times are exponentially
+        distributed with the given means.
+
+        Parameters:
+        - mean_uptime: Mean time a node stays online, in seconds.
+        - mean_downtime: Mean time a node stays offline, in seconds.
+        - seed: Seed for the up and down times.
+        """
+        self.mean_uptime = mean_uptime
+        self.mean_downtime = mean_downtime
+        self.random = random.Random(seed)
+        self.start_time = None
+        self.transitions = {}  # node -> times at which the node toggled, starting online
+        self.lock = threading.Lock()
+
+    def is_online(self, node, timestamp):
+        """
+        Returns True if the node is online at the given time. The schedule of each node is drawn lazily.
+        """
+        with self.lock:
+            if self.start_time is None:
+                self.start_time = timestamp
+            transitions = self.transitions.get(node)
+            if transitions is None:
+                transitions = self.transitions[node] = [self.start_time]
+            while transitions[-1] <= timestamp:
+                mean = self.mean_uptime if len(transitions) % 2 else self.mean_downtime
+                transitions.append(transitions[-1] + self.random.expovariate(1.0 / mean))
+            # Transitions alternate online, offline, online...; the number passed tells which phase we are in
+            return bisect.bisect_right(transitions, timestamp) % 2 == 1
+
+######################
+# Gradient compression
+# A compressor returns the gradient as the receivers reconstruct it, and the number of bytes it takes on a link.
+######################
+
+class Compressor:
+    """Sends gradients uncompressed, as dense float32 arrays."""
+
+    def compress(self, sender, tensor):
+        """
+        Parameters:
+        - sender: The identifier of the sending node (compressors may keep per-sender state).
+        - tensor: The gradient, as a NumPy array.
+
+        Returns:
+        - A tuple (decoded, size): the gradient as reconstructed by the receivers and the message size in bytes.
+        """
+        return np.array(tensor, dtype=np.float32), tensor.size * FLOAT_BYTES
+
+class TopKCompressor(Compressor):
+    def __init__(self, ratio=0.1, error_feedback=True):
+        """
+        Sends only the largest-magnitude entries of each gradient, as (index, value) pairs.
+
+        Parameters:
+        - ratio: Fraction of the entries sent (at least one).
+        - error_feedback: If True, the entries left out are added to the sender's next gradient, so that every
+                          component is eventually transmitted.
+        """
+        self.ratio = ratio
+        self.error_feedback = error_feedback
+        self.residuals = {}  # sender -> accumulated entries not sent yet
+
+    def compress(self, sender, tensor):
+        tensor = np.asarray(tensor, dtype=np.float32)
+        if self.error_feedback:
+            residual = self.residuals.get(sender)
+            if residual is not None:
+                tensor = tensor + residual
+        flat = tensor.ravel()
+        k = max(1, int(math.ceil(self.ratio * flat.size)))
+        selected = np.argpartition(np.abs(flat), flat.size - k)[flat.size - k:]
+        decoded = np.zeros_like(flat)
+        decoded[selected] = flat[selected]
+        decoded = decoded.reshape(tensor.shape)
+        if self.error_feedback:
+            self.residuals[sender] = tensor - decoded
+        return decoded, k * (INDEX_BYTES + FLOAT_BYTES)
+
+class QuantizationCompressor(Compressor):
+    def __init__(self, bits=8, stochastic=True, seed=None):
+        """
+        Sends each gradient entry with `bits` bits: a uniform quantization between the gradient's minimum and
+        maximum, which are sent alongside.
+
+        Parameters:
+        - bits: Bits per entry (1 to 16).
+        - stochastic: If True, entries are rounded up or down at random in proportion to their distance to the
+                      two nearest levels, which keeps the reconstructed gradient unbiased.
+        - seed: Seed for the stochastic rounding.
+        """
+        self.levels = 2 ** bits - 1
+        self.bits = bits
+        self.stochastic = stochastic
+        self.rng = np.random.default_rng(seed)
+
+    def compress(self, sender, tensor):
+        tensor = np.asarray(tensor, dtype=np.float32)
+        low, high = float(tensor.min()), float(tensor.max())
+        size = int(math.ceil(tensor.size * self.bits / 8)) + 2 * FLOAT_BYTES
+        if high == low:
+            return np.full_like(tensor, low), size
+        scaled = (tensor - low) * (self.levels / (high - low))
+        if self.stochastic:
+            quantized = np.floor(scaled + self.rng.random(tensor.shape, dtype=np.float32))
+        else:
+            quantized = np.rint(scaled)
+        return (low + quantized * ((high - low) / self.levels)).astype(np.float32), size
+
+COMPRESSORS = {
+    "none": Compressor,
+    "topk": TopKCompressor,
+    "quantize": QuantizationCompressor,
+}
+
+######################
+# Emulated network
+######################
+
+class EmulatedNetwork:
+    def __init__(self, num_nodes, shape, neighbors, link=None, links=None, churn=None, compressor=None,
+                 clock=time.monotonic, seed=None):
+        """
+        Initializes the network. Can be used wherever a GradientBoard is expected.
+
+        Parameters:
+        - num_nodes: Number of nodes (node IDs are 0..num_nodes-1).
+        - shape: Shape of the exchanged gradients, e.g. (features, 1).
+        - neighbors: Dictionary mapping node IDs to lists of neighbor IDs; a message is sent over every listed link.
+        - link: LinkModel of every link (defaults to 50 ms latency, unlimited bandwidth, no loss).
+        - links: Optional dictionary mapping (sender, receiver) pairs to the LinkModel of that link.
+        - churn: Optional ChurnModel.
+        - compressor: Compressor applied to every published gradient (defaults to none).
+        - clock: Callable returning the current time (e.g. SimulationClock.now with the scheduler backend).
+        - seed: Seed for message drops and latency jitter.
+        """
+        self.num_nodes = num_nodes
+        self.shape = tuple(shape)
+        self.neighbors = {node: list(node_neighbors or ()) for node, node_neighbors in neighbors.items()}
+        self.link = link or LinkModel()
+        self.links = links or {}
+        self.churn = churn
+        self.compressor = compressor or Compressor()
+        self.clock = clock
+        self.random = random.Random(seed)
+
+        # Latest tensor published by each node, as on a GradientBoard (used for checkpoints)
+        self.published = GradientBoard(num_nodes, shape, clock=clock)
+        self.values = self.published.values
+        self.shared_memory = None  # Not shareable with worker processes
+
+        self.lock = threading.Lock()
+        self.busy_until = {}  # (sender, receiver) -> time at which the link has sent its queued messages
+        self.in_flight = {}  # receiver -> heap of (arrival, order, sender, version, timestamp, tensor)
+        self.delivered = {}  # receiver -> {sender: (version, timestamp, tensor)}
+        self.order = itertools.count()
+
+        # Counters, also reported to the metrics registry
+        self.bytes_sent = np.zeros(num_nodes, dtype=np.int64)
+        self.messages = {"sent": 0, "dropped": 0, "delivered": 0}
+        self.total_delay = 0.0  # Sum of the delays of delivered messages
+
+    def close(self):
+        self.published.close()
+
+    def _link(self, sender, receiver):
+        return self.links.get((sender, receiver), self.link)
+
+    def _online(self, node, timestamp):
+        return self.churn is None or self.churn.is_online(node, timestamp)
+
+    def _send(self, sender, size, kind, now):
+        # Yields (receiver, arrival) for every neighbor the message reaches. Caller holds the lock.
+        for receiver in self.neighbors.get(sender, ()):
+            link = self._link(sender, receiver)
+            self.bytes_sent[sender] += size
+            self.messages["sent"] += 1
+            METRICS.increment("network_bytes_sent_total", size, kind=kind)
+            METRICS.increment("network_messages_total", kind=kind)
+            # The link is busy while it transmits, even if the message is then lost
+            start = max(now, self.busy_until.get((sender, receiver), now))
+            transmission = size / link.bandwidth if link.bandwidth else 0.0
+            self.busy_until[(sender, receiver)] = start + transmission
+            if self.random.random() < link.drop_rate:
+                self.messages["dropped"] += 1
+                METRICS.increment("network_messages_dropped_total", kind=kind)
+                continue
+            yield receiver, start + transmission + link.latency + self.random.uniform(0.0, link.jitter)
+
+    def publish(self, node_id, tensor):
+        """
+        Publishes a node's latest gradient: compresses it and sends it to every neighbor. Nothing is sent
+        while the node is offline.
+
+        Returns:
+        - The version number of the published tensor.
+        """
+        tensor = np.asarray(tensor, dtype=np.float32)
+        version = self.published.publish(node_id, tensor)
+        now = self.clock()
+        if not self._online(node_id, now):
+            return version
+        with self.lock:
+            decoded, size = self.compressor.compress(node_id, tensor)
+            for receiver, arrival in self._send(node_id, size, "gradient", now):
+                heapq.heappush(self.in_flight.setdefault(receiver, []),
+                               (arrival, next(self.order), node_id, version, now, decoded))
+        return version
+
+    def broadcast(self, node_id, size, kind="transaction"):
+        """
+        Accounts a message of `size` bytes sent by a node to all its neighbors (e.g. a new tangle transaction).
+        Its content is not delivered.
+        """
+        now = self.clock()
+        if not self._online(node_id, now):
+            return
+        with self.lock:
+            for _ in self._send(node_id, size, kind, now):
+                pass
+
+    def _deliver(self, receiver, now):
+        # Moves the messages that have arrived at the receiver into its latest delivered gradients
+        with self.lock:
+            pending = self.in_flight.get(receiver)
+            delivered = self.delivered.setdefault(receiver, {})
+            while pending and pending[0][0] <= now:
+                arrival, _, sender, version, timestamp, tensor = heapq.heappop(pending)
+                if not self._online(receiver, arrival):
+                    self.messages["dropped"] += 1
+                    continue
+                self.messages["delivered"] += 1
+                self.total_delay += arrival - timestamp
+                latest = delivered.get(sender)
+                if latest is None or latest[0] < version:
+                    delivered[sender] = (version, timestamp, tensor)
+            return delivered
+
+    def version(self, node_id):
+        """
+        Returns the number of tensors published so far by a node.
+        """
+        return self.published.version(node_id)
+
+    def read(self, node_id, out, receiver=None):
+        """
+        Copies the latest tensor of a node delivered to `receiver` into `out`.
+
+        Returns:
+        - A tuple (version, timestamp of publication), or None if nothing from that node reached the receiver.
+          Without a receiver, the node's latest published tensor is read, as on a GradientBoard.
+        """
+        if receiver is None:
+            return self.published.read(node_id, out)
+        latest = self._deliver(receiver, self.clock()).get(node_id)
+        if latest is None:
+            return None
+        np.copyto(out, latest[2])
+        return latest[0], latest[1]
+
+    def accumulate(self, node_ids, out, scratch, max_staleness=None, receiver=None):
+        """
+        Adds the latest tensors of several nodes delivered to `receiver` into `out`, like
+        GradientBoard.accumulate. An offline receiver gets nothing.
+
+        Returns:
+        - The number of tensors added to `out`.
+        """
+        if receiver is None:
+            return self.published.accumulate(node_ids, out, scratch, max_staleness)
+        now = self.clock()
+        if not self._online(receiver, now):
+            return 0
+        delivered = self._deliver(receiver, now)
+        oldest_accepted = -np.inf if max_staleness is None else now - max_staleness
+        contributions = 0
+        for node_id in node_ids:
+            latest = delivered.get(node_id)
+            if latest is None or latest[1] < oldest_accepted:
+                continue
+            np.add(out, latest[2], out=out)
+            contributions += 1
+        return contributions
+
+    def stats(self):
+        """
+        Returns the traffic so far: bytes sent (in total and per node), messages sent, dropped and delivered,
+        and the mean delay of delivered messages in seconds.
+        """
+        with self.lock:
+            delivered = self.messages["delivered"]
+            return {"bytes_sent": int(self.bytes_sent.sum()), "bytes_sent_per_node": self.bytes_sent.tolist(),
+                    "messages_sent": self.messages["sent"], "messages_dropped": self.messages["dropped"],
+                    "messages_delivered": delivered,
+                    "mean_delay": self.total_delay / delivered if delivered else 0.0}
+
+    def get_state(self):
+        """
+        Returns the latest published tensors, as GradientBoard.get_state. Messages in flight are not saved.
+        """
+        return self.published.get_state()
+
+    def set_state(self, state):
+        """
+        Restores the latest published tensors and delivers them to every neighbor.
+        """
+        self.published.set_state(state)
+        now = self.clock()
+        with self.lock:
+            self.in_flight.clear()
+            self.delivered = {receiver: {} for receiver in self.neighbors}
+            for sender, version in enumerate(state["versions"].tolist()):
+                if not version:
+                    continue
+                timestamp = now - float(state["ages"][sender])
+                for receiver in self.neighbors.get(sender, ()):
+                    self.delivered.setdefault(receiver, {})[sender] = (version, timestamp, self.values[sender].copy())
+
+class NetworkedTangle:
+    def __init__(self, tangle, network):
+        """
+        Wraps the shared tangle so that every transaction a node records is also broadcast to its neighbors
+        over the emulated network (its JSON size is accounted). All other calls go to the tangle.
+
+        Parameters:
+        - tangle: The MockTangle.
+        - network: The EmulatedNetwork.
+        """
+        self.tangle = tangle
+        self.network = network
+
+    def __getattr__(self, name):
+        return getattr(self.tangle, name)
+
+    def add_transaction(self, data, approving_transactions):
+        transaction_hash = self.tangle.add_transaction(data, approving_transactions)
+        sender = data.get("added_by") if isinstance(data, dict) else None
+        if sender is not None:
+            message = {"hash": transaction_hash, "approving_transactions": approving_transactions, "data": data}
+            self.network.broadcast(sender, len(json.dumps(message)))
+        return transaction_hash
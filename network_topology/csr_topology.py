@@ -0,0 +1,239 @@
+import json
+import numpy as np
+
+######################
+# CSR network topology
+# The adjacency of the network is stored in compressed sparse row (CSR) form: the neighbors of the node in row i
+# are indices[indptr[i]:indptr[i + 1]], sorted. Rows are labelled by node_ids, which is 0..num_nodes-1 for
+# generated topologies and the (sorted) node IDs of the JSON file otherwise.
+#
+# All checks and derived matrices work on the whole edge arrays at once, so road networks of tens of thousands
+# of nodes load, validate and produce their mixing matrix without Python loops over the edges:
+# - symmetry: every directed edge (a, b) is looked up among the edges (b, a) with a sorted search
+# - mixing matrix: the row-stochastic matrix W used to average a node with its neighbors, either uniform
+#   (1 / (degree + 1) for the node and each neighbor, as Node.aggregate_gradients does) or Metropolis-Hastings
+#   (W_ij = 1 / (1 + max(degree_i, degree_j)) for each edge, remainder on the diagonal), which is also
+#   symmetric and therefore doubly stochastic, so repeated averaging converges to the global mean.
+######################
+
+class Topology:
+    def __init__(self, indptr, indices, node_ids=None):
+        """
+        Wraps CSR adjacency arrays.
+
+        Parameters:
+        - indptr: Row offsets, of length num_nodes + 1.
+        - indices: Neighbor rows, sorted within each row.
+        - node_ids: Node ID of each row. Defaults to the row numbers.
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.num_nodes = len(self.indptr) - 1
+        self.node_ids = np.arange(self.num_nodes) if node_ids is None else np.asarray(node_ids, dtype=np.int64)
+        self.undefined_neighbors = np.empty(0, dtype=np.int64)  # Neighbor IDs without a row of their own
+
+    @classmethod
+    def from_edges(cls, num_nodes, sources, targets, symmetric=True):
+        """
+        Builds a topology from edge arrays. Self-loops and duplicate edges are dropped.
+
+        Parameters:
+        - num_nodes: Number of nodes (rows 0..num_nodes-1).
+        - sources: Row of each edge's first endpoint.
+        - targets: Row of each edge's second endpoint.
+        - symmetric: If True, every edge is also added in the opposite direction.
+
+        Returns:
+        - A Topology.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if symmetric:
+            sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+        keep = sources != targets
+        keys = np.unique(sources[keep] * num_nodes + targets[keep])  # Sorted by source, then target
+        sources, targets = np.divmod(keys, num_nodes)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, targets)
+
+    @classmethod
+    def from_neighbors(cls, neighbors):
+        """
+        Builds a topology from a dictionary of neighbor lists (the network_topology.json layout), keeping the
+        edges exactly as listed, so asymmetric lists can be reported by check_symmetry.
+
+        Parameters:
+        - neighbors: A dictionary where keys are node IDs and values are lists of neighbor node IDs.
+
+        Returns:
+        - A Topology whose rows are the dictionary's node IDs in ascending order.
+        """
+        node_ids = np.array(sorted(neighbors), dtype=np.int64)
+        degrees = np.array([len(neighbors[node]) for node in node_ids], dtype=np.int64)
+        sources = np.repeat(np.arange(len(node_ids)), degrees)
+        targets = np.fromiter((neighbor for node in node_ids for neighbor in neighbors[node]), dtype=np.int64,
+                              count=int(degrees.sum()))
+
+        # Map neighbor IDs to rows; IDs that are not keys of the dictionary are set aside
+        rows = np.searchsorted(node_ids, targets)
+        defined = (rows < len(node_ids)) & (node_ids[np.minimum(rows, len(node_ids) - 1)] == targets) \
+            if len(node_ids) else np.zeros(len(targets), dtype=bool)
+
+        topology = cls.from_edges(len(node_ids), sources[defined], rows[defined], symmetric=False)
+        topology.node_ids = node_ids
+        topology.undefined_neighbors = np.stack([node_ids[sources[~defined]], targets[~defined]], axis=1)
+        return topology
+
+    def degrees(self):
+        """
+        Returns the number of neighbors of every row.
+        """
+        return np.diff(self.indptr)
+
+    def edges(self):
+        """
+        Returns the directed edges as a (sources, targets) tuple of row arrays.
+        """
+        return np.repeat(np.arange(self.num_nodes), self.degrees()), self.indices
+
+    def neighbors_of(self, row):
+        """
+        Returns the neighbor rows of a row.
+        """
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def to_neighbors(self):
+        """
+        Converts the topology to a dictionary of neighbor lists keyed by node ID, as used by Node.
+        """
+        node_ids = self.node_ids.tolist()
+        indices = self.node_ids[self.indices].tolist()
+        indptr = self.indptr.tolist()
+        return {node_ids[row]: indices[indptr[row]:indptr[row + 1]] for row in range(self.num_nodes)}
+
+    def check_symmetry(self):
+        """
+        Checks that every listed neighbor is defined and lists the node back.
+
+        Returns:
+        - A tuple (consistent, inconsistencies) like check_topology_consistency: a boolean and a list of messages.
+        """
+        inconsistencies = [f"Node {neighbor}, listed as a neighbor of Node {node}, is not defined in the network."
+                           for node, neighbor in self.undefined_neighbors.tolist()]
+
+        sources, targets = self.edges()
+        keys = sources * self.num_nodes + targets  # Sorted, since rows and their neighbors are
+        reverse_keys = targets * self.num_nodes + sources
+        positions = np.minimum(np.searchsorted(keys, reverse_keys), max(len(keys) - 1, 0))
+        missing = keys[positions] != reverse_keys if len(keys) else np.zeros(0, dtype=bool)
+        inconsistencies.extend(f"Inconsistency found: Node {neighbor} does not list Node {node} as a neighbor."
+                               for node, neighbor in zip(self.node_ids[sources[missing]].tolist(),
+                                                         self.node_ids[targets[missing]].tolist()))
+        return not inconsistencies, inconsistencies
+
+    def mixing_matrix(self, weights="metropolis_hastings"):
+        """
+        Builds the row-stochastic matrix averaging every node with its neighbors, including the diagonal.
+
+        Parameters:
+        - weights: "metropolis_hastings" or "uniform" (see the module comment).
+
+        Returns:
+        - A tuple (indptr, indices, values) of CSR arrays of shape [num_nodes, num_nodes], with float64 values.
+        """
+        degrees = self.degrees()
+        sources, targets = self.edges()
+        if weights == "uniform":
+            edge_values = 1.0 / (degrees[sources] + 1)
+            diagonal = 1.0 / (degrees + 1)
+        elif weights == "metropolis_hastings":
+            edge_values = 1.0 / (1 + np.maximum(degrees[sources], degrees[targets]))
+            diagonal = 1.0 - np.bincount(sources, weights=edge_values, minlength=self.num_nodes)
+        else:
+            raise ValueError(f"Unknown mixing weights '{weights}', expected 'metropolis_hastings' or 'uniform'.")
+
+        # Insert the diagonal into every row, keeping columns sorted
+        rows = np.concatenate([sources, np.arange(self.num_nodes)])
+        columns = np.concatenate([targets, np.arange(self.num_nodes)])
+        values = np.concatenate([edge_values, diagonal])
+        order = np.lexsort((columns, rows))
+        indptr = self.indptr + np.arange(self.num_nodes + 1)
+        return indptr, columns[order], values[order]
+
+    def save(self, file_path):
+        """
+        Writes the topology in the network_topology.json layout.
+        """
+        with open(file_path, 'w') as f:
+            json.dump({str(node): neighbors for node, neighbors in self.to_neighbors().items()}, f, indent=2)
+
+######################
+# Generators
+# All generators return symmetric topologies over rows 0..num_nodes-1 and build their edges as arrays.
+######################
+
+def ring(num_nodes, k=1):
+    """
+    Ring where every node is connected to its k nearest nodes on each side.
+    """
+    nodes = np.arange(num_nodes)
+    offsets = np.arange(1, k + 1)
+    return Topology.from_edges(num_nodes, np.repeat(nodes, k), (nodes[:, None] + offsets).ravel() % num_nodes)
+
+def grid(rows, columns, periodic=False):
+    """
+    Rows x columns lattice with 4-neighborhoods (e.g. a Manhattan street grid). Node r * columns + c sits at
+    row r, column c. With periodic=True, the lattice wraps around into a torus.
+    """
+    nodes = np.arange(rows * columns).reshape(rows, columns)
+    if periodic:
+        right, down = np.roll(nodes, -1, axis=1), np.roll(nodes, -1, axis=0)
+        sources = np.concatenate([nodes.ravel(), nodes.ravel()])
+        targets = np.concatenate([right.ravel(), down.ravel()])
+    else:
+        sources = np.concatenate([nodes[:, :-1].ravel(), nodes[:-1, :].ravel()])
+        targets = np.concatenate([nodes[:, 1:].ravel(), nodes[1:, :].ravel()])
+    return Topology.from_edges(rows * columns, sources, targets)
+
+def random_geometric(num_nodes, radius, seed=None, positions=None):
+    """
+    Random geometric graph: nodes are placed uniformly in the unit square (or at the given positions) and
+    connected when closer than radius, like roadside units within radio range of each other.
+
+    Parameters:
+    - num_nodes: Number of nodes.
+    - radius: Connection distance.
+    - seed: Seed for the node positions.
+    - positions: Optional [num_nodes, 2] array of node positions.
+
+    Returns:
+    - A tuple (topology, positions).
+    """
+    if positions is None:
+        positions = np.random.default_rng(seed).random((num_nodes, 2))
+    positions = np.asarray(positions, dtype=np.float64)
+
+    # Sweep along x: only nodes within radius on the x axis are candidate pairs
+    order = np.argsort(positions[:, 0], kind="stable")
+    xs = positions[order, 0]
+    upper = np.searchsorted(xs, xs + radius, side="right")
+    counts = upper - np.arange(num_nodes) - 1
+    first = np.repeat(np.arange(num_nodes), counts)
+    second = first + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    close = np.sum((positions[order[first]] - positions[order[second]]) ** 2, axis=1) <= radius ** 2
+    return Topology.from_edges(num_nodes, order[first[close]], order[second[close]]), positions
+
+def small_world(num_nodes, k=2, rewire_probability=0.1, seed=None):
+    """
+    Watts-Strogatz small-world graph: a ring with k neighbors on each side, where every edge is rewired to a
+    random node with the given probability. Rewired edges that land on the node itself or duplicate an existing
+    edge are dropped.
+    """
+    rng = np.random.default_rng(seed)
+    nodes = np.arange(num_nodes)
+    sources = np.repeat(nodes, k)
+    targets = (nodes[:, None] + np.arange(1, k + 1)).ravel() % num_nodes
+    rewired = rng.random(len(targets)) < rewire_probability
+    targets = np.where(rewired, rng.integers(0, num_nodes, len(targets)), targets)
+    return Topology.from_edges(num_nodes, sources, targets)
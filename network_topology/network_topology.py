@@ -1,5 +1,6 @@
 import json
 import sys
+from network_topology.csr_topology import Topology
 
 ######################
 # Network Topology Representation
@@ -41,25 +42,8 @@ def check_topology_consistency(neighbors):
     Returns:
     - consistency: True if the topology is consistent, False otherwise.
     """
-    consistency = True
-    inconsistencies = []  # List to hold inconsistency messages
-
-    for node, node_neighbors in neighbors.items():
-        for neighbor in node_neighbors:
-            # First, check if the neighbor is defined in the neighbors dictionary
-            if neighbor not in neighbors:
-                message = f"Node {neighbor}, listed as a neighbor of Node {node}, is not defined in the network."
-                inconsistencies.append(message)
-                consistency = False
-                continue  # Skip further checks for this undefined neighbor
-            
-            # Then, check if the current node is listed in its neighbor's list of neighbors
-            if node not in neighbors[neighbor]:
-                message = f"Inconsistency found: Node {neighbor} does not list Node {node} as a neighbor."
-                inconsistencies.append(message)
-                consistency = False
-
-    return consistency, inconsistencies
+    # Vectorized over the CSR edge arrays instead of scanning neighbor lists
+    return Topology.from_neighbors(neighbors).check_symmetry()
 
 def load_and_check_network_topology():
     # Define the path to the JSON file
@@ -1,10 +1,29 @@
 import time
 import tensorflow as tf
-import logging
 import numpy as np
+from data_source import InMemoryDataSource
+from instrumentation import METRICS, get_node_logger
+
+def generate_mock_data(rng, data_size, features):
+    """
+    Generates a synthetic linear regression dataset.
+
+    Parameters:
+    - rng: A NumPy Generator, or the np.random module to use the global random state.
+    - data_size: The number of samples to generate.
+    - features: The number of features per sample.
+
+    Returns:
+    - A tuple of features (x) and labels (y).
+    """
+    x = rng.standard_normal((data_size, features))
+    y = np.dot(x, rng.standard_normal((features, 1))) + rng.standard_normal((data_size, 1)) * 0.1
+    return x, y
 
 class Node:
-    def __init__(self, node_id, run_period, tangle, neighbors, data_size=100, features=10):
+    def __init__(self, node_id, run_period, tangle, neighbors, data_size=100, features=10, gradient_board=None, max_staleness=None,
+                 seed=None, compile_step=False, jit_compile=False, loss_record_interval=1, data_source=None,
+                 batch_size=None, state=None, asynchronous=False, staleness_decay=1.0):
         """
         Initializes a new Node instance.
 
@@ -13,32 +32,86 @@ class Node:
         - run_period: Time period between consecutive SGD updates.
         - tangle: Reference to the shared tangle object, facilitating decentralized communication.
         - neighbors: A list of neighbors' IDs for decentralized gradient aggregation.
-        - data_size: The number of data samples to generate for training.
+        - data_size: The number of data samples to generate for training (unless a data source is given).
         - features: The number of features for each data sample.
+        - gradient_board: Shared GradientBoard (or EmulatedNetwork) through which nodes exchange their latest gradients
+                          (their models in asynchronous mode).
+        - max_staleness: Maximum age (in seconds) of a neighbor's gradient to be included in the aggregation.
+        - seed: Seed for this node's data and initial weights. If None, the global NumPy/TensorFlow RNGs are used.
+        - compile_step: If True, the SGD step runs as a single tf.function graph.
+        - jit_compile: If True, the compiled step is also compiled with XLA. Only used without a gradient board or
+                       in asynchronous mode, since the gradient exchange runs as a NumPy function that XLA cannot
+                       compile.
+        - loss_record_interval: Number of compiled steps whose losses are kept on the device before being
+                                pulled to the host and recorded to the tangle in one batch.
+        - data_source: The DataSource providing the training batches (see data_source.py). If None, synthetic
+                       data is generated and served from memory.
+        - batch_size: Mini-batch size for the generated data, or None to train on all of it every step.
+        - state: State saved by get_state (e.g. from a checkpoint) to resume from, instead of starting from
+                 random weights.
+        - asynchronous: If True, the node takes a local SGD step with its own gradient, then publishes its model
+                        and averages it with whichever neighbor model versions are available (see
+                        mix_with_neighbors), instead of averaging gradients. All nodes sharing a board must use
+                        the same mode. Models are published uncompressed, so an EmulatedNetwork board must not use
+                        a lossy compressor in this mode.
+        - staleness_decay: In asynchronous mode, a neighbor model published `age` seconds ago is weighted
+                           1 / (1 + staleness_decay * age / run_period) against the node's own model (weight 1).
+                           0 weights all available models equally.
         """
         self.node_id = node_id
         self.tangle = tangle
         self.run_period = run_period
         self.neighbors = neighbors
+        self.seed = seed
+        self.rng = np.random.default_rng(seed) if seed is not None else np.random
 
-        # Generating synthetic training data
-        x, y = self.generate_mock_data(data_size, features)
-        self.x = tf.convert_to_tensor(x, dtype=tf.float32)
-        self.y = tf.convert_to_tensor(y, dtype=tf.float32)
+        # Training batches come from the data source; without one, synthetic training data is generated
+        if data_source is None:
+            x, y = self.generate_mock_data(data_size, features)
+            data_source = InMemoryDataSource(x, y, batch_size=batch_size, seed=seed)
+        self.data_source = data_source
 
         # Model initialization with random weights
-        self.model = tf.Variable(tf.random.normal([features, 1]))
+        if seed is None:
+            self.model = tf.Variable(tf.random.normal([features, 1]))
+        else:
+            self.model = tf.Variable(self.rng.standard_normal((features, 1)), dtype=tf.float32)
+
+        # Gradient exchange: buffers are allocated once and reused on every step
+        self.gradient_board = gradient_board
+        self.max_staleness = max_staleness
+        self.aggregation_buffer = np.zeros((features, 1), dtype=np.float32)
+        self.read_buffer = np.zeros((features, 1), dtype=np.float32)
+
+        # Asynchronous mode: model versions published so far, and the latest version and age of each neighbor's model
+        self.asynchronous = asynchronous
+        self.staleness_decay = staleness_decay
+        self.model_version = 0
+        self.neighbor_versions = {}  # neighbor -> (version, age in seconds) of the models mixed in by the last step
+
+        # Compiled training step: losses are written into an on-device buffer and pulled to the host in batches
+        self.compiled_update = None
+        if compile_step:
+            self.loss_record_interval = max(1, loss_record_interval)
+            self.loss_buffer = tf.Variable(tf.zeros([self.loss_record_interval]), trainable=False)
+            self.pending_losses = 0
+            input_signature = [tf.TensorSpec([None, features], tf.float32), tf.TensorSpec([None, 1], tf.float32),
+                               tf.TensorSpec([], tf.float32), tf.TensorSpec([], tf.int32)]
+            self.compiled_update = tf.function(self.train_step, input_signature=input_signature,
+                                               jit_compile=jit_compile and (gradient_board is None or asynchronous))
 
         # Setting up node-specific logging
         self.setup_logging()
 
+        if state is not None:
+            self.set_state(state)
+
     def setup_logging(self):
-        """Configures logging for the node, including console and file handlers."""
-        self.logger = logging.getLogger(f"Node {self.node_id}")
-        self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(logging.StreamHandler())
-        file_handler = logging.FileHandler(f"logs/node_{self.node_id}.log")
-        self.logger.addHandler(file_handler)
+        """
+        Configures logging for the node. Records go to the console and to logs/node_<id>.log through the
+        asynchronous logging listener, so logging never blocks the training thread on I/O.
+        """
+        self.logger = get_node_logger(self.node_id)
 
     def decentralized_sgd_update(self, learning_rate=0.01):
         """
@@ -48,27 +121,122 @@ class Node:
         - learning_rate: The learning rate for the SGD update.
 
         Returns:
-        - The current loss after the update.
+        - The current loss after the update. With a compiled step, the latest loss once a batch of losses has been
+          recorded to the tangle, and None for the steps in between.
         """
+        if self.compiled_update is not None:
+            return self.compiled_sgd_update(learning_rate)
+
+        loss, gradients = self.compute_loss_and_gradients()
+        return self.apply_gradients(loss, gradients, learning_rate)
+
+    def compute_loss_and_gradients(self):
+        """
+        Computes the loss on the node's next batch and its gradients with respect to the model.
+
+        Returns:
+        - A tuple (loss, gradients) of tensors.
+        """
+        x, y = self.data_source.next_batch()
         with tf.GradientTape() as tape:
-            predicted = tf.matmul(self.x, self.model)
-            loss = tf.reduce_mean((predicted - self.y) ** 2)
+            predicted = tf.matmul(x, self.model)
+            loss = tf.reduce_mean((predicted - y) ** 2)
 
         gradients = tape.gradient(loss, self.model)
+        return loss, gradients
+
+    def apply_gradients(self, loss, gradients, learning_rate=0.01):
+        """
+        Aggregates the gradients with the neighbors', updates the model and records the loss.
+
+        Parameters:
+        - loss: The loss computed before the update.
+        - gradients: The gradients computed from the node's own data.
+        - learning_rate: The learning rate for the SGD update.
 
+        Returns:
+        - The loss as a NumPy value.
+        """
         averaged_gradients = self.aggregate_gradients(gradients)
 
         # Update the model parameters
         self.model.assign_sub(learning_rate * averaged_gradients)
+        if self.asynchronous:
+            self.mix_with_neighbors()
         
         current_loss = loss.numpy()
         self.record_loss_to_tangle(current_loss)
 
         return current_loss
 
+    def train_step(self, x, y, learning_rate, loss_slot):
+        """
+        Forward pass, gradient, aggregation and update of one SGD step, traced into a single graph.
+
+        Parameters:
+        - x: The training features.
+        - y: The training labels.
+        - learning_rate: The learning rate for the SGD update.
+        - loss_slot: Index of the loss buffer entry receiving this step's loss.
+
+        Returns:
+        - The loss computed before the update (left on the device).
+        """
+        with tf.GradientTape() as tape:
+            predicted = tf.matmul(x, self.model)
+            loss = tf.reduce_mean((predicted - y) ** 2)
+
+        gradients = tape.gradient(loss, self.model)
+
+        if self.gradient_board is not None and not self.asynchronous:
+            averaged_gradients = tf.numpy_function(self.average_with_neighbors, [gradients], tf.float32, stateful=True)
+            averaged_gradients = tf.ensure_shape(averaged_gradients, self.model.shape)
+        else:
+            averaged_gradients = gradients
+
+        self.model.assign_sub(learning_rate * averaged_gradients)
+        self.loss_buffer[loss_slot].assign(loss)
+        return loss
+
+    def compiled_sgd_update(self, learning_rate=0.01):
+        """
+        Runs the compiled SGD step and records the buffered losses once the buffer is full.
+
+        Parameters:
+        - learning_rate: The learning rate for the SGD update.
+
+        Returns:
+        - The latest loss if the buffered losses were recorded on this step, None otherwise.
+        """
+        x, y = self.data_source.next_batch()
+        self.compiled_update(x, y, learning_rate, self.pending_losses)
+        if self.asynchronous:
+            self.mix_with_neighbors()
+        self.pending_losses += 1
+        if self.pending_losses < self.loss_record_interval:
+            return None
+        return self.flush_losses()
+
+    def flush_losses(self):
+        """
+        Pulls the buffered losses of the compiled step to the host and records them to the tangle.
+
+        Returns:
+        - The latest recorded loss, or None if no loss was pending.
+        """
+        if self.compiled_update is None or self.pending_losses == 0:
+            return None
+        # One device-to-host transfer for the whole batch
+        losses = self.loss_buffer.numpy()[:self.pending_losses]
+        self.pending_losses = 0
+        for loss in losses:
+            self.record_loss_to_tangle(loss)
+        return losses[-1]
+
     def aggregate_gradients(self, gradients):
         """
-        Aggregates gradients from the node and its neighbors.
+        Aggregates gradients from the node and its neighbors' latest gradients published on the gradient board.
+        Neighbors that have not published yet, or whose gradient exceeds the staleness bound, are left out.
 
         Parameters:
         - gradients: The gradients computed from the node's own data.
@@ -76,28 +244,91 @@ class Node:
         Returns:
         - The averaged gradients after aggregation.
         """
-        if self.neighbors and len(self.neighbors) > 0:
-            aggregated_gradients = gradients
-            for neighbor_id in self.neighbors:
-                # Simulate fetching gradients from the neighbor
-                neighbor_gradients = gradients  # Placeholder for actual neighbor's gradients
-                aggregated_gradients += neighbor_gradients
+        if self.gradient_board is None or self.asynchronous:
+            return gradients
 
-            averaged_gradients = aggregated_gradients / (len(self.neighbors) + 1)
-        else:
-            averaged_gradients = gradients
+        averaged_gradients = tf.convert_to_tensor(self.average_with_neighbors(gradients))
 
         return averaged_gradients
 
+    def average_with_neighbors(self, gradients):
+        """
+        Publishes the node's gradients to the gradient board and averages them with the neighbors' latest ones.
+
+        Parameters:
+        - gradients: The gradients computed from the node's own data (array-like).
+
+        Returns:
+        - The averaged gradients, as a NumPy array that is reused by the next call.
+        """
+        # Make the local gradient visible to the neighbors, then average it with their latest ones
+        start_time = time.perf_counter()
+        self.gradient_board.publish(self.node_id, gradients)
+        np.copyto(self.aggregation_buffer, gradients)
+        if self.neighbors:
+            contributions = 1 + self.gradient_board.accumulate(self.neighbors, self.aggregation_buffer,
+                                                               self.read_buffer, self.max_staleness,
+                                                               receiver=self.node_id)
+            self.aggregation_buffer /= contributions
+        METRICS.observe("gradient_aggregation_seconds", time.perf_counter() - start_time)
+        return self.aggregation_buffer
+
+    def mix_with_neighbors(self):
+        """
+        Asynchronous mode: publishes the node's model and replaces it with the staleness-weighted average of itself
+        and the latest available models of its neighbors. Neighbors that have not published yet, or whose model
+        exceeds the staleness bound, are left out; nobody is waited for.
+
+        Returns:
+        - The total weight of the neighbor models mixed in.
+        """
+        if self.gradient_board is None:
+            return 0.0
+        start_time = time.perf_counter()
+        model = self.model.numpy()
+        self.model_version = self.gradient_board.publish(self.node_id, model)
+        np.copyto(self.aggregation_buffer, model)
+        now = self.gradient_board.clock()
+        period = self.run_period or 1.0
+        neighbor_weight = 0.0
+        mixed_versions = {}
+        for neighbor in self.neighbors or ():
+            published = self.gradient_board.read(neighbor, self.read_buffer, receiver=self.node_id)
+            if published is None:
+                continue
+            version, timestamp = published
+            age = max(0.0, now - timestamp)
+            if self.max_staleness is not None and age > self.max_staleness:
+                continue
+            weight = 1.0 / (1.0 + self.staleness_decay * age / period)
+            self.aggregation_buffer += weight * self.read_buffer
+            neighbor_weight += weight
+            mixed_versions[neighbor] = (version, age)
+        self.neighbor_versions = mixed_versions
+        if neighbor_weight:
+            self.aggregation_buffer /= 1.0 + neighbor_weight
+            self.model.assign(self.aggregation_buffer)
+        METRICS.observe("model_mixing_seconds", time.perf_counter() - start_time)
+        return neighbor_weight
+
     def record_loss_to_tangle(self, current_loss):
         """
-        Records the current loss to the tangle and selects transactions for approval.
+        Records the current loss to the tangle and selects transactions for approval. In asynchronous mode, the
+        transaction also records the node's model version and the version and age (staleness, in seconds) of
+        each neighbor's model last mixed in.
 
         Parameters:
         - current_loss: The loss value to be recorded.
         """
         approving_transactions = self.tangle.get_transactions_for_approval(self.node_id, self.neighbors)
         message = {"loss": float(current_loss), "message": "Normal Loss", "added_by": self.node_id}
+        if self.asynchronous:
+            # JSON object keys are strings
+            message["model_version"] = self.model_version
+            message["neighbor_versions"] = {str(neighbor): version
+                                            for neighbor, (version, _) in self.neighbor_versions.items()}
+            message["neighbor_staleness"] = {str(neighbor): round(age, 6)
+                                             for neighbor, (_, age) in self.neighbor_versions.items()}
         self.tangle.add_transaction(message, approving_transactions)
 
     def decentralized_sgd_update_gpu_switch(self, use_gpu):
@@ -111,14 +342,55 @@ class Node:
         - Result code: 0 for success, 1 for failure.
         """
         device = "GPU" if use_gpu else "CPU"
+        start_time = time.perf_counter()
         try:
             loss = self.decentralized_sgd_update()
-            self.logger.info(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())} - On {device} {self.node_id}, SGD update complete with loss: {loss}")
+            METRICS.observe("sgd_step_seconds", time.perf_counter() - start_time)
+            METRICS.increment("sgd_steps_total")
+            if loss is None:
+                # Compiled step whose loss is still buffered on the device
+                return 0
+            # The message is formatted by the logging listener thread (see DeferredFormattingQueueHandler)
+            self.logger.info("On %s %s, SGD update complete with loss: %s", device, self.node_id, loss)
             return 0
         except Exception as e:
-            self.logger.error(f"Error during {device} {self.node_id} computation", exc_info=e)
+            METRICS.increment("sgd_step_errors_total")
+            self.logger.error("Error during %s %s computation", device, self.node_id, exc_info=e)
             return 1
 
+    def get_state(self):
+        """
+        Captures the node's training state for a checkpoint. Can be called from another thread while the node
+        runs; the model is read as a whole, between two updates.
+
+        Returns:
+        - A dictionary of NumPy arrays and JSON-serializable values: the model, the data source's position,
+          the RNG state of seeded nodes and, with a compiled step, the losses still buffered on the device.
+        """
+        state = {"model": self.model.numpy(), "data": self.data_source.get_state()}
+        if self.seed is not None:
+            state["rng"] = self.rng.bit_generator.state
+        if self.asynchronous:
+            state["model_version"] = self.model_version
+        if self.compiled_update is not None:
+            state["pending_losses"] = self.pending_losses
+            state["loss_buffer"] = self.loss_buffer.numpy()
+        return state
+
+    def set_state(self, state):
+        """
+        Resumes from a state returned by get_state.
+        """
+        self.model.assign(state["model"])
+        self.data_source.set_state(state["data"])
+        self.model_version = int(state.get("model_version", 0))
+        if "rng" in state and self.seed is not None:
+            self.rng.bit_generator.state = state["rng"]
+        if "loss_buffer" in state and self.compiled_update is not None \
+           and len(state["loss_buffer"]) == self.loss_record_interval:
+            self.loss_buffer.assign(state["loss_buffer"])
+            self.pending_losses = int(state["pending_losses"])
+
     def generate_mock_data(self, data_size, features):
         """
         Generates synthetic data for training.
@@ -130,20 +402,26 @@ class Node:
         Returns:
         - A tuple of features (x) and labels (y).
         """
-        x = np.random.randn(data_size, features)
-        y = np.dot(x, np.random.randn(features, 1)) + np.random.randn(data_size, 1) * 0.1
-        return x, y
+        return generate_mock_data(self.rng, data_size, features)
 
-    def run(self, use_gpu):
+    def run(self, use_gpu, max_steps=None, stop_event=None):
         """
         Main loop to perform SGD updates at a specified interval.
 
         Parameters:
         - use_gpu: Flag to enable GPU computation.
+        - max_steps: Number of SGD updates to perform before returning, or None to run indefinitely.
+        - stop_event: Optional threading.Event; setting it ends the loop without waiting for the period to elapse.
         """
-        while True:
+        steps = 0
+        while max_steps is None or steps < max_steps:
             result = self.decentralized_sgd_update_gpu_switch(use_gpu)
             if result is not None:
                 # Placeholder for additional processing based on update result
                 pass
-            time.sleep(self.run_period)
+            steps += 1
+            if stop_event is None:
+                time.sleep(self.run_period)
+            elif stop_event.wait(self.run_period):
+                break
+        self.flush_losses()
@@ -0,0 +1,171 @@
+import heapq
+import random
+import threading
+import time
+
+######################
+# Event-driven scheduler
+# A discrete-event loop drives all nodes from a single thread. Every node has a next activation time on a
+# simulation clock; the scheduler repeatedly pops the earliest activation, advances the clock to it, runs one
+# SGD update of that node and schedules its next activation one run period (plus optional jitter) later.
+#
+# In virtual time the clock jumps straight to the next event, so a day of harmonization runs as fast as the
+# updates can be computed. In real time the scheduler waits for the wall clock to catch up (optionally
+# scaled), which reproduces the behaviour of the per-thread sleep loops.
+######################
+
+class SimulationClock:
+    def __init__(self, start=0.0):
+        """
+        Initializes a clock whose time only moves when the scheduler advances it.
+
+        Parameters:
+        - start: The initial simulation time in seconds.
+        """
+        self.time = start
+
+    def now(self):
+        """
+        Returns the current simulation time in seconds. Can be passed wherever a clock callable is expected
+        (e.g. GradientBoard(clock=clock.now)).
+        """
+        return self.time
+
+    def advance_to(self, timestamp):
+        """
+        Moves the clock forward to the given time. The clock never moves backwards.
+        """
+        self.time = max(self.time, timestamp)
+
+class Scheduler:
+    def __init__(self, nodes, use_gpu=False, clock=None, virtual_time=True, time_scale=1.0, jitter=0.0, seed=None,
+                 max_steps=None, until=None, stop_condition=None):
+        """
+        Initializes the scheduler for a set of nodes.
+
+        Parameters:
+        - nodes: The Node objects to drive. Each node is activated every `node.run_period` seconds.
+        - use_gpu: Flag passed to the nodes' SGD updates.
+        - clock: The SimulationClock to advance. A new one starting at 0 is created if None.
+        - virtual_time: If True, run as fast as possible; otherwise keep pace with the wall clock.
+        - time_scale: Simulation seconds per wall-clock second in real-time mode (e.g. 60 runs a minute per second).
+        - jitter: Relative random variation of each period, e.g. 0.1 for +/-10%.
+        - seed: Seed for the jitter and for the random phase offsets of the first activations.
+        - max_steps: Number of SGD updates per node after which the node is no longer scheduled, or None.
+        - until: Simulation time after which the run stops, or None.
+        - stop_condition: Optional callable taking the scheduler and returning True when the run should stop.
+        """
+        self.nodes = list(nodes)
+        self.use_gpu = use_gpu
+        self.clock = clock if clock is not None else SimulationClock()
+        self.virtual_time = virtual_time
+        self.time_scale = time_scale
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.max_steps = max_steps
+        self.until = until
+        self.stop_condition = stop_condition
+
+        self.steps = [0] * len(self.nodes)  # SGD updates performed by each node
+        self.total_steps = 0
+        self.stop_event = threading.Event()
+        self.running = threading.Event()  # Cleared while paused
+        self.running.set()
+
+    def now(self):
+        """
+        Returns the current simulation time.
+        """
+        return self.clock.now()
+
+    def next_period(self, node):
+        """
+        Returns the delay until a node's next activation.
+        """
+        period = node.run_period
+        if self.jitter:
+            period *= 1.0 + self.random.uniform(-self.jitter, self.jitter)
+        return max(period, 0.0)
+
+    def run(self):
+        """
+        Runs the event loop until the step budget, the time horizon or the stop condition is reached,
+        or until stop() is called.
+
+        Returns:
+        - The total number of SGD updates performed.
+        """
+        start_time = self.clock.now()
+        wall_start = time.monotonic()
+
+        # Nodes start at a random phase within their first period so they do not all fire at once when jittered
+        events = []
+        for index, node in enumerate(self.nodes):
+            offset = self.random.uniform(0, node.run_period * self.jitter) if self.jitter else 0.0
+            events.append((start_time + offset, index))
+        heapq.heapify(events)
+
+        try:
+            while events and not self.stop_event.is_set():
+                timestamp, index = heapq.heappop(events)
+                if self.until is not None and timestamp > self.until:
+                    break
+                if not self.wait_until(timestamp, start_time, wall_start):
+                    break
+                self.clock.advance_to(timestamp)
+
+                node = self.nodes[index]
+                node.decentralized_sgd_update_gpu_switch(self.use_gpu)
+                self.steps[index] += 1
+                self.total_steps += 1
+
+                if self.stop_condition is not None and self.stop_condition(self):
+                    break
+                if self.max_steps is None or self.steps[index] < self.max_steps:
+                    heapq.heappush(events, (timestamp + self.next_period(node), index))
+        finally:
+            self.shutdown()
+        return self.total_steps
+
+    def wait_until(self, timestamp, start_time, wall_start):
+        """
+        Blocks while paused and, in real-time mode, until the wall clock reaches the event time.
+
+        Returns:
+        - False if the scheduler was stopped while waiting, True otherwise.
+        """
+        while not self.running.is_set():
+            if self.stop_event.is_set():
+                return False
+            self.running.wait(0.1)
+        if not self.virtual_time:
+            delay = wall_start + (timestamp - start_time) / self.time_scale - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                return False
+        return not self.stop_event.is_set()
+
+    def shutdown(self):
+        """
+        Records losses that compiled nodes still hold on the device.
+        """
+        for node in self.nodes:
+            node.flush_losses()
+
+    def stop(self):
+        """
+        Asks the event loop to stop after the update in progress. Safe to call from any thread.
+        """
+        self.stop_event.set()
+        self.running.set()
+
+    def pause(self):
+        """
+        Suspends the event loop before the next update. Safe to call from any thread.
+        """
+        self.running.clear()
+
+    def resume(self):
+        """
+        Resumes a paused event loop. Safe to call from any thread.
+        """
+        self.running.set()
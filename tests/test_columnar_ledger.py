@@ -0,0 +1,66 @@
+import json
+import pytest
+from columnar_ledger import MAX_MESSAGES, ColumnarLedger, columnar_to_json, write_columnar_ledger
+from mocktangle import MockTangle
+
+def transaction(sequence, data, approved=("genesis",)):
+    return {"hash": f"tx_{sequence}", "approving_transactions": list(approved), "data": data}
+
+TRANSACTIONS = [
+    {"hash": "genesis", "approving_transactions": [], "data": {"message": "Genesis transaction"}},
+    transaction(1, {"loss": 0.5, "message": "Normal Loss", "added_by": 0}),
+    transaction(2, {"loss": 3, "message": "Normal Loss", "added_by": 1}),  # Integer loss
+    transaction(3, {"loss": True, "added_by": 1}),
+    transaction(4, {"loss": 0.25, "added_by": 2 ** 40}),  # Beyond int32
+    transaction(5, {"loss": 0.75, "added_by": -3}),  # Negative node ID (-1 is the column's missing marker)
+    transaction(6, {"loss": 1.5, "added_by": "gateway"}),  # Node ID that is not an int
+    transaction(7, {"loss": 2.5, "added_by": None, "message": None}),
+    transaction(8, "plain data"),
+    transaction(9, {"loss": 0.125, "added_by": 0, "note": "extra key"}),
+    transaction(10, {"loss": 0.5, "message": "Normal Loss", "added_by": 0, "model_version": 3,
+                     "neighbor_versions": {"4": 2, "1": 3}, "neighbor_staleness": {"4": 2.5, "1": 0.0}}),
+    transaction(11, {"loss": 0.5, "added_by": 1, "model_version": 1, "neighbor_versions": {},
+                     "neighbor_staleness": {}}),
+    transaction(12, {"loss": 0.5, "added_by": 1, "model_version": 2}),  # Incomplete version metadata
+    transaction(13, {"loss": 0.5, "added_by": 1, "model_version": 2, "neighbor_versions": {"01": 1},
+                     "neighbor_staleness": {"01": 1.0}}),  # Neighbor key that is not a canonical int
+]
+
+def test_round_trip_is_exact(tmp_path):
+    write_columnar_ledger(TRANSACTIONS, str(tmp_path / "ledger.columns"))
+    rebuilt = list(ColumnarLedger(str(tmp_path / "ledger.columns")).iter_transactions())
+
+    assert rebuilt == TRANSACTIONS
+    assert [type(t["data"].get("loss")) for t in rebuilt[1:4]] == [float, int, bool]
+    assert sorted(ColumnarLedger(str(tmp_path / "ledger.columns")).extras) == [2, 3, 4, 5, 6, 7, 8, 9, 12, 13]
+    columnar_to_json(str(tmp_path / "ledger.columns"), str(tmp_path / "ledger.json"))
+    with open(tmp_path / "ledger.json") as file:
+        assert json.load(file)["transactions"] == TRANSACTIONS
+
+def test_message_table_overflow_keeps_messages(tmp_path):
+    transactions = [transaction(sequence, {"message": f"message {sequence}", "added_by": 0})
+                    for sequence in range(1, MAX_MESSAGES + 3)]
+    write_columnar_ledger(transactions, str(tmp_path / "ledger.columns"))
+    ledger = ColumnarLedger(str(tmp_path / "ledger.columns"))
+
+    assert len(ledger.messages) == MAX_MESSAGES
+    assert len(ledger.extras) == 2
+    assert list(ledger.iter_transactions(MAX_MESSAGES - 2)) == transactions[MAX_MESSAGES - 2:]
+
+def test_indexes_match_the_json_ledger(tmp_path):
+    transactions = [t for t in TRANSACTIONS if isinstance(t["data"], dict)]  # The tangle only indexes dict data
+    with open(tmp_path / "ledger.json", "w") as file:
+        json.dump({"transactions": transactions}, file)
+    write_columnar_ledger(transactions, str(tmp_path / "ledger.columns"))
+    from_json = MockTangle(str(tmp_path / "ledger.json"), group_commit=False)
+    from_columns = MockTangle(str(tmp_path / "ledger.columns"), group_commit=False)
+    try:
+        for node in (0, 1, 2 ** 40, -3, "gateway", None):
+            # Columnar indexing computes the statistics with vectorized operations, up to rounding
+            assert from_columns.loss_statistics.get(node) == pytest.approx(from_json.loss_statistics.get(node))
+            assert from_columns.get_recent_losses(node) == from_json.get_recent_losses(node)
+        assert list(from_columns.tips) == list(from_json.tips)
+        assert from_columns.recent_by_node == from_json.recent_by_node
+    finally:
+        from_json.close()
+        from_columns.close()
@@ -0,0 +1,28 @@
+from mocktangle import MockTangle, create_loss_fluctuation_contract
+
+def alerts(tangle):
+    return [transaction["data"]["loss"] for transaction in tangle.get_view()
+            if transaction["data"].get("message") == "Abnormal Loss"]
+
+def build_tangle(tmp_path):
+    tangle = MockTangle(str(tmp_path / "ledger.json"), group_commit=False, threaded_contracts=False)
+    tangle.add_smart_contract(create_loss_fluctuation_contract(tangle))
+    return tangle
+
+def test_steady_loss_does_not_emit(tmp_path):
+    tangle = build_tangle(tmp_path)
+    try:
+        for step in range(20):
+            tangle.add_transaction({"added_by": 0, "loss": 1.0 + 0.001 * (step % 3)}, ["genesis"])
+        assert alerts(tangle) == []
+    finally:
+        tangle.close()
+
+def test_jump_emits_once(tmp_path):
+    tangle = build_tangle(tmp_path)
+    try:
+        for loss in [1.0, 1.01, 1.02, 5.0, 5.01]:
+            tangle.add_transaction({"added_by": 0, "loss": loss}, ["genesis"])
+        assert alerts(tangle) == [5.0]
+    finally:
+        tangle.close()
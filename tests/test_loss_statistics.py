@@ -0,0 +1,33 @@
+import pytest
+from loss_statistics import LossStatistics
+
+def updated(statistics, node, values):
+    for value in values:
+        statistics.update(node, value)
+    return statistics
+
+@pytest.mark.parametrize("added", [3, 5, 7, 12])
+def test_seed_then_extend_matches_seed_then_update(added):
+    values = [float(v) for v in range(added)]
+    extended, stepped = LossStatistics(window=5), LossStatistics(window=5)
+    for statistics in (extended, stepped):
+        statistics.seed(0, count=47, last=46.0, previous=45.0, ewma=40.0, minimum=0.0, maximum=46.0)
+    extended.extend(0, values)
+    updated(stepped, 0, values)
+
+    assert extended.recent(0) == stepped.recent(0) == values[-5:]
+    assert extended.get(0) == pytest.approx(stepped.get(0))
+
+def test_extend_in_pieces_matches_update():
+    values = [float(v * v % 11) for v in range(23)]
+    extended = LossStatistics(window=8)
+    for start in range(0, len(values), 6):
+        extended.extend(1, values[start:start + 6])
+    stepped = updated(LossStatistics(window=8), 1, values)
+
+    assert extended.recent(1) == stepped.recent(1) == values[-8:]
+    assert extended.get(1) == pytest.approx(stepped.get(1))
+    # Later updates keep the two in step
+    extended.update(1, 99.0)
+    stepped.update(1, 99.0)
+    assert extended.recent(1) == stepped.recent(1)
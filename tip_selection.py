@@ -0,0 +1,207 @@
+import math
+import random
+from array import array
+from collections import deque
+import numpy as np
+
+######################
+# Weighted random walk tip selection
+# Tips are selected the way an IOTA node does: a walker enters the tangle some distance behind its newest
+# transactions and repeatedly steps to one of the transactions approving the current one, until it reaches a tip
+# (a transaction nobody approves yet). The step from x to an approver y is taken with probability proportional to
+# exp(-alpha * (W(x) - W(y))), where W is the cumulative weight (1 + number of transactions that directly or
+# indirectly approve it). alpha = 0 gives an unweighted random walk; larger values favour the heaviest branch
+# and leave lazy tips (that approve old transactions) behind.
+#
+# Cumulative weights are maintained incrementally: a new transaction adds 1 to each of its ancestors, found by
+# walking its approvals backwards. The walk stops at ancestors older than `weight_horizon` transactions, whose
+# weights are frozen. Walks enter the tangle at most `walk_depth` transactions behind the newest one, inside the
+# horizon, so every weight they compare is exact and neither adding a transaction nor selecting a tip depends on
+# the size of the ledger.
+#
+# Transactions are identified internally by their sequence (order of addition), and all per-transaction state
+# lives in lists indexed by sequence - offset, where offset is the number of transactions dropped by prune().
+######################
+
+class WeightedRandomWalk:
+    def __init__(self, alpha=0.1, walk_depth=50, weight_horizon=200, seed=None):
+        """
+        Initializes an empty tip selector.
+
+        Parameters:
+        - alpha: Bias of the walk towards heavier approvers (0 for an unweighted random walk).
+        - walk_depth: Walks enter the tangle between walk_depth and 2 * walk_depth transactions behind the newest.
+        - weight_horizon: Number of most recent transactions whose cumulative weights are kept up to date.
+                          Raised to at least 2 * walk_depth.
+        - seed: Seed for the walks' random choices.
+        """
+        self.alpha = alpha
+        self.walk_depth = max(1, walk_depth)
+        self.weight_horizon = max(weight_horizon, 2 * self.walk_depth)
+        self.random = random.Random(seed)
+
+        self.sequence_by_hash = {}
+        self.offset = 0  # Sequence of the oldest transaction still held
+        self.hashes = []  # sequence -> hash
+        self.approved = []  # sequence -> sequences of the transactions it approves
+        self.approvers = []  # sequence -> sequences of the transactions approving it
+        self.weights = array('q')  # sequence -> cumulative weight
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, transaction_hash, approving_transactions):
+        """
+        Adds a transaction and updates the cumulative weights of its ancestors within the weight horizon.
+        Not thread-safe: MockTangle calls it under its append lock.
+
+        Parameters:
+        - transaction_hash: The hash of the new transaction.
+        - approving_transactions: Hashes of the transactions it approves. Unknown hashes are ignored.
+        """
+        sequence = self.offset + len(self.hashes)
+        approved = tuple({self.sequence_by_hash[h] for h in approving_transactions if h in self.sequence_by_hash})
+        self.sequence_by_hash[transaction_hash] = sequence
+        self.hashes.append(transaction_hash)
+        self.approved.append(approved)
+        self.approvers.append([])
+        self.weights.append(1)
+        for parent in approved:
+            self.approvers[parent - self.offset].append(sequence)
+
+        # Breadth-first over the ancestors; each one gains exactly one (indirect) approver
+        oldest = max(sequence - self.weight_horizon, self.offset)
+        visited = set(approved)
+        pending = deque(parent for parent in approved if parent >= oldest)
+        while pending:
+            ancestor = pending.popleft() - self.offset
+            self.weights[ancestor] += 1
+            for parent in self.approved[ancestor]:
+                if parent >= oldest and parent not in visited:
+                    visited.add(parent)
+                    pending.append(parent)
+
+    def get_weight(self, transaction_hash):
+        """
+        Returns the cumulative weight of a transaction, or None if it is unknown. Weights of transactions older
+        than the weight horizon stopped growing when they left it.
+        """
+        sequence = self.sequence_by_hash.get(transaction_hash)
+        return self.weights[sequence - self.offset] if sequence is not None else None
+
+    def select_tips(self, count=2):
+        """
+        Selects tips to approve with independent weighted random walks.
+
+        Parameters:
+        - count: Number of walks (tips may repeat when the tangle has few of them).
+
+        Returns:
+        - A list of tip hashes, or an empty list if the tangle is empty.
+        """
+        if not self.hashes:
+            return []
+        return [self.hashes[self._walk() - self.offset] for _ in range(count)]
+
+    def confirmation_confidence(self, transaction_hash, samples=100):
+        """
+        Estimates how confirmed a transaction is: the fraction of tips selected by random walks that
+        directly or indirectly approve it.
+
+        Parameters:
+        - transaction_hash: The hash of the transaction.
+        - samples: Number of random walks.
+
+        Returns:
+        - A confidence between 0.0 and 1.0, or None if the transaction is unknown or was pruned. Transactions
+          older than the weight horizon are reported as 1.0 if they have been approved at all, 0.0 otherwise.
+        """
+        sequence = self.sequence_by_hash.get(transaction_hash)
+        if sequence is None:
+            return None
+        if sequence < self.offset + len(self.hashes) - self.weight_horizon:
+            return 1.0 if self.approvers[sequence - self.offset] else 0.0
+
+        # Every transaction approving this one, found by walking forward from it (bounded by the horizon)
+        descendants = {sequence}
+        pending = deque([sequence])
+        while pending:
+            for approver in self.approvers[pending.popleft() - self.offset]:
+                if approver not in descendants:
+                    descendants.add(approver)
+                    pending.append(approver)
+        return sum(self._walk() in descendants for _ in range(samples)) / samples
+
+    def prune(self, count):
+        """
+        Drops the oldest transactions. Transactions within the weight horizon are always kept.
+
+        Parameters:
+        - count: Number of oldest transactions to drop.
+
+        Returns:
+        - The number of transactions dropped.
+        """
+        count = max(0, min(count, len(self.hashes) - self.weight_horizon))
+        if not count:
+            return 0
+        for transaction_hash in self.hashes[:count]:
+            del self.sequence_by_hash[transaction_hash]
+        del self.hashes[:count]
+        del self.approved[:count]
+        del self.approvers[:count]
+        del self.weights[:count]
+        self.offset += count
+        return count
+
+    def get_state(self):
+        """
+        Returns a copy of the selector for checkpoints: hashes, approvals (in CSR form), weights and the walks'
+        random state. Not thread-safe: MockTangle calls it under its append lock.
+        """
+        return {
+            "offset": self.offset,
+            "hashes": np.array(self.hashes, dtype=str),
+            "approved_offsets": np.cumsum([0] + [len(approved) for approved in self.approved], dtype=np.int64),
+            "approved": np.fromiter((parent for approved in self.approved for parent in approved), dtype=np.int64),
+            "weights": np.array(self.weights, dtype=np.int64),
+            "random": self.random.getstate(),
+        }
+
+    def set_state(self, state):
+        """
+        Replaces the selector's transactions with a state returned by get_state. Approvers are rebuilt from
+        the approvals.
+        """
+        self.offset = int(state["offset"])
+        self.hashes = state["hashes"].tolist()
+        self.sequence_by_hash = {transaction_hash: self.offset + index
+                                 for index, transaction_hash in enumerate(self.hashes)}
+        offsets = state["approved_offsets"].tolist()
+        approved = state["approved"].tolist()
+        self.approved = [tuple(approved[offsets[index]:offsets[index + 1]]) for index in range(len(self.hashes))]
+        self.approvers = [[] for _ in self.hashes]
+        for index, parents in enumerate(self.approved):
+            for parent in parents:
+                if parent >= self.offset:
+                    self.approvers[parent - self.offset].append(self.offset + index)
+        self.weights = array('q', state["weights"].tolist())
+        # JSON turns the state's tuples into lists
+        version, internal_state, gauss = state["random"]
+        self.random.setstate((version, tuple(internal_state), gauss))
+
+    def _walk(self):
+        newest = len(self.hashes) - 1
+        current = max(0, newest - self.random.randint(self.walk_depth, 2 * self.walk_depth))
+        while True:
+            approvers = self.approvers[current]
+            if not approvers:
+                return current + self.offset
+            if len(approvers) == 1:
+                current = approvers[0] - self.offset
+                continue
+            # Weights are shifted by the heaviest approver to keep exp() in range
+            approver_weights = [self.weights[approver - self.offset] for approver in approvers]
+            heaviest = max(approver_weights)
+            probabilities = [math.exp(self.alpha * (weight - heaviest)) for weight in approver_weights]
+            current = self.random.choices(approvers, weights=probabilities)[0] - self.offset
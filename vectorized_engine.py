@@ -0,0 +1,116 @@
+import numpy as np
+import tensorflow as tf
+from network_topology.csr_topology import Topology
+from node import generate_mock_data
+
+######################
+# Vectorized simulation engine
+# Instead of one tf.Variable and one GradientTape per node, all node models are stacked into a single
+# [num_nodes, features, 1] variable and all node datasets into [num_nodes, data_size, ...] tensors.
+# One compiled step computes every node's loss and gradient at once, and neighbor averaging becomes a
+# sparse mixing-matrix multiply.
+#
+# The mixing matrix averages each node's gradient with its neighbors' with equal weights 1 / (degree + 1),
+# which is what Node.aggregate_gradients computes when all neighbor gradients are fresh. With the same
+# seeds, the engine therefore reproduces the per-node loss sequence of Node.decentralized_sgd_update
+# when the nodes step in lockstep (every node publishes its gradient before any node aggregates).
+######################
+
+def build_mixing_matrix(neighbors, num_nodes, weights="uniform"):
+    """
+    Builds the sparse row-stochastic matrix averaging every node with its neighbors.
+
+    Parameters:
+    - neighbors: Dictionary mapping node IDs (0..num_nodes-1) to lists of neighbor IDs, or a Topology.
+    - num_nodes: Number of nodes.
+    - weights: "uniform" (as Node.aggregate_gradients) or "metropolis_hastings" (see Topology.mixing_matrix).
+
+    Returns:
+    - A tf.sparse.SparseTensor of shape [num_nodes, num_nodes].
+    """
+    topology = neighbors if isinstance(neighbors, Topology) else \
+        Topology.from_edges(num_nodes, *_edge_arrays(neighbors, num_nodes), symmetric=False)
+    indptr, columns, values = topology.mixing_matrix(weights)
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    return tf.sparse.SparseTensor(indices=np.stack([rows, columns], axis=1),
+                                  values=values.astype(np.float32),
+                                  dense_shape=[num_nodes, num_nodes])
+
+def _edge_arrays(neighbors, num_nodes):
+    sources, targets = [], []
+    for node in range(num_nodes):
+        node_neighbors = neighbors.get(node) or ()
+        sources.extend([node] * len(node_neighbors))
+        targets.extend(node_neighbors)
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+class VectorizedSimulation:
+    def __init__(self, neighbors, num_nodes=None, data_size=100, features=10, seed=0, learning_rate=0.01,
+                 mixing_weights="uniform"):
+        """
+        Initializes the stacked models and datasets of all nodes.
+
+        Parameters:
+        - neighbors: Dictionary mapping node IDs (0..num_nodes-1) to lists of neighbor IDs, or a Topology
+                     (e.g. from one of the generators in network_topology/csr_topology.py).
+        - num_nodes: Number of nodes. Defaults to the number of nodes in `neighbors`.
+        - data_size: The number of data samples per node.
+        - features: The number of features for each data sample.
+        - seed: Base seed; node i is initialized exactly like Node(i, ..., seed=seed + i).
+        - learning_rate: The learning rate for the SGD update.
+        - mixing_weights: Weights of the gradient averaging, "uniform" or "metropolis_hastings".
+        """
+        if num_nodes is None:
+            num_nodes = neighbors.num_nodes if isinstance(neighbors, Topology) else len(neighbors)
+        self.num_nodes = num_nodes
+        self.features = features
+        self.learning_rate = learning_rate
+
+        xs, ys, models = [], [], []
+        for node_id in range(self.num_nodes):
+            # Same draw order as Node: data first, then the initial weights
+            rng = np.random.default_rng(seed + node_id)
+            x, y = generate_mock_data(rng, data_size, features)
+            xs.append(x)
+            ys.append(y)
+            models.append(rng.standard_normal((features, 1)))
+
+        self.x = tf.constant(np.stack(xs), dtype=tf.float32)  # [num_nodes, data_size, features]
+        self.y = tf.constant(np.stack(ys), dtype=tf.float32)  # [num_nodes, data_size, 1]
+        self.models = tf.Variable(np.stack(models), dtype=tf.float32)  # [num_nodes, features, 1]
+        self.mixing_matrix = build_mixing_matrix(neighbors, self.num_nodes, mixing_weights)
+
+        self.compiled_step = tf.function(self.train_step)
+
+    def train_step(self):
+        """
+        Performs one decentralized SGD update of every node.
+
+        Returns:
+        - A [num_nodes] tensor with each node's loss before the update.
+        """
+        with tf.GradientTape() as tape:
+            predicted = tf.matmul(self.x, self.models)
+            losses = tf.reduce_mean((predicted - self.y) ** 2, axis=[1, 2])
+            # Each node's loss only depends on its own model, so the gradient of the sum holds every node's gradient
+            total_loss = tf.reduce_sum(losses)
+
+        gradients = tape.gradient(total_loss, self.models)
+
+        mixed = tf.sparse.sparse_dense_matmul(self.mixing_matrix, tf.reshape(gradients, [self.num_nodes, self.features]))
+        self.models.assign_sub(self.learning_rate * tf.reshape(mixed, [self.num_nodes, self.features, 1]))
+        return losses
+
+    def run(self, steps):
+        """
+        Runs several synchronous steps of all nodes.
+
+        Parameters:
+        - steps: The number of steps to perform.
+
+        Returns:
+        - A NumPy array of shape [steps, num_nodes] with every node's loss sequence.
+        """
+        # Losses stay on the device until the whole run is done
+        losses = [self.compiled_step() for _ in range(steps)]
+        return tf.stack(losses).numpy()